@@ -4,21 +4,21 @@ A Modified Version from BlackCat Nov 26 2018 at  https://www.quantopian.com/post
 
 """
 Rank stocks by 'The Acquirer's Multiple'
- 
+ 
 Picks the top 25 stocks with the lowest EV/EBIT. Equal weight for each stock.  Rebalances every year.
- 
+ 
 Instructions to Use
 --------------------
 Backtest start date should be on the first day of a month:
   - It will buy stocks on that day (or the first trading day after, if a holiday).
   - On the same date next year, it will sell all those stocks and buy new ones.
- 
+ 
 eg:
   Start on 1st Jan, it will rebalance on 1st Jan (or first trading day of every Jan).
   Start on 1st April, it will rebalance on 1st April (or first trading day of every April).
- 
- 
- 
+ 
+ 
+ 
 Algorithim
 -----------
 1) Operates on QTradableStocksUS universe
@@ -28,8 +28,8 @@ Algorithim
 5) Filters out any stocks with -ve EBIT
 6) The stocks from lowest EV/EBIT to highest.  Buy the first NUM_STOCKS_TO_BUY stocks.
 7) Rebalance eery year.
- 
- 
+ 
+ 
 """
 import quantopian.algorithm as algo
 from quantopian.pipeline import Pipeline, CustomFactor
@@ -42,7 +42,7 @@ import pandas
 import scipy.stats as stats
 import quantopian.optimize as opt
 from quantopian.optimize import TargetWeights
- 
+ 
 def initialize(context):
     """
     Called once at the start of the algorithm.
@@ -53,14 +53,14 @@ def initialize(context):
         algo.date_rules.month_start(days_offset=0),
         algo.time_rules.market_open(minutes=60),
     )
- 
+ 
     # Record tracking variables at the end of each day.
     algo.schedule_function(
         record_vars,
         algo.date_rules.every_day(),
         algo.time_rules.market_close(),
     )
- 
+ 
     # Stores which month we do our rebalancing.  Will be assigned the month of the first day we are run.
     context.month_to_run = -1
 
@@ -80,20 +80,53 @@ class TrailingTwelveMonths(CustomFactor):
     window_safe = True  # OK as long as we dont use per share fundamentals: https://www.quantopian.com/posts/how-to-make-factors-be-the-input-of-customfactor-calculation
     outputs=['factor','asof_date']
 
-    # TODO: what if there are more than 4 unique elements.
+    # If more than 4 unique as-of dates fall inside the last 52 weeks (a late filing
+    # or a change of fiscal year), only the 4 most recent quarters are summed.
+    # Set to None to sum every unique quarter in the 52 weeks.
+    max_quarters = 4
 
     def compute(self, today, assets, out, values, dates):
-        out.factor[:] = [    # Boolean masking of arrays
-            (v[d + np.timedelta64(52, 'W') > d[-1]])[
-                np.unique(
-                    d[d + np.timedelta64(52, 'W') > d[-1]],
-                    return_index=True
-                )[1]
-            ].sum()
-            for v, d in zip(values.T, dates.T)
-        ]
+        out.factor[:] = trailing_twelve_months(values, dates, self.max_quarters)
         out.asof_date[:] = dates[-1]
 
+"""
+Sum each column of values over its unique as-of dates in the 52 weeks up to its latest as-of date.
+All assets are done at once: every column is put in date order (a stable argsort, skipped for the
+columns that are already in order) and the first row of each run of equal dates marks one quarter.
+Where a column has more than max_quarters marks, a reversed cumsum over them counts quarters back
+from the latest one and only the most recent max_quarters are summed.
+For windows holding at most max_quarters quarters this gives the same sums as running
+np.unique(..., return_index=True) on each column.
+"""
+def trailing_twelve_months(values, dates, max_quarters=4):
+    smallest = np.iinfo(np.int64).min
+    key = dates.view(np.int64)
+
+    # Rows outside the 52 weeks (and NaT, which is the smallest int64) get the smallest key,
+    # so they sort first and are never kept.
+    latest = key[-1]
+    cutoff = np.where(latest == smallest, np.iinfo(np.int64).max, latest - np.timedelta64(52, 'W').astype('m8[ns]').view(np.int64))
+    kept = key > cutoff
+    key = np.where(kept, key, smallest)
+
+    unsorted = np.flatnonzero((key[1:] < key[:-1]).any(axis=0))
+    if len(unsorted):
+        values = values.copy()
+        order = np.argsort(key[:, unsorted], axis=0, kind='stable')
+        key[:, unsorted] = np.take_along_axis(key[:, unsorted], order, axis=0)
+        values[:, unsorted] = np.take_along_axis(values[:, unsorted], order, axis=0)
+        kept = key != smallest
+
+    first_of_quarter = kept
+    first_of_quarter[1:] &= key[1:] != key[:-1]
+    if max_quarters is not None:
+        too_many = np.flatnonzero(first_of_quarter.sum(axis=0) > max_quarters)
+        if len(too_many):
+            quarters_back = np.cumsum(first_of_quarter[::-1, too_many], axis=0)[::-1]
+            first_of_quarter[:, too_many] &= quarters_back <= max_quarters
+
+    return np.where(first_of_quarter, values, 0.0).sum(axis=0)
+
 def make_pipeline(context):
 
     #  Convert quarterly fundamental data to TTM.
@@ -106,7 +139,7 @@ def make_pipeline(context):
             Fundamentals.ebit_asof_date,
         ]
     )
- 
+ 
     ev = Fundamentals.enterprise_value.latest
 
     # Base universe set to the QTradableStocksUS
@@ -120,36 +153,36 @@ def make_pipeline(context):
 
     # Filter tradable stocks.
     # https://www.quantopian.com/posts/pipeline-trading-universe-best-practice
- 
+ 
     # Filter for primary share equities. IsPrimaryShare is a built-in filter.
     primary_share = IsPrimaryShare()
- 
+ 
     # Equities listed as common stock (as opposed to, say, preferred stock).
     # 'ST00000001' indicates common stock.
     common_stock = Fundamentals.security_type.latest.eq('ST00000001')
- 
+ 
     # Non-depositary receipts. Recall that the ~ operator inverts filters,
     # turning Trues into Falses and vice versa
     not_depositary = ~Fundamentals.is_depositary_receipt.latest
- 
+ 
     # Equities not trading over-the-counter.
     not_otc = ~Fundamentals.exchange_id.latest.startswith('OTC')
- 
+ 
     # Not when-issued equities.
     not_wi = ~Fundamentals.symbol.latest.endswith('.WI')
- 
+ 
     # Equities without LP in their name, .matches does a match using a regular
     # expression
     not_lp_name = ~Fundamentals.standard_name.latest.matches('.* L[. ]?P.?$')
- 
+ 
     # Equities with a null value in the limited_partnership Morningstar
     # fundamental field.
     not_lp_balance_sheet = Fundamentals.limited_partnership.latest.isnull()
- 
+ 
     # Equities whose most recent Morningstar market cap is not null have
     # fundamental data and therefore are not ETFs.
     have_market_cap = Fundamentals.market_cap.latest.notnull()
- 
+ 
     ############################
     # Filters specific to EV.
     ############################
@@ -199,14 +232,14 @@ def before_trading_start(context, data):
     # Get pipeline output
     context.output = algo.pipeline_output('pipeline')
     context.output['ebit_ttm_asof_date'] =context.output['ebit_ttm_asof_date'].astype('datetime64[ns]')
- 
+ 
     # Sort: lowest ev/ebit first
     context.output = context.output.sort_values('ev_over_ebit');
- 
+ 
 
     # These are the securities that we are interested in trading each day.
     context.security_list = context.output.index
- 
+ 
 
 def rebalance(context, data):
     """
@@ -220,18 +253,18 @@ def rebalance(context, data):
     today = get_datetime('US/Eastern')
     if (context.month_to_run == -1):
         context.month_to_run = today.month
-        print str("Rebalancing will be done on 1st day of month " + str( context.month_to_run ) )
+        print(str("Rebalancing will be done on 1st day of month " + str( context.month_to_run ) ))
         rebalanceNow = True;
     else:
         if (context.month_to_run == today.month):
             rebalanceNow = True;
 
     if (rebalanceNow):
-        print "REBALANCING."
+        print("REBALANCING.")
 
         # Rank the stocks withthe lowest EV/EBIT ratio first.
         context.output['ev_over_ebit_rank'] = context.output['ev_over_ebit'].rank(ascending=True)
- 
+ 
 
         # Use Q's order_optimal_portfolio API.
         # Use equal weights for all items in pipeline: https://www.quantopian.com/posts/help-needed-to-improve-this-sample-algo-to-use-the-new-order-optimal-portfolio-function
@@ -245,7 +278,7 @@ def rebalance(context, data):
             objective=objective,
             constraints=[],
         )
- 
+ 
 """
     Define slippage and commission. Fixed slippage at 5 basis point and volume_limit is 0.1%
     Commission is set at Interactive Broker Rate: $0.05 per share with minimum trading cost of $1 per transaction
@@ -259,12 +292,9 @@ def set_slippage_and_commisions():
 counting number of positions
 """
 def position_count(context, data):
-    num_of_position = 0
-    for stock,position in context.portfolio.positions.items():
-        if position.amount > 0:
-            num_of_position +=1
-    return num_of_position
- 
+    # the ledger keeps the number of long positions up to date on every fill
+    return context.portfolio.long_count
+ 
 """
     Plot variables at the end of each day,record leverage of the portfolio and number of positions
 """
@@ -34,6 +34,28 @@ from quantopian.pipeline.filters import QTradableStocksUS
 
 
 
+"""
+The nine Piotroski signals, in the bit order used by the packed 'components' output
+"""
+PIOTROSKI_SIGNALS = [
+    'roa',                          # ROA > 0
+    'cash_flow',                    # operating cash flow > 0
+    'roa_change',                   # ROA up over the window
+    'cash_flow_from_ops',           # cash flow from operations > ROA
+    'long_term_debt_ratio_change',  # long term debt ratio down
+    'current_ratio_change',         # current ratio up
+    'shares_outstanding_change',    # no new shares
+    'gross_margin_change',          # gross margin up
+    'assets_turnover_change',       # assets turnover up
+]
+SIGNAL_BITS = np.arange(len(PIOTROSKI_SIGNALS), dtype=np.uint16)[:, None]
+
+"""
+Fused Piotroski score: each fundamental window is loaded once and all nine signals are
+computed together, instead of one CustomFactor per signal (roa alone was loaded three times).
+Piotroski() outputs the 0-9 score. Piotroski(outputs=['score', 'components']) also gives
+the nine signals packed into a uint16, bit i set when PIOTROSKI_SIGNALS[i] passed.
+"""
 class Piotroski(CustomFactor):
     inputs = [
         morningstar.operation_ratios.roa,
@@ -48,109 +70,51 @@ class Piotroski(CustomFactor):
         morningstar.operation_ratios.assets_turnover,
     ]
     window_length = 22
+    incremental = True   # per-asset compute, recomputed only where inputs changed
+    output_dtypes = {'components': np.uint16}
 
     def compute(self, today, assets, out,
                 roa, cash_flow, cash_flow_from_ops,
                 long_term_debt_ratio, current_ratio, shares_outstanding,
                 gross_margin, assets_turnover):
-        profit = (
-            (roa[-1] > 0).astype(int) +
-            (cash_flow[-1] > 0).astype(int) +
-            (roa[-1] > roa[0]).astype(int) +
-            (cash_flow_from_ops[-1] > roa[-1]).astype(int)
-        )
-
-        leverage = (
-            (long_term_debt_ratio[-1] < long_term_debt_ratio[0]).astype(int) +
-            (current_ratio[-1] > current_ratio[0]).astype(int) +
-            (shares_outstanding[-1] <= shares_outstanding[0]).astype(int)
-        )
-
-        operating = (
-            (gross_margin[-1] > gross_margin[0]).astype(int) +
-            (assets_turnover[-1] > assets_turnover[0]).astype(int)
-        )
-
-        out[:] = profit + leverage + operating
-
-class ROA(CustomFactor):
-    window_length = 1
-    inputs = [morningstar.operation_ratios.roa]
-
-    def compute(self, today, assets, out, roa):
-        out[:] = (roa[-1] > 0).astype(int)
-
-class ROAChange(CustomFactor):
-    window_length = 22
-    inputs = [morningstar.operation_ratios.roa]
-
-    def compute(self, today, assets, out, roa):
-        out[:] = (roa[-1] > roa[0]).astype(int)
-
-class CashFlow(CustomFactor):
-    window_length = 1
-    inputs = [morningstar.cash_flow_statement.operating_cash_flow]
-
-    def compute(self, today, assets, out, cash_flow):
-        out[:] = (cash_flow[-1] > 0).astype(int)
-
-class CashFlowFromOps(CustomFactor):
-    window_length = 1
-    inputs = [morningstar.cash_flow_statement.cash_flow_from_continuing_operating_activities, morningstar.operation_ratios.roa]
-
-    def compute(self, today, assets, out, cash_flow_from_ops, roa):
-        out[:] = (cash_flow_from_ops[-1] > roa[-1]).astype(int)
-
-class LongTermDebtRatioChange(CustomFactor):
-    window_length = 22
-    inputs = [morningstar.operation_ratios.long_term_debt_equity_ratio]
-
-    def compute(self, today, assets, out, long_term_debt_ratio):
-        out[:] = (long_term_debt_ratio[-1] < long_term_debt_ratio[0]).astype(int)
-
-class CurrentDebtRatioChange(CustomFactor):
-    window_length = 22
-    inputs = [morningstar.operation_ratios.current_ratio]
-
-    def compute(self, today, assets, out, current_ratio):
-        out[:] = (current_ratio[-1] > current_ratio[0]).astype(int)
-
-class SharesOutstandingChange(CustomFactor):
-    window_length = 22
-    inputs = [morningstar.valuation.shares_outstanding]
-
-    def compute(self, today, assets, out, shares_outstanding):
-        out[:] = (shares_outstanding[-1] <= shares_outstanding[0]).astype(int)
-
-class GrossMarginChange(CustomFactor):
-    window_length = 22
-    inputs = [morningstar.operation_ratios.gross_margin]
-
-    def compute(self, today, assets, out, gross_margin):
-        out[:] = (gross_margin[-1] > gross_margin[0]).astype(int)
-
-class AssetsTurnoverChange(CustomFactor):
-    window_length = 22
-    inputs = [morningstar.operation_ratios.assets_turnover]
-
-    def compute(self, today, assets, out, assets_turnover):
-        out[:] = (assets_turnover[-1] > assets_turnover[0]).astype(int)
-
+        signals = np.empty((len(PIOTROSKI_SIGNALS), len(assets)), dtype=bool)
+
+        # Profitability
+        np.greater(roa[-1], 0, out=signals[0])
+        np.greater(cash_flow[-1], 0, out=signals[1])
+        np.greater(roa[-1], roa[0], out=signals[2])
+        np.greater(cash_flow_from_ops[-1], roa[-1], out=signals[3])
+
+        # Leverage
+        np.less(long_term_debt_ratio[-1], long_term_debt_ratio[0], out=signals[4])
+        np.greater(current_ratio[-1], current_ratio[0], out=signals[5])
+        np.less_equal(shares_outstanding[-1], shares_outstanding[0], out=signals[6])
+
+        # Operating efficiency
+        np.greater(gross_margin[-1], gross_margin[0], out=signals[7])
+        np.greater(assets_turnover[-1], assets_turnover[0], out=signals[8])
+
+        score = signals.sum(axis=0)
+        if self.outputs:
+            out.score[:] = score
+            out.components[:] = np.left_shift(signals, SIGNAL_BITS).sum(axis=0, dtype=np.uint16)
+        else:
+            out[:] = score
 
 def initialize(context):
 
     pipe = Pipeline()
-    pipe = attach_pipeline(pipe, name='piotroski')
+    # before_trading_start only reads the output at month end, so compute it only then
+    pipe = attach_pipeline(pipe, name='piotroski', eager=False)
 
-    profit = ROA() + ROAChange() + CashFlow() + CashFlowFromOps()
-    leverage = LongTermDebtRatioChange() + CurrentDebtRatioChange() + SharesOutstandingChange()
-    operating = GrossMarginChange() + AssetsTurnoverChange()
-    piotroski = profit + leverage + operating
+    # One pass over the fundamentals gives the score and the per-signal breakdown
+    piotroski, components = Piotroski(outputs=['score', 'components'])
 
     ev_ebitda = morningstar.valuation_ratios.ev_to_ebitda.latest > 0
-    market_cap = morningstar.valuation.market_cap > 1e9
+    market_cap = morningstar.valuation.market_cap.latest > 1e9
 
     pipe.add(piotroski, 'piotroski')
+    pipe.add(components, 'piotroski_components')
     pipe.set_screen(((piotroski >= 7) | (piotroski <= 3)) & ev_ebitda & market_cap)
     context.is_month_end = False
     schedule_function(set_month_end, date_rules.month_end(1))
@@ -163,7 +127,7 @@ def initialize(context):
 
 
 def set_month_end(context, data):
-    print "---- Set Month End -----"
+    print("---- Set Month End -----")
     context.is_month_end = True
 
 def before_trading_start(context, data):
@@ -172,8 +136,8 @@ def before_trading_start(context, data):
         try:
             context.long_stocks = context.results.sort_values('piotroski', ascending=False).head(10)
             context.short_stocks = context.results.sort_values('piotroski', ascending=True).head(10)
-            print context.long_stocks
-            print context.short_stocks
+            print(context.long_stocks)
+            print(context.short_stocks)
         except:
             print ("In exception")
 
@@ -190,9 +154,9 @@ def trade_short(context, data):
 
 # Selling stocks if it is not in both list
 def trade(context, data):
-    print "-------- New Set ----------"
-    print context.long_stocks
-    print context.short_stocks
+    print("-------- New Set ----------")
+    print(context.long_stocks)
+    print(context.short_stocks)
 
     for stock in context.portfolio.positions:
         if stock not in context.long_stocks.index and stock not in context.short_stocks.index:
@@ -203,11 +167,8 @@ def trade(context, data):
 counting number of positions
 """
 def position_count(context, data):
-    num_of_position = 0
-    for stock,position in context.portfolio.positions.items():
-        if position.amount > 0:
-            num_of_position +=1
-    return num_of_position
+    # the ledger keeps the number of long positions up to date on every fill
+    return context.portfolio.long_count
 """
     Plot variables at the end of each day.
 """
@@ -12,18 +12,17 @@ from quantopian.pipeline.classifiers.fundamentals import Sector
 from quantopian.algorithm import attach_pipeline, pipeline_output
 from quantopian.pipeline import Pipeline
 from quantopian.pipeline.data.builtin import USEquityPricing
-from quantopian.pipeline.factors import AverageDollarVolume
-from quantopian.pipeline import CustomFactor
+from quantopian.pipeline.factors import AverageDollarVolume, StackedRank
 from quantopian.pipeline.filters import QTradableStocksUS
 from quantopian.pipeline.data import morningstar, Fundamentals
 from quantopian.pipeline.filters.morningstar import IsPrimaryShare, IsDepositaryReceipt
 import quantopian.pipeline.factors.fundamentals
 import pandas as pd
 import numpy as np
- 
+ 
 MAX_GROSS_LEVERAGE = 1.0
 MAX_LONG_POSITION_SIZE = 0.04   # 4% per position or about 25 stocks
- 
+ 
 def initialize(context):
 
     # Create our dynamic stock selector.
@@ -39,18 +38,18 @@ def initialize(context):
     # set the slippage and commision for the portfolio
     set_slippage_and_commisions()
 
-    #schedule for buying a week after the year start
+    #schedule for buying a week after the year start (only January sessions are scheduled)
     schedule_function(func= buying_in_January,
-                      date_rule=date_rules.month_start(4),
+                      date_rule=date_rules.month_start(4).in_months(1),
                       time_rule=time_rules.market_open())
 
-    # Schedule Selling Function at the beginning of each December before the year start
-    schedule_function(sell_in_December,date_rules.every_day(),time_rules.market_close())
+    # Schedule Selling Function every day of December before the year start
+    schedule_function(sell_in_December,date_rules.every_day().in_months(12),time_rules.market_close())
 
     #Schedule my plotting function
     schedule_function(record_vars,date_rules.every_day(), time_rules.market_open())
 
- 
+ 
 def make_pipeline():
     # Set the universe to the QTradableStocksUS & stocks with Sector defined
     universe  = QTradableStocksUS() & Sector().notnull()
@@ -59,18 +58,18 @@ def make_pipeline():
     medium_cap = Fundamentals.market_cap.latest > 1000000000
 
     # We don't choose from Financial and Ultility Sector
-    not_Finan_and_Ulti = ((Sector != 103) & (Sector != 207))
+    sector = Sector()
+    not_Finan_and_Ulti = ((sector != 103) & (sector != 207))
 
     # the final universe
     universe = universe & medium_cap & not_Finan_and_Ulti
 
-    #Create an object of Earnings_Yield and rank them in descending order
-    earnings_yield = Earnings_Yield()
-    EY_rank   = earnings_yield.rank(ascending=False, mask=universe)
+    # Earnings yield (EBIT / enterprise value) and return on invested capital, read from the latest reports
+    earnings_yield = morningstar.income_statement.ebit.latest / morningstar.valuation.enterprise_value.latest
+    roic = morningstar.operation_ratios.roic.latest
 
-    #Create an object of Return on invested Capital and rank them in descending order
-    roic= Return_on_Invested_Capital()
-    roic_rank = roic.rank(ascending=False, mask=universe)
+    # rank both in descending order in one pass
+    EY_rank, roic_rank = StackedRank([earnings_yield, roic], ascending=False, mask=universe)
 
     # the rank of magic formula is equal to the sum of rank of Earning Yields and Return on invested capital
     Magic_Formula_rank   = EY_rank + roic_rank
@@ -83,13 +82,13 @@ def make_pipeline():
         'MagicFormula_rank': Magic_Formula_rank,
     }, screen = universe )
     return pipe
- 
+ 
 """
     Called every day before market open.
 """
 def before_trading_start(context, data):
     context.output=pipeline_output('my_pipeline')
-    context.buy_list = context.output.sort_values(['MagicFormula_rank'], ascending=True).head(25).dropna()
+    context.buy_list = context.output.nsmallest(25, 'MagicFormula_rank').dropna()
 
     # equal weighting of a position, = 1.0 leverage / number of stocks in buy list
     if len(context.buy_list) != 0:
@@ -105,22 +104,14 @@ def before_trading_start(context, data):
 Buying on January the top 25 stocks in the list
 """
 def buying_in_January(context, data):
-
-    today = get_datetime('US/Eastern')
-    if today.month == 1:
-        for stock in context.buy_list.index:
-            if data.can_trade(stock):
-                    order_target_percent(stock, context.weight)
+    batch_order_target_percent(pd.Series(context.weight, index=context.buy_list.index))
 """
 Sell at the beginning of December all positions in the portfolio
 """
 def sell_in_December(context,data):
-    today = get_datetime('US/Eastern')
-    if today.month == 12 and context.portfolio.positions_value != 0:
-        for stock in context.portfolio.positions.iterkeys():
-            if stock not in context.buy_list.index:
-                if data.can_trade(stock):
-                    order_target(stock, 0)
+    if context.portfolio.positions_value != 0:
+        exits = [stock for stock in context.portfolio.positions if stock not in context.buy_list.index]
+        batch_order_target_percent(pd.Series(0.0, index=exits))
 
 """
     Define slippage and commission. Fixed slippage at 5 basis point and volume_limit is 0.1%
@@ -135,12 +126,9 @@ def set_slippage_and_commisions():
 counting number of positions
 """
 def position_count(context, data):
-    num_of_position = 0
-    for stock,position in context.portfolio.positions.items():
-        if position.amount > 0:
-            num_of_position +=1
-    return num_of_position
- 
+    # the ledger keeps the number of long positions up to date on every fill
+    return context.portfolio.long_count
+ 
 """
     Plot variables at the end of each day,record leverage of the portfolio and number of positions
 """
@@ -149,28 +137,3 @@ def record_vars(context, data):
      # Record and plot the leverage and number of positions our portfolio over time.
     record(leverage = context.account.leverage,
           number_of_positions=position_count(context, data))
-
-
-"""
-Custom class Earnings_Yield
-"""
-class Earnings_Yield(CustomFactor):
-    inputs = [morningstar.income_statement.ebit, morningstar.valuation.enterprise_value]
-    window_length = 1
-
-    def compute(self, today, assets, out, ebit, ev):
-        ey = ebit[-1] / ev[-1]
-        out[:] = ey
-
-"""
-Custom Class Return on Invested Capital
-"""
-class Return_on_Invested_Capital(CustomFactor):
-
-    # Pre-declare inputs and window_length
-    inputs = [morningstar.operation_ratios.roic]
-    window_length = 1
-
-
-    def compute(self, today, assets, out, roic):
-        out[:] = roic[-1]
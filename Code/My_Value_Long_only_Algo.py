@@ -1,13 +1,13 @@
 """"
 Author Quang Dung Nguyen
- 
+ 
 Create a scoring-system based on valuation ratio
 Trading universe is defined by Tradable US Securities, top 2000 market cap and Sector Defined,
 It is then be monitored by the momentum and volatility
 """
 from quantopian.algorithm import attach_pipeline, pipeline_output
 from quantopian.pipeline import Pipeline
-from quantopian.pipeline import CustomFactor
+from quantopian.pipeline.factors import RollingFactor, StackedRank
 from quantopian.pipeline.data.builtin import USEquityPricing
 from quantopian.pipeline.data import morningstar
 from quantopian.pipeline.classifiers.morningstar import Sector
@@ -19,6 +19,12 @@ import numpy as np
 # Constraint Parameters
 MAX_GROSS_LEVERAGE = 1.0
 MAX_LONG_POSITION_SIZE = 0.04   # 4% about 25 stocks
+
+# Score Parameters (quantopian.sweep can vary any of these)
+UNIVERSE_SIZE = 2000            # top stocks by market cap
+VOLATILITY_CUTOFF = 600         # stocks kept by the volatility filter
+# weight of each ratio's rank in the ranking score
+RANK_WEIGHTS = {'pb': 1, 'pe': 1, 'dy': 1, 'roa': 1, 'roe': 1, 'roic': 2, 'earnings_yield': 1}
 """
 Initialize the function
 """
@@ -49,52 +55,54 @@ def initialize(context):
 """
     A function to create our dynamic stock selector (pipeline).
 """
+def base_terms():
+    """
+    The factors and filters the ranking is built from. A parameter sweep
+    computes these once and replaces this function with one returning the
+    precomputed values.
+    """
+    return {
+        'market_cap': MarketCap(),
+        'tradable': QTradableStocksUS(),
+        'has_sector': Sector().notnull(),
+        'momentum': Momentum(),
+        'volatility': Volatility(),
+        #Price to book and Price to Earning, the lower the ratio, the better
+        'pb': morningstar.valuation_ratios.pb_ratio.forward_filled.latest,
+        'pe': morningstar.valuation_ratios.pe_ratio.forward_filled.latest,
+        #Return on Assets, Equity, Invested Capital, Earnings and Dividend Yield, the higher the ratio, the better
+        'roa': morningstar.operation_ratios.roa.forward_filled.latest,
+        'roe': morningstar.operation_ratios.roe.forward_filled.latest,
+        'roic': morningstar.operation_ratios.roic.forward_filled.latest,
+        'earnings_yield': morningstar.income_statement.ebit.latest / morningstar.valuation.enterprise_value.latest,
+        'dy': morningstar.valuation_ratios.dividend_yield.forward_filled.latest,
+    }
+
 def make_pipeline():
 
     pipe = Pipeline()
+    base = base_terms()
 
     # Set the universe to the QTradableStocksUS & stocks with Sector and Top 2000 by MarketCap
-    universe = MarketCap().top(2000, mask = QTradableStocksUS()) & Sector().notnull()
+    universe = base['market_cap'].top(UNIVERSE_SIZE, mask = base['tradable']) & base['has_sector']
 
     #filter more with momentum and volarility filter(lowest 600 volatility stocks)
+    volatility_rank = base['volatility'].rank(mask=universe, ascending=True)
 
-    momentum = Momentum()
-
-    volatility = Volatility()
-
-    volatility_rank = volatility.rank(mask=universe, ascending=True)
-
-    pipe.set_screen(universe  & (volatility_rank.top(600)) & (momentum>1))
-
-    # Creating Price_to_book,Price_to_earnings, and return_on_assets, return_on_Equity, Return on Invested Capital Objects, and Dividend_yield Object and Rank them
-
-    #Create Price to book and Price to Earning and rank them, the lower the ratio, the better
-    pb = Price_to_Book()
-    pb_rank = pb.rank(mask=universe, ascending=True)
-
-    pe = Price_to_Earnings()
-    pe_rank = pe.rank(mask=universe, ascending=True)
-
-    #Create Return on Assets, Return on Equity, Return on Invested Capital and Dividend Yield Class and rank them,the higher the ratio, the better
-    roa = Return_on_Assets()
-    roa_rank = roa.rank(mask=universe, ascending=False)
-
-    roe = Return_on_Equity()
-    roe_rank = roe.rank(mask=universe, ascending=False)
-
-    roic = Return_on_Invested_Capital()
-    roic_rank = roic.rank(mask=universe, ascending=False)
-
-    earnings_yield = Earnings_Yield()
-    EY_rank   = earnings_yield.rank(ascending=False, mask=universe)
+    pipe.set_screen(universe  & (volatility_rank.top(VOLATILITY_CUTOFF)) & (base['momentum']>1))
 
+    # Rank all seven ratios under the same universe mask in one pass
+    names = ['pb', 'pe', 'dy', 'roa', 'roe', 'roic', 'earnings_yield']
+    ranks = StackedRank([base[name] for name in names],
+                        ascending=[True, True, False, False, False, False, False],
+                        mask=universe)
 
-    dy = Dividend_Yield()
-    dy_rank = dy.rank(mask=universe, ascending=False)
-
-
-    #Give 1 weight forall metrics such as P/e,P/B,Dividend Yield,Return on Assets,Equity and Invested Capital
-    the_ranking_score = (pb_rank+pe_rank+dy_rank+roa_rank+roe_rank+roic_rank*2 + EY_rank)/8
+    #Weight the ranks by RANK_WEIGHTS (1 for all metrics and 2 for Return on Invested Capital by default)
+    the_ranking_score = None
+    for name, rank in zip(names, ranks):
+        weighted = rank if RANK_WEIGHTS[name] == 1 else rank * RANK_WEIGHTS[name]
+        the_ranking_score = weighted if the_ranking_score is None else the_ranking_score + weighted
+    the_ranking_score = the_ranking_score / float(sum(RANK_WEIGHTS.values()))
 
     # Rank the combo_raw and add that to the pipeline
     pipe.add(the_ranking_score.rank(mask=universe), 'ranking_score')
@@ -108,8 +116,8 @@ def before_trading_start(context, data):
     context.output = pipeline_output('filtered_top_stocks')
 
     # Narrow down the securities to only the top 25 & update my universe
-    context.long_list = context.output.sort_values(['ranking_score'], ascending=True).iloc[:25].dropna()
- 
+    context.long_list = context.output.nsmallest(25, 'ranking_score').dropna()
+ 
 """
     Execute orders according to our schedule_function() timing.
 """
@@ -122,28 +130,23 @@ def rebalance(context,data):
 
     #maximum weight per single stock
     if long_weight > MAX_LONG_POSITION_SIZE :
-        long_weight = 0.04
+        long_weight = MAX_LONG_POSITION_SIZE
 
-    # if the stock is in the long_list, buy the stock
-    for long_stock in context.long_list.index:
-        if data.can_trade(long_stock):
-            order_target_percent(long_stock, long_weight)
+    # buy the stocks in the long_list and sell the stocks in the portfolio
+    # that are no longer in it, all in one batch; stocks that cannot trade
+    # today are skipped
+    weights = pd.Series(long_weight, index=context.long_list.index)
+    exits = [stock for stock in context.portfolio.positions if stock not in weights.index]
+    batch_order_target_percent(pd.concat([weights, pd.Series(0.0, index=exits)]))
 
-    # if the stock is currently in the porfolio
-    # but not longer in the long_list,sell the stock
-    for stock in context.portfolio.positions:
-        if stock not in context.long_list.index:
-            if data.can_trade(stock):
-                order_target(stock, 0)
+    # record the ranking score of each stock bought, on the sessions the long_list is traded
+    record(ranking_score = context.long_list['ranking_score'])
 """
 counting number of positions
 """
 def position_count(context, data):
-    num_of_position = 0
-    for stock,position in context.portfolio.positions.items():
-        if position.amount > 0:
-            num_of_position +=1
-    return num_of_position
+    # the ledger keeps the number of long positions up to date on every fill
+    return context.portfolio.long_count
 """
     Plot variables at the end of each day.
 """
@@ -158,7 +161,7 @@ def record_vars(context, data):
     Commission is set at Interactive Broker Rate: $0.05 per share with minimum trading cost of $1 per           transaction
 """
 def set_slippage_and_commisions():
- 
+ 
 
     set_slippage(
         us_equities=slippage.FixedBasisPointsSlippage(basis_points=5, volume_limit=0.1))
@@ -167,8 +170,9 @@ def set_slippage_and_commisions():
 
 """
 Custom Class Momentum Price of 10 days ago/ Price of 30 days ago.
+Rolling: close is a ring buffer that takes one new row a day, so the two rows are read directly.
 """
-class Momentum(CustomFactor):
+class Momentum(RollingFactor):
 
     # Pre-declare inputs and window_length
     inputs = [USEquityPricing.close]
@@ -178,107 +182,12 @@ class Momentum(CustomFactor):
         out[:] = close[-10]/close[0]
 """
 Custom Class Volatility
+Rolling: the standard deviation comes from running moments updated with one new row a day.
 """
-class Volatility(CustomFactor):
+class Volatility(RollingFactor):
     inputs = [USEquityPricing.close]
     window_length = 15
     # compute standard deviation for the last 15-day
     def compute(self, today, assets, out, close):
 
-        out[:] = np.std(close, axis=0)
-"""
-Custom Class Price to Book
-"""
-class Price_to_Book(CustomFactor):
-
-    inputs = [morningstar.valuation_ratios.pb_ratio]
-    window_length = 1
-
-
-    def compute(self, today, assets, out, pb):
-        pb = nanfill(pb)
-        out[:] = pb
-"""
-Custom Class Price to Earnings
-"""
-class Price_to_Earnings(CustomFactor):
-
-    inputs = [morningstar.valuation_ratios.pe_ratio]
-    window_length = 1
-
-
-    def compute(self, today, assets, out, pe):
-        pe = nanfill(pe)
-        out[:] = pe
-"""
-Custom Class Return on Assets
-"""
-class Return_on_Assets(CustomFactor):
-
-    inputs = [morningstar.operation_ratios.roa]
-    window_length = 1
-
- 
-    def compute(self, today, assets, out, roa):
-        roa = nanfill(roa)
-        out[:] = roa
-"""
-Custom Class Return on Equity
-"""
-class Return_on_Equity(CustomFactor):
-
-    inputs = [morningstar.operation_ratios.roe]
-    window_length = 1
-
-
-    def compute(self, today, assets, out, roe):
-        roe = nanfill(roe)
-        out[:] = roe[-1]
- 
-"""
-Custom Class Return on Invested Capital
-"""
-class Return_on_Invested_Capital(CustomFactor):
-
-    # Pre-declare inputs and window_length
-    inputs = [morningstar.operation_ratios.roic]
-    window_length = 1
-
-
-    def compute(self, today, assets, out, roic):
-        roic = nanfill(roic)
-        out[:] = roic
- 
- 
-"""
-Custom Class Dividend Yield
-"""
-class Dividend_Yield(CustomFactor):
- 
-    inputs = [morningstar.valuation_ratios.dividend_yield]
-    window_length = 1
- 
-    def compute(self, today, assets, out, d_y):
-        dy = nanfill(d_y)
-        out[:] = dy
-"""
-Custom class Earnings_Yield
-"""
-class Earnings_Yield(CustomFactor):
-    inputs = [morningstar.income_statement.ebit, morningstar.valuation.enterprise_value]
-    window_length = 1
-
-    def compute(self, today, assets, out, ebit, ev):
-        ey = ebit[-1] / ev[-1]
-        out[:] = ey
- 
-"""
-Fillout nan values by  Blue Seahawk
-Links :https://www.quantopian.com/posts/forward-filling-nans-in-pipeline-custom-factors
-"""
-def nanfill(arr):
-    mask = np.isnan(arr)
-    idx  = np.where(~mask,np.arange(mask.shape[1]),0)
-    np.maximum.accumulate(idx,axis=1, out=idx)  
-    arr[mask] = arr[np.nonzero(mask)[0], idx[mask]]
-    return arr
+        out[:] = close.std()
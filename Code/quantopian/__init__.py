@@ -0,0 +1,9 @@
+"""
+Offline stand-in for the Quantopian research/backtest platform.
+
+The strategies in this folder import `quantopian.pipeline`, `quantopian.algorithm`
+and `quantopian.optimize`. This package provides local versions of those modules
+so the algorithms run unchanged against a columnar data store on disk:
+
+    python -m quantopian My_Magic_Formula.py --store ./store --start 2003-01-01 --end 2019-04-01
+"""
@@ -0,0 +1,148 @@
+"""
+Run a strategy script against a local store:
+
+    python -m quantopian My_Magic_Formula.py --store ./store --start 2003-01-01 --end 2019-04-01
+
+Several scripts run side by side in one pass, sharing their pipeline work:
+
+    python -m quantopian My_Magic_Formula.py My_Value_Long_only_Algo.py --store ./store ...
+"""
+import argparse
+import io
+import os
+import time
+
+from quantopian.algorithm import TradingAlgorithm, run_algorithms
+from quantopian.data import ColumnarStore
+from quantopian.pipeline.cache import FactorCache
+from quantopian.pipeline.graph import pipeline_graph
+from quantopian.utils.memory import format_size, parse_size, peak_rss
+from quantopian.utils.profiling import Profiler
+
+
+def _write(perf, path):
+    if path.endswith('.csv'):
+        perf.to_csv(path)
+    else:
+        perf.to_pickle(path)
+
+
+def _report(label, perf, elapsed, capital_base):
+    final = perf['portfolio_value'].iloc[-1]
+    print('%s%d sessions in %.1fs, final portfolio value %.2f (%+.2f%%)' % (
+        label, len(perf), elapsed, final, 100.0 * (final / capital_base - 1.0)))
+
+
+def _report_cache(cache):
+    if cache is not None:
+        print('factor cache: %d hits, %d misses, %s in %s' % (
+            cache.hits, cache.misses, format_size(cache.nbytes), cache.directory))
+
+
+def _report_profile(profiler, path):
+    if profiler is not None:
+        profiler.write_folded(path)
+        print(profiler.format_summary())
+        print('flame graph stacks written to %s' % path)
+
+
+def _print_graphs(args, store):
+    for path in args.scripts:
+        with io.open(path, encoding='utf-8') as f:
+            script = f.read()
+        algorithm = TradingAlgorithm(store, script=script, filename=path, compact=args.compact)
+        for name, pipeline in sorted(algorithm.pipelines(args.start, args.end, eager_only=False).items()):
+            print('%s, pipeline %r, per block of 126 sessions:' % (algorithm.name, name))
+            print(algorithm.engine.explain(pipeline_graph(pipeline)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m quantopian')
+    parser.add_argument('scripts', nargs='+', metavar='script', help='path of the algorithm file')
+    parser.add_argument('--store', required=True, help='directory of the columnar store')
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--capital-base', type=float, default=100000.0)
+    parser.add_argument('--output', help='write the daily performance frame to this .csv or .pickle, or '
+                                         'the recorded values to this .parquet or .npz; with several '
+                                         'scripts, each name is added before the extension')
+    parser.add_argument('--checkpoint-every', type=int, metavar='N',
+                        help='also save a .parquet or .npz --output every N sessions')
+    parser.add_argument('--pipeline-sessions', choices=['all', 'scheduled'], default='all',
+                        help="'scheduled' computes pipelines only on sessions where a scheduled "
+                             "function other than an every_day one fires")
+    parser.add_argument('--memory-budget', type=parse_size,
+                        help='size pipeline blocks to fit in this much memory, e.g. 2G')
+    parser.add_argument('--factor-cache', metavar='DIR',
+                        help='keep pipeline results in this directory and reuse them in later runs')
+    parser.add_argument('--factor-cache-size', type=parse_size, metavar='SIZE',
+                        help='evict the least recently used cached results beyond this size, e.g. 10G')
+    parser.add_argument('--compact', action='store_true',
+                        help='keep pipeline data as float32 and bit-packed masks, halving its memory; '
+                             'values agree with the default to about 7 significant digits')
+    parser.add_argument('--optimize', action='store_true',
+                        help='merge duplicate pipeline terms, read columns directly in place of '
+                             'factors copying them and fuse elementwise arithmetic; same results')
+    parser.add_argument('--print-graph', action='store_true',
+                        help='print each pipeline\'s optimized term graph with estimated costs first')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='time every pipeline term, user function and order call, print the '
+                             'slowest and write the stacks to PATH for flamegraph.pl or speedscope')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='with --profile, also trace the peak allocation of each (slow)')
+    args = parser.parse_args(argv)
+    store = ColumnarStore(args.store)
+    factor_cache = None
+    if args.factor_cache:
+        factor_cache = FactorCache(args.factor_cache, max_bytes=args.factor_cache_size)
+    profiler = Profiler(memory=args.profile_memory) if args.profile else None
+    pipeline_sessions = None if args.pipeline_sessions == 'all' else args.pipeline_sessions
+    record_path = None
+    if args.output and os.path.splitext(args.output)[1] in ('.parquet', '.npz'):
+        record_path, args.output = args.output, None
+    if args.print_graph:
+        _print_graphs(args, store)
+
+    if len(args.scripts) > 1:
+        started = time.time()
+        results = run_algorithms(args.scripts, store, args.start, args.end,
+                                 capital_base=args.capital_base, pipeline_sessions=pipeline_sessions,
+                                 memory_budget=args.memory_budget, record_path=record_path,
+                                 checkpoint_every=args.checkpoint_every, factor_cache=factor_cache,
+                                 profiler=profiler, compact=args.compact, optimize=args.optimize)
+        elapsed = time.time() - started
+        for name, perf in results.items():
+            if args.output:
+                root, ext = os.path.splitext(args.output)
+                _write(perf, '%s_%s%s' % (root, name, ext))
+            _report('%s: ' % name, perf, elapsed, args.capital_base)
+        _report_cache(factor_cache)
+        _report_profile(profiler, args.profile)
+        print('peak resident memory %s' % format_size(peak_rss()))
+        return
+
+    with io.open(args.scripts[0], encoding='utf-8') as f:
+        script = f.read()
+    algorithm = TradingAlgorithm(
+        store, script=script, filename=args.scripts[0],
+        capital_base=args.capital_base, pipeline_sessions=pipeline_sessions,
+        memory_budget=args.memory_budget, record_path=record_path,
+        checkpoint_every=args.checkpoint_every, factor_cache=factor_cache,
+        profiler=profiler, compact=args.compact, optimize=args.optimize,
+    )
+    started = time.time()
+    perf = algorithm.run(args.start, args.end)
+    elapsed = time.time() - started
+
+    if args.output:
+        _write(perf, args.output)
+    _report('', perf, elapsed, args.capital_base)
+    print('pipeline computed for %d sessions' % algorithm.pipeline_sessions_computed)
+    _report_cache(factor_cache)
+    _report_profile(profiler, args.profile)
+    chunks = ', '.join('%s: %d' % item for item in sorted(algorithm.pipeline_chunks.items()))
+    print('pipeline chunk sessions (%s), peak resident memory %s' % (chunks, format_size(peak_rss())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,995 @@
+"""
+The algorithm API used by the strategy scripts, and a daily-bar simulator
+
+The module-level functions (attach_pipeline, schedule_function, order_*,
+record, ...) forward to the TradingAlgorithm that is currently running, so
+scripts can use them either as `algo.schedule_function(...)` or as the bare
+globals Quantopian injected.
+
+Simulation runs on daily bars. The scheduled functions' date rules are
+compiled once, when the run starts, into the tuple of functions due on each
+session. Each session:
+
+    0. splits and dividends going ex are applied to the positions held
+    1. before_trading_start(context, data)
+    2. handle_data, then the scheduled functions whose date rule fires,
+       in time-rule order
+    3. positions are marked to the close and record() values are stored
+
+Orders fill when they are placed, at the session's close adjusted by the
+slippage model and capped at its share of the session's volume. Whatever
+does not fill is cancelled, as Quantopian cancelled open orders at the close.
+batch_order_target_percent (and order_optimal_portfolio, which uses it)
+trades a whole vector of target weights with the models' array methods.
+
+Pipelines are computed in blocks of `pipeline_chunk` sessions by default,
+or of as many sessions as fit in `memory_budget` bytes.
+With `pipeline_sessions` the simulator computes them only on the sessions
+whose output is actually used and hands out the last computed output on
+the others; a pipeline attached with eager=False is computed only for the
+sessions that call pipeline_output.
+"""
+import ast
+import functools
+import inspect
+import io
+import os
+import textwrap
+import warnings
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from quantopian.errors import AlgorithmNotRunning, ScheduleWarning, TradingControlViolation
+from quantopian.finance import commission, slippage
+from quantopian.data.store import ADJUSTMENT_KINDS
+from quantopian.finance.ledger import Ledger
+from quantopian.pipeline.engine import PipelineResult, SimplePipelineEngine
+from quantopian.pipeline.graph import SCREEN_NAME, TermGraph, pipeline_graph
+from quantopian.pipeline.term import AssetExists
+from quantopian.recorder import Recorder
+from quantopian.utils.events import DateRule, EveryDay, InMonths, date_rules, time_rules
+
+_algorithm = None
+
+# Columns the simulator records for every session, ahead of record()'s.
+PERFORMANCE_COLUMNS = ('portfolio_value', 'cash', 'positions_value', 'gross_leverage', 'net_leverage')
+
+
+def _current():
+    if _algorithm is None:
+        raise AlgorithmNotRunning('the algorithm API is only available while a simulation runs')
+    return _algorithm
+
+
+def api_method(f):
+    """
+    Forward a module-level API function to the running TradingAlgorithm
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        return getattr(_current(), f.__name__)(*args, **kwargs)
+    return wrapper
+
+
+def order_method(f):
+    """
+    api_method for an order function, timed when the algorithm is profiled
+    """
+    name = f.__name__
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        algorithm = _current()
+        if algorithm.profiler is None:
+            return getattr(algorithm, name)(*args, **kwargs)
+        return algorithm.profiler.call('order', name, getattr(algorithm, name), *args, **kwargs)
+    return wrapper
+
+
+@api_method
+def attach_pipeline(pipeline, name, chunks=None, eager=True):
+    """Register a pipeline to be computed for every session"""
+
+
+@api_method
+def pipeline_output(name):
+    """The output of an attached pipeline for the current session"""
+
+
+@api_method
+def schedule_function(func, date_rule=None, time_rule=None, half_days=True, calendar=None):
+    """Run func(context, data) on the sessions selected by date_rule"""
+
+
+@order_method
+def order(asset, amount, limit_price=None, stop_price=None, style=None):
+    """Buy (positive) or sell (negative) shares; returns the number filled"""
+
+
+@order_method
+def order_value(asset, value):
+    """Trade a dollar amount of an asset"""
+
+
+@order_method
+def order_percent(asset, percent):
+    """Trade a fraction of the portfolio value"""
+
+
+@order_method
+def order_target(asset, target):
+    """Trade until the position holds `target` shares"""
+
+
+@order_method
+def order_target_value(asset, target):
+    """Trade until the position is worth `target` dollars"""
+
+
+@order_method
+def order_target_percent(asset, target):
+    """Trade until the position is `target` of the portfolio value"""
+
+
+@order_method
+def batch_order_target_percent(weights):
+    """Trade every asset in a mapping of target portfolio weights in one step"""
+
+
+@order_method
+def order_optimal_portfolio(objective, constraints):
+    """Trade to the portfolio described by an optimize objective"""
+
+
+@api_method
+def record(*args, **kwargs):
+    """Store named values for the current session"""
+
+
+@api_method
+def get_datetime(tz=None):
+    """The current simulation time"""
+
+
+@api_method
+def set_slippage(us_equities=None, us_futures=None):
+    """Set the slippage model for equities"""
+
+
+@api_method
+def set_commission(us_equities=None, us_futures=None):
+    """Set the commission model for equities"""
+
+
+@api_method
+def set_long_only():
+    """Reject any order that would leave a short position"""
+
+
+API_NAMES = [
+    'attach_pipeline', 'pipeline_output', 'schedule_function',
+    'order', 'order_value', 'order_percent', 'order_target',
+    'order_target_value', 'order_target_percent', 'batch_order_target_percent',
+    'order_optimal_portfolio',
+    'record', 'get_datetime', 'set_slippage', 'set_commission', 'set_long_only',
+]
+
+
+def api_namespace():
+    """
+    The globals Quantopian injected into algorithm scripts
+    """
+    namespace = {name: globals()[name] for name in API_NAMES}
+    namespace.update(date_rules=date_rules, time_rules=time_rules,
+                     slippage=slippage, commission=commission)
+    return namespace
+
+
+class Position(object):
+    """
+    One asset's slot in the ledger, read live: amount, cost_basis and
+    last_sale_price always reflect the latest fill and mark
+    """
+    __slots__ = ('asset', '_ledger', '_col')
+
+    def __init__(self, asset, ledger=None, col=None):
+        self.asset = asset
+        self._ledger = ledger
+        self._col = col
+
+    @property
+    def amount(self):
+        return int(self._ledger.amount[self._col]) if self._ledger is not None else 0
+
+    @property
+    def cost_basis(self):
+        return float(self._ledger.cost_basis[self._col]) if self._ledger is not None else 0.0
+
+    @property
+    def last_sale_price(self):
+        return float(self._ledger.last_price[self._col]) if self._ledger is not None else 0.0
+
+    def __repr__(self):
+        return 'Position(%r, amount=%d, cost_basis=%.4f, last_sale_price=%.4f)' % (
+            self.asset, self.amount, self.cost_basis, self.last_sale_price)
+
+
+class Positions(Mapping):
+    """
+    Held positions by asset, a view of the ledger in the order they were
+    opened; looking up an asset that is not held gives an empty Position.
+    """
+
+    def __init__(self, ledger, assets, column_of):
+        self._ledger = ledger
+        self._assets = assets
+        self._column_of = column_of
+
+    def __getitem__(self, asset):
+        col = self._column_of.get(int(asset))
+        if col is None or col not in self._ledger:
+            return Position(asset)
+        return Position(self._assets[col], self._ledger, col)
+
+    def __contains__(self, asset):
+        return self._column_of.get(int(asset)) in self._ledger
+
+    def get(self, asset, default=None):
+        return self[asset] if asset in self else default
+
+    def __iter__(self):
+        return iter(self._assets[self._ledger.columns()].tolist())
+
+    def __len__(self):
+        return len(self._ledger)
+
+
+class Portfolio(object):
+
+    def __init__(self, capital_base, ledger, positions):
+        self.starting_cash = capital_base
+        self.positions = positions
+        self._ledger = ledger
+
+    @property
+    def cash(self):
+        return self._ledger.cash
+
+    @property
+    def positions_value(self):
+        return self._ledger.net_exposure
+
+    @property
+    def portfolio_value(self):
+        return self._ledger.cash + self._ledger.net_exposure
+
+    @property
+    def pnl(self):
+        return self.portfolio_value - self.starting_cash
+
+    @property
+    def returns(self):
+        return self.portfolio_value / self.starting_cash - 1.0
+
+    @property
+    def long_count(self):
+        return self._ledger.long_count
+
+    @property
+    def short_count(self):
+        return self._ledger.short_count
+
+
+class Account(object):
+
+    def __init__(self, portfolio):
+        self._portfolio = portfolio
+
+    @property
+    def net_liquidation(self):
+        return self._portfolio.portfolio_value
+
+    @property
+    def gross_exposure(self):
+        return self._portfolio._ledger.gross_exposure
+
+    @property
+    def net_exposure(self):
+        return self._portfolio.positions_value
+
+    @property
+    def leverage(self):
+        value = self.net_liquidation
+        return self.gross_exposure / value if value else 0.0
+
+    @property
+    def net_leverage(self):
+        value = self.net_liquidation
+        return self.net_exposure / value if value else 0.0
+
+
+class AlgorithmContext(object):
+    """
+    The `context` object passed to every user function
+    """
+
+    def __init__(self, portfolio, account):
+        self.portfolio = portfolio
+        self.account = account
+
+
+class BarData(object):
+    """
+    The `data` object passed to every user function
+    """
+
+    def __init__(self, algorithm):
+        self._algorithm = algorithm
+
+    def can_trade(self, assets):
+        if isinstance(assets, (list, tuple, pd.Index, np.ndarray)):
+            return pd.Series([self.can_trade(a) for a in assets], index=list(assets))
+        return self._algorithm._can_trade(assets)
+
+    def current(self, assets, field):
+        if isinstance(assets, (list, tuple, pd.Index, np.ndarray)):
+            return pd.Series([self.current(a, field) for a in assets], index=list(assets))
+        return self._algorithm._current_value(assets, field)
+
+
+def _month_checks(tree, name):
+    """
+    The months that function `name` in the parsed module `tree` compares a
+    `.month` attribute against with == or `in`
+    """
+    months = set()
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.FunctionDef) and node.name == name):
+            continue
+        for compare in ast.walk(node):
+            if not isinstance(compare, ast.Compare) or len(compare.ops) != 1:
+                continue
+            left, right = compare.left, compare.comparators[0]
+            if isinstance(right, ast.Attribute) and right.attr == 'month':
+                left, right = right, left
+            if not (isinstance(left, ast.Attribute) and left.attr == 'month'):
+                continue
+            if isinstance(compare.ops[0], ast.Eq):
+                values = [right]
+            elif isinstance(compare.ops[0], ast.In) and isinstance(right, (ast.Tuple, ast.List, ast.Set)):
+                values = right.elts
+            else:
+                continue
+            if all(isinstance(v, ast.Constant) and isinstance(v.value, int) for v in values):
+                months.update(v.value for v in values)
+    return sorted(months)
+
+
+class ScheduledFunction(object):
+
+    def __init__(self, func, date_rule, time_rule, order):
+        self.func = func
+        self.date_rule = date_rule if date_rule is not None else date_rules.every_day()
+        self.time_rule = time_rule if time_rule is not None else time_rules.every_minute()
+        self.order = order
+
+    @property
+    def sort_key(self):
+        return (self.time_rule.minute, self.order)
+
+
+class TradingAlgorithm(object):
+    """
+    Runs a strategy over the sessions of a ColumnarStore.
+
+    Pass `script` (source text) to run a strategy file unchanged, or the
+    user functions directly as keyword arguments.
+
+    `parameters` replaces module-level names of the script once it is
+    loaded, e.g. {'MAX_LONG_POSITION_SIZE': 0.05}. `loader` overrides the
+    pipeline engine's StoreLoader, and `shared_pipelines` hands the eager
+    pipelines to a SharedPipelines evaluating them with other algorithms'.
+
+    `pipeline_sessions` declares the sessions whose pipeline output the
+    strategy uses: 'scheduled' for those on which a scheduled function
+    other than an every_day one fires, a date rule, or a callable taking
+    the session's Timestamp. None (the default) computes every session.
+
+    With `memory_budget` (bytes) each pipeline is computed in the largest
+    blocks whose estimated working set fits the budget instead of in blocks
+    of `pipeline_chunk` sessions; the sizes chosen are in `pipeline_chunks`.
+
+    Recorded values are kept in `recorder`. With `record_path` (.parquet
+    or .npz) they are saved there when the run ends, and every
+    `checkpoint_every` sessions along the way.
+
+    `factor_cache` (a FactorCache) keeps pipeline results on disk between
+    runs, so a rerun with the same pipelines skips their computation.
+
+    `profiler` (a Profiler) times the pipeline terms, the user functions
+    and the order calls of the run.
+
+    With `compact`, pipelines keep float data as float32 and their screens
+    bit-packed (see quantopian.pipeline.compact), so output columns reach
+    the algorithm as float32.
+
+    With `optimize`, the pipeline engine merges duplicate terms, reads
+    columns directly in place of factors that only copy them and fuses
+    elementwise arithmetic before computing (see
+    quantopian.pipeline.optimizer). The outputs are the same.
+    """
+
+    def __init__(self, store, script=None, filename='<algorithm>', capital_base=100000.0,
+                 pipeline_chunk=126, pipeline_sessions=None, parameters=None, loader=None,
+                 shared_pipelines=None, memory_budget=None, record_path=None, checkpoint_every=None,
+                 factor_cache=None, profiler=None, compact=False, optimize=False,
+                 initialize=None, before_trading_start=None, handle_data=None):
+        self.store = store
+        self.record_path = record_path
+        self.checkpoint_every = checkpoint_every
+        self.capital_base = float(capital_base)
+        self.pipeline_chunk = pipeline_chunk
+        self.memory_budget = memory_budget
+        self.pipeline_chunks = {}
+        self.pipeline_sessions = pipeline_sessions
+        self.namespace = api_namespace()
+        self._tree = None
+        if script is not None:
+            self.namespace['__name__'] = '__algorithm__'
+            self._tree = ast.parse(script, filename)
+            exec(compile(self._tree, filename, 'exec'), self.namespace)
+        if parameters:
+            unknown = sorted(set(parameters) - set(self.namespace))
+            if unknown:
+                raise ValueError('the algorithm does not define %s' % ', '.join(unknown))
+            self.namespace.update(parameters)
+        self._initialize = initialize or self.namespace.get('initialize')
+        self._before_trading_start = before_trading_start or self.namespace.get('before_trading_start')
+        self._handle_data = handle_data or self.namespace.get('handle_data')
+        if self._initialize is None:
+            raise ValueError('algorithm has no initialize function')
+
+        self.profiler = profiler
+        self.name = os.path.splitext(os.path.basename(filename))[0]
+        self.engine = SimplePipelineEngine(store, loader=loader, cache=factor_cache, profiler=profiler,
+                                           compact=compact, optimize=optimize)
+        self._shared = shared_pipelines
+        self._column_of = {int(sid): i for i, sid in enumerate(store.sids)}
+        self._pipelines = {}
+        self._eager = {}
+        self._pipeline_results = {}
+        self._needed = None
+        self.pipeline_sessions_computed = 0
+        self._scheduled = []
+        self._schedule = None
+        self.slippage = slippage.FixedBasisPointsSlippage()
+        self.commission = commission.PerShare()
+        self._long_only = False
+        self._session = None
+        self.recorder = None
+
+    # -- API -------------------------------------------------------------
+
+    def attach_pipeline(self, pipeline, name, chunks=None, eager=True):
+        if name in self._pipelines:
+            raise ValueError('a pipeline named %r is already attached' % (name,))
+        self._pipelines[name] = pipeline
+        self._eager[name] = eager
+        return pipeline
+
+    def pipeline_output(self, name):
+        try:
+            pipeline = self._pipelines[name]
+        except KeyError:
+            raise ValueError('no pipeline named %r is attached' % (name,))
+        i = self._session
+        if self._shared is not None and self._eager[name] and self._needed is None:
+            return self._shared.output(self, name, i, self._stop)
+        cached = self._pipeline_results.get(name)
+        if cached is not None and cached[0] <= i < cached[0] + len(cached[1]):
+            start, result = cached
+            return result.frame(i - start)
+        if cached is not None and self._eager[name] and not self._is_needed(i):
+            # Nothing reads this session's output: hand out the last one computed.
+            start, result = cached
+            return result.frame(len(result) - 1)
+        stop = self._block_stop(name, i)
+        if self.profiler is None:
+            result = self.engine.run_chunk(pipeline, i, stop)
+        else:
+            result = self.profiler.call('pipeline', name, self.engine.run_chunk, pipeline, i, stop)
+        cached = (i, result)
+        self._pipeline_results[name] = cached
+        self.pipeline_sessions_computed += stop - i
+        return cached[1].frame(0)
+
+    def schedule_function(self, func, date_rule=None, time_rule=None, half_days=True, calendar=None):
+        self._scheduled.append(ScheduledFunction(func, date_rule, time_rule, len(self._scheduled)))
+        self._scheduled.sort(key=lambda f: f.sort_key)
+        self._schedule = None
+
+    def order(self, asset, amount, limit_price=None, stop_price=None, style=None):
+        if limit_price is not None or stop_price is not None or style is not None:
+            raise NotImplementedError('only market orders are supported')
+        amount = int(amount)
+        if amount == 0:
+            return None
+        if self._long_only and self.portfolio.positions[asset].amount + amount < 0:
+            raise TradingControlViolation(
+                'order for %d %r would leave a short position under set_long_only()' % (amount, asset))
+        return self._fill(asset, amount)
+
+    def order_value(self, asset, value):
+        price = self._price(asset)
+        if not price > 0:
+            return None
+        return self.order(asset, value / price)
+
+    def order_percent(self, asset, percent):
+        return self.order_value(asset, percent * self.portfolio.portfolio_value)
+
+    def order_target(self, asset, target):
+        return self.order(asset, int(target) - self.portfolio.positions[asset].amount)
+
+    def order_target_value(self, asset, target):
+        price = self._price(asset)
+        if not price > 0:
+            return None
+        return self.order_target(asset, target / price)
+
+    def order_target_percent(self, asset, target):
+        return self.order_target_value(asset, target * self.portfolio.portfolio_value)
+
+    def order_optimal_portfolio(self, objective, constraints):
+        if constraints:
+            raise NotImplementedError('optimize constraints are not supported offline')
+        weights = objective.target_weights()
+        exits = [asset for asset in self.portfolio.positions if asset not in weights.index]
+        return self.batch_order_target_percent(pd.concat([pd.Series(0.0, index=exits), weights]))
+
+    def batch_order_target_percent(self, weights):
+        """
+        order_target_percent for every asset in `weights` at once: targets are
+        all taken from the portfolio value before the batch, and share deltas,
+        fills, slippage and commissions are computed as arrays. Assets that
+        cannot trade are skipped. Returns the filled shares by asset.
+        """
+        weights = pd.Series(weights, dtype=np.float64).dropna()
+        if weights.empty:
+            return pd.Series(dtype=np.int64)
+        i = self._session
+        cols = np.array([self._column_of.get(int(asset), -1) for asset in weights.index])
+        known = cols >= 0
+        safe = np.where(known, cols, 0)
+        prices = self._close[i, safe].astype(np.float64)
+        alive = known & (self.store._first[safe] <= i) & (i <= self.store._last[safe]) & (prices > 0)
+        if not alive.any():
+            return pd.Series(dtype=np.int64)
+        assets = weights.index[alive]
+        cols, prices = safe[alive], prices[alive]
+
+        held = self.ledger.amount[cols]
+        targets = np.trunc(weights.values[alive] * self.portfolio.portfolio_value / prices).astype(np.int64)
+        if self._long_only and (targets < 0).any():
+            asset = assets[np.argmax(targets < 0)]
+            raise TradingControlViolation(
+                'batch order for %r would leave a short position under set_long_only()' % (asset,))
+        used = np.array([self._volume_used.get(col, 0) for col in cols], dtype=np.int64)
+        filled, fill_prices = self.slippage.simulate_batch(
+            targets - held, prices, self._volume[i, cols].astype(np.float64), used)
+        traded = filled != 0
+        if not traded.any():
+            return pd.Series(dtype=np.int64)
+        filled, fill_prices, cols = filled[traded], fill_prices[traded], cols[traded]
+        costs = self.commission.calculate_batch(filled, fill_prices)
+        self.ledger.fill_batch(cols, filled, fill_prices, prices[traded], costs)
+        for col, used_now in zip(cols.tolist(), (used[traded] + np.abs(filled)).tolist()):
+            self._volume_used[col] = used_now
+        return pd.Series(filled, index=assets[traded])
+
+    def record(self, *args, **kwargs):
+        if len(args) % 2:
+            raise ValueError('record() takes name, value pairs')
+        row = self._session - self._start
+        for name, value in zip(args[::2], args[1::2]):
+            self.recorder.write(row, name, value)
+        for name, value in kwargs.items():
+            self.recorder.write(row, name, value)
+
+    def get_datetime(self, tz=None):
+        close = pd.Timestamp(self.store.calendar[self._session]) + pd.Timedelta(hours=16)
+        return close.tz_localize('US/Eastern').tz_convert(tz or 'UTC')
+
+    def set_slippage(self, us_equities=None, us_futures=None):
+        if us_equities is not None:
+            self.slippage = us_equities
+
+    def set_commission(self, us_equities=None, us_futures=None):
+        if us_equities is not None:
+            self.commission = us_equities
+
+    def set_long_only(self):
+        self._long_only = True
+
+    # -- simulation ------------------------------------------------------
+
+    def run(self, start_date, end_date):
+        """
+        Simulate the sessions between start_date and end_date inclusive and
+        return one row of performance per session.
+        """
+        global _algorithm
+        start, stop = _session_range(self.store, start_date, end_date)
+        previous, _algorithm = _algorithm, self
+        frame = self.profiler.start('algorithm', self.name) if self.profiler is not None else None
+        try:
+            self._begin(start, stop)
+            for i in range(start, stop):
+                self._run_session(i)
+        finally:
+            _algorithm = previous
+            if frame is not None:
+                self.profiler.stop(frame)
+        return self._performance()
+
+    def pipelines(self, start_date, end_date, eager_only=True):
+        """
+        Run initialize as for a run between start_date and end_date and
+        return the eager pipelines it attaches, or all of them, by name
+        """
+        global _algorithm
+        start, stop = _session_range(self.store, start_date, end_date)
+        previous, _algorithm = _algorithm, self
+        try:
+            self._begin(start, stop)
+        finally:
+            _algorithm = previous
+        return {name: pipeline for name, pipeline in self._pipelines.items()
+                if self._eager[name] or not eager_only}
+
+    def _begin(self, start, stop):
+        """
+        Set up the portfolio and run initialize for sessions [start, stop)
+        """
+        self._start, self._stop = start, stop
+        self.ledger = Ledger(len(self.store.sids), self.capital_base)
+        positions = Positions(self.ledger, self.store.assets, self._column_of)
+        self.portfolio = Portfolio(self.capital_base, self.ledger, positions)
+        self.account = Account(self.portfolio)
+        self.context = AlgorithmContext(self.portfolio, self.account)
+        self.data = BarData(self)
+        self._close = self.store.column('close')
+        self._volume = self.store.column('volume')
+        self._session = start
+        index = pd.DatetimeIndex(self.store.calendar[start:stop], name='session')
+        self.recorder = Recorder(index, self.store.assets, self._column_of)
+        for name in PERFORMANCE_COLUMNS:
+            self.recorder.declare(name)
+        if self.profiler is not None:
+            self.profiler.call('function', 'initialize', self._initialize, self.context)
+            self._instrument()
+        else:
+            self._initialize(self.context)
+        self._needed = self._resolve_pipeline_sessions(start, stop)
+        if self._shared is not None and self._needed is None:
+            for name, pipeline in self._pipelines.items():
+                if self._eager[name]:
+                    self._shared.attach(self, name, pipeline)
+
+    def _instrument(self):
+        """
+        Time the user functions called every session in the profiler
+        """
+        wrap = self.profiler.wrap
+        if self._before_trading_start is not None:
+            self._before_trading_start = wrap('function', self._before_trading_start, 'before_trading_start')
+        if self._handle_data is not None:
+            self._handle_data = wrap('function', self._handle_data, 'handle_data')
+        for scheduled in self._scheduled:
+            scheduled.func = wrap('function', scheduled.func)
+        self._schedule = None
+
+    def _performance(self):
+        if self.record_path is not None:
+            self.recorder.save(self.record_path)
+        return self.recorder.frame()
+
+    def _run_session(self, i):
+        self._session = i
+        self._volume_used = {}
+        self._close_delisted(i)
+        self._apply_actions(i)
+        if self._before_trading_start is not None:
+            self._before_trading_start(self.context, self.data)
+        self._mark_to_market(i)
+        if self._handle_data is not None:
+            self._handle_data(self.context, self.data)
+        if self._schedule is None:
+            self._compile_schedule()
+        for scheduled in self._schedule[i - self._start]:
+            scheduled.func(self.context, self.data)
+        self._mark_to_market(i)
+        # Closed positions stay listed until the close, so user code may
+        # keep iterating context.portfolio.positions while it orders.
+        self.ledger.drop_closed()
+
+        row = i - self._start
+        write = self.recorder.write
+        write(row, 'portfolio_value', self.portfolio.portfolio_value)
+        write(row, 'cash', self.portfolio.cash)
+        write(row, 'positions_value', self.portfolio.positions_value)
+        write(row, 'gross_leverage', self.account.leverage)
+        write(row, 'net_leverage', self.account.net_leverage)
+        if (self.record_path is not None and self.checkpoint_every
+                and (row + 1) % self.checkpoint_every == 0):
+            self.recorder.save(self.record_path, row + 1)
+
+    def _resolve_pipeline_sessions(self, start, stop):
+        """
+        Boolean array over sessions [start, stop) of the sessions whose
+        pipeline output is used, or None when every session is
+        """
+        spec = self.pipeline_sessions
+        calendar = self.store.calendar
+        if spec is None:
+            return None
+        if spec == 'scheduled':
+            rules = [f.date_rule for f in self._scheduled if not isinstance(f.date_rule, EveryDay)]
+            if not rules:
+                return None
+            needed = np.zeros(stop - start, dtype=bool)
+            for rule in rules:
+                needed |= rule.sessions(calendar, start, stop)
+            return needed
+        if isinstance(spec, DateRule):
+            return spec.sessions(calendar, start, stop)
+        if callable(spec):
+            return np.array([bool(spec(pd.Timestamp(d, tz='UTC'))) for d in calendar[start:stop]], dtype=bool)
+        raise ValueError("pipeline_sessions must be None, 'scheduled', a date rule or a callable, got %r"
+                         % (spec,))
+
+    def _compile_schedule(self):
+        """
+        For each session of the run, the scheduled functions due on it in
+        time-rule order
+        """
+        calendar = self.store.calendar
+        fired = np.array([f.date_rule.sessions(calendar, self._start, self._stop) for f in self._scheduled],
+                         dtype=bool).reshape(len(self._scheduled), self._stop - self._start)
+        self._schedule = [tuple(self._scheduled[k] for k in np.flatnonzero(column)) for column in fired.T]
+        for scheduled in self._scheduled:
+            self._check_sparse(scheduled)
+
+    def _check_sparse(self, scheduled):
+        """
+        Warn about functions scheduled on more sessions than they act on
+        because they test for a fixed month themselves
+        """
+        rule = scheduled.date_rule
+        if isinstance(rule, InMonths):
+            return
+        func = scheduled.func
+        tree = self._tree
+        if tree is None or func.__name__ not in self.namespace:
+            try:
+                tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+            except (OSError, TypeError, SyntaxError):
+                return
+        months = _month_checks(tree, func.__name__)
+        if months:
+            months = ', '.join(str(m) for m in months)
+            code = func.__code__
+            warnings.warn_explicit(
+                '%s is scheduled with %r but only acts when the month is %s; adding '
+                '.in_months(%s) to its date rule skips the other sessions'
+                % (func.__name__, rule, months, months),
+                ScheduleWarning, code.co_filename, code.co_firstlineno)
+
+    def _is_needed(self, i):
+        return self._needed is None or self._needed[i - self._start]
+
+    def _block_stop(self, name, i):
+        """
+        End of the block of sessions to compute when session i needs `name`:
+        up to the pipeline's chunk size, stopping at the first unneeded one
+        """
+        if not self._eager[name]:
+            return i + 1
+        stop = min(i + self._chunk_size(name), self._stop)
+        if self._needed is None:
+            return stop
+        needed = self._needed[i - self._start:stop - self._start]
+        if not needed[0]:
+            return i + 1
+        gaps = np.flatnonzero(~needed)
+        return i + gaps[0] if len(gaps) else stop
+
+    def _chunk_size(self, name):
+        if name not in self.pipeline_chunks:
+            size = self.pipeline_chunk
+            if self.memory_budget is not None:
+                graph = pipeline_graph(self._pipelines[name])
+                size = self.engine.chunk_size(graph, self.memory_budget, limit=self._stop - self._start)
+            self.pipeline_chunks[name] = size
+        return self.pipeline_chunks[name]
+
+    def _price(self, asset):
+        return float(self._close[self._session, self._column_of[int(asset)]])
+
+    def _can_trade(self, asset):
+        col = self._column_of.get(int(asset))
+        if col is None:
+            return False
+        alive = self.store._first[col] <= self._session <= self.store._last[col]
+        return bool(alive and np.isfinite(self._close[self._session, col]))
+
+    def _current_value(self, asset, field):
+        col = self._column_of[int(asset)]
+        return self.store.column(field)[self._session, col]
+
+    def _fill(self, asset, amount):
+        col = self._column_of[int(asset)]
+        price = float(self._close[self._session, col])
+        volume = float(self._volume[self._session, col])
+        used = self._volume_used.get(col, 0)
+        filled, fill_price = self.slippage.simulate(amount, price, volume, used)
+        if filled == 0:
+            return None
+        self._volume_used[col] = used + abs(filled)
+        cost = self.commission.calculate(filled, fill_price)
+        self.ledger.fill(col, filled, fill_price, price, cost)
+        return filled
+
+    def _mark_to_market(self, i):
+        self.ledger.mark(self._close[i])
+
+    def _apply_actions(self, i):
+        """
+        Adjust the positions for splits and dividends going ex on session i
+        """
+        rows, cols, ratios, kinds = self.store.actions(i, i + 1)
+        if len(rows):
+            self.ledger.apply_actions(cols, ratios, kinds == ADJUSTMENT_KINDS['split'])
+
+    def _close_delisted(self, i):
+        """
+        Convert positions in assets past their last session to cash at the last price
+        """
+        cols = self.ledger.columns()
+        self.ledger.close(cols[self.store._last[cols] < i])
+
+
+class SharedPipelines(object):
+    """
+    The eager pipelines of several algorithms, evaluated as one term graph.
+
+    Each block of sessions is computed once for every attached pipeline, so
+    columns and terms the pipelines have in common are loaded and computed
+    once rather than once per algorithm. With `memory_budget` the block
+    size is chosen to fit the merged graph in the budget instead.
+    """
+
+    def __init__(self, engine, chunk=126, memory_budget=None):
+        self.engine = engine
+        self.chunk = chunk
+        self.memory_budget = memory_budget
+        self._pipelines = {}
+        self._graph = None
+        self._results = {}
+        self._start = self._stop = None
+
+    def attach(self, algorithm, name, pipeline):
+        self._pipelines[(algorithm, name)] = pipeline
+        self._graph = None
+        self._results = {}
+
+    def output(self, algorithm, name, i, stop):
+        """
+        The output of `algorithm`'s pipeline `name` for session i
+        """
+        key = (algorithm, name)
+        if key not in self._results or not self._start <= i < self._stop:
+            self._build_graph(stop - i)
+            self._compute(i, min(i + self.chunk, stop))
+        return self._results[key].frame(i - self._start)
+
+    def _build_graph(self, remaining):
+        if self._graph is not None:
+            return
+        outputs = {}
+        for key, pipeline in self._pipelines.items():
+            for column, term in pipeline.columns.items():
+                outputs[key + (column,)] = term
+            screen = pipeline.screen if pipeline.screen is not None else AssetExists()
+            outputs[key + (SCREEN_NAME,)] = screen
+        self._graph = TermGraph(outputs)
+        if self.memory_budget is not None:
+            self.chunk = self.engine.chunk_size(self._graph, self.memory_budget, limit=remaining)
+
+    def _compute(self, start, stop):
+        if self.engine.profiler is None:
+            arrays = self.engine.compute(self._graph, start, stop)
+        else:
+            arrays = self.engine.profiler.call('pipeline', 'shared', self.engine.compute, self._graph, start, stop)
+        dates = self.engine.store.calendar[start:stop]
+        assets = self.engine.store.assets
+        self._results = {
+            key: PipelineResult(dates, assets, {c: arrays[key + (c,)] for c in pipeline.columns},
+                                arrays[key + (SCREEN_NAME,)], packed=self.engine.compact)
+            for key, pipeline in self._pipelines.items()
+        }
+        self._start, self._stop = start, stop
+
+
+def _session_range(store, start_date, end_date):
+    start, stop = store.sessions_in_range(start_date, end_date)
+    if start >= stop:
+        raise ValueError('no sessions between %s and %s' % (start_date, end_date))
+    return start, stop
+
+
+def run_algorithms(paths, store, start, end, capital_base=100000.0, pipeline_chunk=126,
+                   memory_budget=None, **kwargs):
+    """
+    Run several strategy scripts side by side in one pass over the sessions.
+
+    Their eager pipelines are merged into one term graph, so shared inputs
+    and terms are loaded and computed once; each script keeps its own
+    portfolio. Returns {script name: daily performance frame}. A
+    `record_path` gets the script name added before its extension.
+    """
+    global _algorithm
+    profiler = kwargs.get('profiler')
+    engine = SimplePipelineEngine(store, cache=kwargs.get('factor_cache'), profiler=profiler,
+                                  compact=kwargs.get('compact', False),
+                                  optimize=kwargs.get('optimize', False))
+    shared = SharedPipelines(engine, pipeline_chunk, memory_budget)
+    record_path = kwargs.pop('record_path', None)
+    algorithms = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in algorithms:
+            raise ValueError('two scripts are named %r' % (name,))
+        with io.open(path, encoding='utf-8') as f:
+            script = f.read()
+        if record_path is not None:
+            root, ext = os.path.splitext(record_path)
+            kwargs['record_path'] = '%s_%s%s' % (root, name, ext)
+        algorithms[name] = TradingAlgorithm(
+            store, script=script, filename=path, capital_base=capital_base,
+            pipeline_chunk=pipeline_chunk, shared_pipelines=shared, memory_budget=memory_budget,
+            **kwargs)
+
+    start, stop = _session_range(store, start, end)
+    previous = _algorithm
+    try:
+        for algorithm in algorithms.values():
+            _algorithm = algorithm
+            if profiler is None:
+                algorithm._begin(start, stop)
+            else:
+                profiler.call('algorithm', algorithm.name, algorithm._begin, start, stop)
+        for i in range(start, stop):
+            for name, algorithm in algorithms.items():
+                _algorithm = algorithm
+                if profiler is None:
+                    algorithm._run_session(i)
+                else:
+                    profiler.call('algorithm', name, algorithm._run_session, i)
+    finally:
+        _algorithm = previous
+    return {name: algorithm._performance() for name, algorithm in algorithms.items()}
+
+
+def run_algorithm(path, store, start, end, capital_base=100000.0, **kwargs):
+    """
+    Run the strategy script at `path` against `store` and return its
+    daily performance frame.
+    """
+    with io.open(path, encoding='utf-8') as f:
+        script = f.read()
+    algorithm = TradingAlgorithm(store, script=script, filename=path,
+                                 capital_base=capital_base, **kwargs)
+    return algorithm.run(start, end)
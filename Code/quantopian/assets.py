@@ -0,0 +1,38 @@
+"""
+Security objects handed to algorithms as pipeline index entries
+"""
+
+
+class Equity(object):
+    """
+    A single security, identified by its integer sid
+    """
+    __slots__ = ('sid', 'symbol')
+
+    def __init__(self, sid, symbol=None):
+        self.sid = int(sid)
+        self.symbol = symbol if symbol is not None else str(sid)
+
+    def __int__(self):
+        return self.sid
+
+    def __index__(self):
+        return self.sid
+
+    def __hash__(self):
+        return hash(self.sid)
+
+    def __eq__(self, other):
+        if isinstance(other, Equity):
+            return self.sid == other.sid
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other):
+        return self.sid < int(other)
+
+    def __repr__(self):
+        return 'Equity(%d [%s])' % (self.sid, self.symbol)
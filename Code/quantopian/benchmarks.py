@@ -0,0 +1,337 @@
+"""
+Benchmarks of the strategy scripts' factor kernels on synthetic windows
+
+Every CustomFactor a script defines (TrailingTwelveMonths in Black Cat,
+Piotroski, the rolling Momentum and Volatility of the Value strategy)
+and every module-level helper that takes arrays (trailing_twelve_months)
+is called directly with synthetic windows of its own window length over
+2,000 and 8,000 assets: random-walk prices, fundamentals that step once a
+quarter with whole quarters missing, and as-of dates that move with them. Each case reports
+the best time per call and the peak memory one call allocates.
+
+Results are compared with a baseline file, and a case that got slower or
+allocates more than the tolerance allows fails the run:
+
+    python -m quantopian.benchmarks "Developed on Black_Cat_Acquirer_Multiple.py" \
+        "Developed on Guy_Fleury_Piotroski-F-Score.py" My_Value_Long_only_Algo.py --save
+    python -m quantopian.benchmarks "Developed on Black_Cat_Acquirer_Multiple.py" \
+        "Developed on Guy_Fleury_Piotroski-F-Score.py" My_Value_Long_only_Algo.py
+
+My_Magic_Formula.py reads its ratios as columns and has no kernels.
+
+Timings depend on the machine, so baselines are saved per checkout
+(benchmarks.json by default) rather than shared.
+"""
+import argparse
+import inspect
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from quantopian.algorithm import api_namespace
+from quantopian.pipeline.data.dataset import Column, DataSet, DataSetMeta
+from quantopian.pipeline.factors import CustomFactor
+from quantopian.pipeline.factors.rolling import RollingFactor, RollingWindow
+from quantopian.utils.memory import format_size
+
+ASSET_COUNTS = (2000, 8000)
+SESSIONS_PER_QUARTER = 63
+PRICE_NAMES = ('open', 'high', 'low', 'close', 'price')
+# Parameters naming the algorithm's state rather than data.
+STATE_NAMES = ('context', 'data')
+TODAY = pd.Timestamp('2019-04-01', tz='UTC')
+
+
+class Case(object):
+    """
+    One kernel at one shape: `call()` runs it once on prepared inputs
+    """
+
+    def __init__(self, name, window, n_assets, call):
+        self.name = name
+        self.window = window
+        self.n_assets = n_assets
+        self.call = call
+
+    @property
+    def key(self):
+        return '%s w=%d n=%d' % (self.name, self.window, self.n_assets)
+
+
+def _kind(name, column=None):
+    """
+    What kind of data an input holds, from its column or parameter name
+    """
+    if column is not None:
+        if column.dtype.kind == 'M':
+            return 'asof_date'
+        if column.dtype.kind != 'f':
+            return 'static'
+        if column.dataset.__name__ == 'USEquityPricing':
+            return 'volume' if column.name == 'volume' else 'price'
+    if 'date' in name:
+        return 'asof_date'
+    if name in PRICE_NAMES:
+        return 'price'
+    if 'volume' in name:
+        return 'volume'
+    return 'fundamental'
+
+
+def synthetic_window(kind, window, n_assets, rng, phase, nan_fraction=0.05, dtype=np.float64):
+    """
+    A window x assets array of `kind` data. Fundamentals and as-of dates
+    change every SESSIONS_PER_QUARTER rows at each asset's `phase`, and a
+    `nan_fraction` of asset-quarters is missing.
+    """
+    rows = np.arange(window)[:, None]
+    quarter = (rows + phase) // SESSIONS_PER_QUARTER
+    n_quarters = int(quarter.max()) + 1
+    missing = (rng.random((n_quarters, n_assets)) < nan_fraction)[quarter, np.arange(n_assets)]
+    if kind == 'price':
+        returns = rng.normal(0.0003, 0.02, (window, n_assets))
+        data = 20.0 * np.exp(np.cumsum(returns, axis=0)) * rng.uniform(0.5, 5.0, n_assets)
+        data[rng.random((window, n_assets)) < nan_fraction / 5] = np.nan
+    elif kind == 'volume':
+        data = rng.uniform(2e5, 5e6, (window, n_assets))
+        data[rng.random((window, n_assets)) < nan_fraction / 5] = np.nan
+    elif kind == 'asof_date':
+        # Reported 30 to 80 days after the quarter it covers.
+        lag = rng.integers(30, 80, n_assets)
+        days = (quarter - n_quarters) * 91 - lag
+        data = (np.datetime64(TODAY.tz_localize(None), 'D') + days).astype('datetime64[ns]')
+        data[missing] = np.datetime64('NaT')
+        return data
+    elif kind == 'static':
+        return np.broadcast_to(np.zeros(n_assets, dtype=dtype), (window, n_assets))
+    else:
+        data = rng.normal(0.1, 0.5, (n_quarters, n_assets))[quarter, np.arange(n_assets)]
+        data[missing] = np.nan
+    return data.astype(dtype)
+
+
+def _parameters(function, skip):
+    names = list(inspect.signature(function).parameters.values())[skip:]
+    return [p for p in names if p.kind == p.POSITIONAL_OR_KEYWORD and p.default is p.empty]
+
+
+def _instance(cls):
+    """
+    `cls` with its default inputs, or for a factor the pipeline gives
+    inputs to, with one placeholder column per compute parameter
+    """
+    if cls.inputs:
+        return cls()
+    names = [p.name for p in _parameters(cls.compute, 4)]
+    columns = {name: Column('datetime64[ns]' if _kind(name) == 'asof_date' else np.float64) for name in names}
+    dataset = DataSetMeta('BenchmarkInputs', (DataSet,), columns)
+    return cls(inputs=[getattr(dataset, name) for name in names])
+
+
+def factor_case(cls, n_assets, seed=0):
+    """
+    The Case calling the compute of a `cls` instance once on synthetic
+    input windows
+    """
+    factor = _instance(cls)
+    window = factor.window_length
+    rng = np.random.default_rng(seed)
+    phase = rng.integers(0, SESSIONS_PER_QUARTER, n_assets)
+    names = [p.name for p in _parameters(cls.compute, 4)]
+    inputs = [synthetic_window(_kind(name, column), window, n_assets, rng, phase, dtype=column.dtype)
+              for name, column in zip(names, factor.inputs)]
+    if issubclass(cls, RollingFactor):
+        windows = []
+        for data in inputs:
+            rolling = RollingWindow(window, n_assets, data.dtype)
+            for row in data:
+                rolling.push(row)
+            windows.append(rolling)
+        inputs = windows
+    assets = np.arange(n_assets)
+
+    def call():
+        out = factor._allocate(n_assets)
+        factor.compute(TODAY, assets, out, *inputs, **factor.params)
+    return Case(cls.__name__, window, n_assets, call)
+
+
+def function_case(function, window, n_assets, seed=0):
+    """
+    The Case calling a helper function on synthetic windows for each of
+    its required parameters
+    """
+    rng = np.random.default_rng(seed)
+    phase = rng.integers(0, SESSIONS_PER_QUARTER, n_assets)
+    inputs = [synthetic_window(_kind(p.name), window, n_assets, rng, phase)
+              for p in _parameters(function, 0)]
+    return Case(function.__name__, window, n_assets, lambda: function(*inputs))
+
+
+def script_kernels(path):
+    """
+    (factor classes, helper functions) defined by the script at `path`.
+    Helpers are the functions whose required parameters are all data, not
+    the context or the zero-argument pipeline builders.
+    """
+    with io.open(path, encoding='utf-8') as f:
+        script = f.read()
+    namespace = api_namespace()
+    namespace['__name__'] = '__algorithm__'
+    exec(compile(script, path, 'exec'), namespace)
+    factors, functions = [], []
+    for value in namespace.values():
+        if getattr(value, '__module__', None) != '__algorithm__':
+            continue
+        if isinstance(value, type) and issubclass(value, CustomFactor):
+            factors.append(value)
+        elif inspect.isfunction(value):
+            parameters = _parameters(value, 0)
+            if parameters and not any(p.name in STATE_NAMES for p in parameters):
+                functions.append(value)
+    return factors, functions
+
+
+def script_cases(path, asset_counts=ASSET_COUNTS, seed=0):
+    """
+    The Cases of every kernel in the script at `path`. Helper functions run
+    at each window length of the script's factors other than 1.
+    """
+    label = os.path.splitext(os.path.basename(path))[0]
+    factors, functions = script_kernels(path)
+    windows = sorted({_instance(cls).window_length for cls in factors} - {1}) or [22]
+    cases = []
+    for n_assets in asset_counts:
+        for cls in factors:
+            cases.append(factor_case(cls, n_assets, seed))
+        for function in functions:
+            cases.extend(function_case(function, window, n_assets, seed) for window in windows)
+    for case in cases:
+        case.name = '%s:%s' % (label, case.name)
+    return cases
+
+
+def measure(case, repeat=5):
+    """
+    (best seconds per call over `repeat` calls, peak bytes allocated by one call)
+    """
+    case.call()     # warm up caches and lazy imports
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case.call()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        case.call()
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(paths, asset_counts=ASSET_COUNTS, repeat=5, seed=0, match=None):
+    """
+    Measure every kernel of the scripts at `paths`; one row per case,
+    indexed by case key
+    """
+    rows = {}
+    for path in paths:
+        for case in script_cases(path, asset_counts, seed):
+            if match is not None and match not in case.key:
+                continue
+            seconds, peak = measure(case, repeat)
+            rows[case.key] = {'window': case.window, 'assets': case.n_assets,
+                              'seconds': seconds, 'peak_bytes': peak}
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['window', 'assets', 'seconds', 'peak_bytes'])
+
+
+def compare(results, baseline, tolerance=1.5, memory_tolerance=1.25, min_seconds=1e-4, min_bytes=1 << 20):
+    """
+    `results` with the baseline figures and a status per case: 'ok', 'new',
+    'slower' (more than `tolerance` times the baseline and `min_seconds`
+    above it) or 'memory' (more than `memory_tolerance` times the baseline
+    peak and `min_bytes` above it)
+    """
+    table = results.copy()
+    table['baseline_seconds'] = [baseline.get(key, {}).get('seconds', np.nan) for key in table.index]
+    table['baseline_bytes'] = [baseline.get(key, {}).get('peak_bytes', np.nan) for key in table.index]
+    slower = ((table['seconds'] > table['baseline_seconds'] * tolerance)
+              & (table['seconds'] - table['baseline_seconds'] > min_seconds))
+    heavier = ((table['peak_bytes'] > table['baseline_bytes'] * memory_tolerance)
+               & (table['peak_bytes'] - table['baseline_bytes'] > min_bytes))
+    table['status'] = np.where(table['baseline_seconds'].isnull(), 'new',
+                               np.where(slower, 'slower', np.where(heavier, 'memory', 'ok')))
+    return table
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with io.open(path, encoding='utf-8') as f:
+        return json.load(f)['cases']
+
+
+def save_baseline(path, results, merge=True):
+    """
+    Write `results` as the baseline at `path`, keeping the other cases
+    already there unless `merge` is False
+    """
+    cases = load_baseline(path) if merge else {}
+    cases.update((key, {'seconds': float(row['seconds']), 'peak_bytes': int(row['peak_bytes'])})
+                 for key, row in results.iterrows())
+    document = {'python': platform.python_version(), 'numpy': np.__version__,
+                'machine': platform.machine(), 'cases': dict(sorted(cases.items()))}
+    tmp = path + '.tmp'
+    with io.open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _print(table):
+    width = max(len(key) for key in table.index)
+    print('%-*s %12s %12s %8s %7s' % (width, 'case', 'per call', 'peak memory', 'vs base', 'status'))
+    for key, row in table.iterrows():
+        ratio = row['seconds'] / row['baseline_seconds'] if row['baseline_seconds'] > 0 else np.nan
+        print('%-*s %10.3fms %12s %8s %7s' % (
+            width, key, 1e3 * row['seconds'], format_size(row['peak_bytes']),
+            '-' if np.isnan(ratio) else '%.2fx' % ratio, row['status']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m quantopian.benchmarks')
+    parser.add_argument('scripts', nargs='+', metavar='script', help='strategy file whose kernels to run')
+    parser.add_argument('--assets', type=int, nargs='+', default=list(ASSET_COUNTS))
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per case; the best counts')
+    parser.add_argument('--match', help='only run cases whose name contains this')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default='benchmarks.json', help='baseline file to compare with')
+    parser.add_argument('--save', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='fail a case slower than this many times its baseline')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scripts, args.assets, args.repeat, args.seed, args.match)
+    table = compare(results, load_baseline(args.baseline), args.tolerance)
+    _print(table)
+    if args.save:
+        save_baseline(args.baseline, results)
+        print('baseline saved to %s' % args.baseline)
+        return 0
+    failed = table.index[table['status'].isin(['slower', 'memory'])]
+    if len(failed):
+        print('%d of %d cases regressed: %s' % (len(failed), len(table), ', '.join(failed)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
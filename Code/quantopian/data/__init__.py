@@ -0,0 +1,4 @@
+from quantopian.data.events import EventColumn
+from quantopian.data.store import ColumnarStore, convert_to_events, convert_to_float32, write_store
+
+__all__ = ['ColumnarStore', 'EventColumn', 'convert_to_events', 'convert_to_float32', 'write_store']
@@ -0,0 +1,135 @@
+"""
+Point-in-time columns: values stored only where they change
+
+Fundamentals change once a quarter but a dense column repeats them every
+session. An event column keeps, per asset, the sorted dates on which a new
+value took effect and the value itself:
+
+    events/<name>/offsets.npy   int64, n_assets + 1; asset j's events are
+                                dates[offsets[j]:offsets[j + 1]]
+    events/<name>/dates.npy     datetime64[D], the session each value took effect
+    events/<name>/values.npy    the values, in the column's dtype
+
+Every asset has an event on the first session, so any session has a value
+in force. An EventColumn reads like the dense dates x assets array it
+replaces: indexing rows expands only those rows, with one searchsorted per
+asset for the value in force at the first row.
+"""
+import os
+
+import numpy as np
+
+
+def _missing(data):
+    kind = data.dtype.kind
+    if kind == 'M':
+        return np.isnat(data)
+    if kind == 'f':
+        return np.isnan(data)
+    return np.zeros(data.shape, dtype=bool)
+
+
+def encode_events(dense, chunk=256):
+    """
+    (offsets, rows, values) of the changes in a dates x assets array,
+    reading `chunk` rows at a time; missing values compare equal
+    """
+    n_dates, n_assets = dense.shape
+    rows, cols = [np.zeros(n_assets, dtype=np.int64)], [np.arange(n_assets)]
+    previous = np.asarray(dense[0])
+    for lo in range(1, n_dates, chunk):
+        block = np.asarray(dense[lo:lo + chunk])
+        before = np.concatenate([previous[None], block[:-1]])
+        changed = (block != before) & ~(_missing(block) & _missing(before))
+        r, c = np.nonzero(changed)
+        rows.append(r + lo)
+        cols.append(c)
+        previous = block[-1]
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    order = np.lexsort((rows, cols))
+    rows, cols = rows[order], cols[order]
+    values = np.asarray(dense[rows, cols])
+    offsets = np.zeros(n_assets + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cols, minlength=n_assets), out=offsets[1:])
+    return offsets, rows, values
+
+
+def write_events(root, name, dense, calendar):
+    """
+    Write the dates x assets array `dense` as event column `name` of the
+    store at `root`
+    """
+    directory = os.path.join(root, 'events', name)
+    os.makedirs(directory, exist_ok=True)
+    offsets, rows, values = encode_events(dense)
+    calendar = np.asarray(calendar).astype('datetime64[D]')
+    np.save(os.path.join(directory, 'offsets.npy'), offsets)
+    np.save(os.path.join(directory, 'dates.npy'), calendar[rows])
+    np.save(os.path.join(directory, 'values.npy'), values)
+    return len(rows)
+
+
+class EventColumn(object):
+    """
+    An event column of a store, indexed like a dates x assets array
+    """
+    ndim = 2
+
+    def __init__(self, directory, calendar):
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'))
+        self.dates = np.load(os.path.join(directory, 'dates.npy'), mmap_mode='r')
+        self.values = np.load(os.path.join(directory, 'values.npy'), mmap_mode='r')
+        n_assets = len(self.offsets) - 1
+        self.shape = (len(calendar), n_assets)
+        self.dtype = self.values.dtype
+        # Events sorted by (asset, session) as one key, so a single
+        # searchsorted finds every asset's value in force at a session.
+        rows = np.searchsorted(calendar, self.dates.astype(calendar.dtype))
+        owner = np.repeat(np.arange(n_assets, dtype=np.int64), np.diff(self.offsets))
+        self._keys = owner * len(calendar) + rows
+        self._rows = rows
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.dates.nbytes + self.values.nbytes
+
+    def __getitem__(self, key):
+        cols = slice(None)
+        if isinstance(key, tuple):
+            key, cols = key
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.shape[0])
+            if step != 1:
+                raise IndexError('event columns only support contiguous row slices')
+            return self.load(start, max(start, stop))[:, cols]
+        row = int(key)
+        if row < 0:
+            row += self.shape[0]
+        return self.load(row, row + 1)[0, cols]
+
+    def load(self, start, stop):
+        """
+        Rows [start, stop) expanded to a dates x assets array
+        """
+        n_dates, n_assets = stop - start, self.shape[1]
+        if n_dates <= 0:
+            return np.empty((0, n_assets), dtype=self.dtype)
+        base = np.arange(n_assets, dtype=np.int64) * self.shape[0]
+        first = np.searchsorted(self._keys, base + start, 'right') - 1
+        last = np.searchsorted(self._keys, base + stop, 'left')
+        # Index of the event in force per cell: the one at the first row,
+        # overwritten where a later event falls inside the range.
+        index = np.empty((n_dates, n_assets), dtype=np.int64)
+        index[:] = first
+        counts = last - first - 1
+        if counts.sum():
+            inside = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) \
+                + np.repeat(first + 1, counts)
+            index[self._rows[inside] - start, np.repeat(np.arange(n_assets), counts)] = inside
+            np.maximum.accumulate(index, axis=0, out=index)
+        out = self.values[index]
+        out.flags.writeable = False
+        return out
@@ -0,0 +1,292 @@
+"""
+Local columnar store read by the pipeline engine and the simulator
+
+Layout of a store directory:
+
+    calendar.npy            trading sessions, datetime64[D], sorted
+    sids.npy                int64 security ids, one per asset column
+    symbols.npy             (optional) ticker per asset
+    start_date.npy          (optional) first session each asset exists
+    end_date.npy            (optional) last session each asset exists
+    columns/<name>.npy      one array per field, laid out dates x assets,
+                            or a 1-D per-asset array for static attributes
+    events/<name>/          a dates x assets field stored point-in-time, as
+                            the values and the dates they took effect
+                            (see quantopian/data/events.py)
+    adjustments/            (optional) splits and dividends: sid.npy,
+                            date.npy (ex-date), ratio.npy and kind.npy
+                            (0 split, 1 dividend), one entry per event
+
+Prices are stored as traded. On an ex-date the earlier prices of the asset
+are multiplied by `ratio`, and for a split its earlier volumes divided by
+it; the pipeline applies this as of the end of each window.
+
+Every column is opened with mmap_mode='r', so a window is a view into the
+page cache rather than a copy.
+"""
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+from quantopian.assets import Equity
+from quantopian.data.events import EventColumn, write_events
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+VOLUME_FIELDS = ('volume',)
+ADJUSTMENT_KINDS = {'split': 0, 'dividend': 1}
+
+
+class ColumnarStore(object):
+
+    def __init__(self, root):
+        self.root = root
+        self.calendar = np.load(self._path('calendar.npy')).astype('datetime64[ns]')
+        self.sids = np.load(self._path('sids.npy')).astype(np.int64)
+
+        symbols = self._optional('symbols.npy')
+        if symbols is None:
+            symbols = self.sids.astype(str)
+        self.symbols = symbols
+        self.assets = np.empty(len(self.sids), dtype=object)
+        self.assets[:] = [Equity(sid, sym) for sid, sym in zip(self.sids, symbols)]
+
+        start = self._optional('start_date.npy')
+        end = self._optional('end_date.npy')
+        # Lifetimes are kept as session indices so the exists-mask of any
+        # date range is two broadcast comparisons.
+        self._first = (np.zeros(len(self.sids), dtype=np.int64) if start is None
+                       else np.searchsorted(self.calendar, start.astype('datetime64[ns]'), 'left'))
+        self._last = (np.full(len(self.sids), len(self.calendar) - 1, dtype=np.int64) if end is None
+                      else np.searchsorted(self.calendar, end.astype('datetime64[ns]'), 'right') - 1)
+        self._columns = {}
+        self._adjustments = None
+        self._fingerprint = None
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _optional(self, name):
+        path = self._path(name)
+        return np.load(path) if os.path.exists(path) else None
+
+    @property
+    def column_names(self):
+        names = [n[:-4] for n in os.listdir(self._path('columns')) if n.endswith('.npy')]
+        if os.path.isdir(self._path('events')):
+            names.extend(os.listdir(self._path('events')))
+        return sorted(names)
+
+    def fingerprint(self):
+        """
+        Hash of the path, size and modification time of every file in the
+        store, which changes whenever the store is rewritten
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha1(os.path.realpath(self.root).encode('utf-8'))
+            for directory, dirs, files in os.walk(self.root):
+                dirs.sort()
+                for name in sorted(files):
+                    stat = os.stat(os.path.join(directory, name))
+                    path = os.path.relpath(os.path.join(directory, name), self.root)
+                    digest.update(('%s:%d:%d;' % (path, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def has_column(self, name):
+        return (name in self._columns or os.path.exists(self._path('columns', name + '.npy'))
+                or os.path.isdir(self._path('events', name)))
+
+    def column(self, name):
+        """
+        The memory-mapped array backing `name`
+        """
+        try:
+            return self._columns[name]
+        except KeyError:
+            pass
+        path = self._path('columns', name + '.npy')
+        if os.path.isdir(self._path('events', name)):
+            arr = EventColumn(self._path('events', name), self.calendar)
+        elif os.path.exists(path):
+            arr = np.load(path, mmap_mode='r')
+        else:
+            raise KeyError('column %r is not in store %s' % (name, self.root))
+        self._columns[name] = arr
+        return arr
+
+    def is_static(self, name):
+        """
+        Whether `name` is a per-asset attribute that does not change over time
+        """
+        return self.column(name).ndim == 1
+
+    def load(self, name, start, stop):
+        """
+        Rows [start, stop) of column `name` as a read-only dates x assets array
+        """
+        arr = self.column(name)
+        if arr.ndim == 1:
+            return np.broadcast_to(arr, (stop - start, len(arr)))
+        return arr[start:stop]
+
+    def adjustments(self, name, start, stop):
+        """
+        The adjustments to column `name` with ex-dates on sessions
+        [start, stop), as arrays (rows, cols, ratios) sorted by row
+        """
+        rows, cols, ratios, kinds = self.actions(0, len(self.calendar))
+        if name in PRICE_FIELDS:
+            keep = np.ones(len(rows), dtype=bool)
+        elif name in VOLUME_FIELDS:
+            keep = kinds == ADJUSTMENT_KINDS['split']
+            ratios = 1.0 / ratios
+        else:
+            keep = np.zeros(len(rows), dtype=bool)
+        a, b = np.searchsorted(rows, [start, stop])
+        keep = keep[a:b]
+        return rows[a:b][keep], cols[a:b][keep], ratios[a:b][keep]
+
+    def actions(self, start, stop):
+        """
+        Splits and dividends with ex-dates on sessions [start, stop), as
+        arrays (rows, cols, ratios, kinds) sorted by row
+        """
+        if self._adjustments is None:
+            self._adjustments = self._read_adjustments()
+        rows = self._adjustments[0]
+        a, b = np.searchsorted(rows, [start, stop])
+        return tuple(array[a:b] for array in self._adjustments)
+
+    def _read_adjustments(self):
+        if not os.path.isdir(self._path('adjustments')):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0), empty
+        sids = np.load(self._path('adjustments', 'sid.npy'))
+        dates = np.load(self._path('adjustments', 'date.npy')).astype(self.calendar.dtype)
+        ratios = np.load(self._path('adjustments', 'ratio.npy')).astype(np.float64)
+        kinds = np.load(self._path('adjustments', 'kind.npy')).astype(np.int64)
+        order = np.argsort(self.sids, kind='stable')
+        position = np.minimum(np.searchsorted(self.sids, sids, sorter=order), len(order) - 1)
+        cols = order[position]
+        known = self.sids[cols] == sids
+        rows = np.searchsorted(self.calendar, dates, 'left')
+        by_row = np.argsort(rows[known], kind='stable')
+        return (rows[known][by_row], cols[known][by_row], ratios[known][by_row], kinds[known][by_row])
+
+    def exists(self, start, stop):
+        """
+        Boolean dates x assets mask of assets alive on sessions [start, stop)
+        """
+        rows = np.arange(start, stop)[:, None]
+        return (rows >= self._first) & (rows <= self._last)
+
+    def session_index(self, dt, side='left'):
+        return int(np.searchsorted(self.calendar, np.datetime64(dt, 'ns'), side))
+
+    def sessions_in_range(self, start, end):
+        """
+        Index bounds [lo, hi) of the sessions between start and end inclusive
+        """
+        return self.session_index(start), self.session_index(end, 'right')
+
+
+def write_store(root, calendar, sids, columns, symbols=None,
+                start_dates=None, end_dates=None, events=(), adjustments=None):
+    """
+    Write a store readable by ColumnarStore.
+
+    `columns` maps field name to an array shaped (len(calendar), len(sids))
+    or (len(sids),) for attributes that do not change over time. The
+    dates x assets fields named in `events` are stored point-in-time.
+    `adjustments` maps 'sid', 'date', 'ratio' and 'kind' ('split' or
+    'dividend') to equal-length sequences, e.g. a DataFrame.
+    """
+    os.makedirs(os.path.join(root, 'columns'), exist_ok=True)
+    calendar = np.asarray(calendar, dtype='datetime64[D]')
+    sids = np.asarray(sids, dtype=np.int64)
+    np.save(os.path.join(root, 'calendar.npy'), calendar)
+    np.save(os.path.join(root, 'sids.npy'), sids)
+    if symbols is not None:
+        np.save(os.path.join(root, 'symbols.npy'), np.asarray(symbols, dtype=str))
+    if start_dates is not None:
+        np.save(os.path.join(root, 'start_date.npy'), np.asarray(start_dates, dtype='datetime64[D]'))
+    if end_dates is not None:
+        np.save(os.path.join(root, 'end_date.npy'), np.asarray(end_dates, dtype='datetime64[D]'))
+
+    if adjustments is not None:
+        directory = os.path.join(root, 'adjustments')
+        os.makedirs(directory, exist_ok=True)
+        kinds = [ADJUSTMENT_KINDS[k] if isinstance(k, str) else int(k) for k in adjustments['kind']]
+        np.save(os.path.join(directory, 'sid.npy'), np.asarray(adjustments['sid'], dtype=np.int64))
+        np.save(os.path.join(directory, 'date.npy'), np.asarray(adjustments['date'], dtype='datetime64[D]'))
+        np.save(os.path.join(directory, 'ratio.npy'), np.asarray(adjustments['ratio'], dtype=np.float64))
+        np.save(os.path.join(directory, 'kind.npy'), np.asarray(kinds, dtype=np.int8))
+
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if values.dtype == object:
+            values = values.astype(str)
+        expected = (len(sids),) if values.ndim == 1 else (len(calendar), len(sids))
+        if values.shape != expected:
+            raise ValueError('column %r has shape %s, expected %s' % (name, values.shape, expected))
+        if name in events and values.ndim == 2:
+            write_events(root, name, values, calendar)
+        else:
+            np.save(os.path.join(root, 'columns', name + '.npy'), np.ascontiguousarray(values))
+
+
+def convert_to_events(root, names=None, max_fraction=0.1):
+    """
+    Rewrite dense dates x assets columns of the store at `root` as event
+    columns, removing the dense files. With `names` None, every such column
+    whose values change on at most `max_fraction` of its cells is converted.
+    Returns {name: (dense bytes, event bytes)} for the columns converted.
+    """
+    store = ColumnarStore(root)
+    converted = {}
+    for name in (store.column_names if names is None else names):
+        path = store._path('columns', name + '.npy')
+        if not os.path.exists(path):
+            continue
+        dense = np.load(path, mmap_mode='r')
+        if dense.ndim != 2:
+            continue
+        directory = store._path('events', name)
+        n_events = write_events(root, name, dense, store.calendar)
+        if names is None and n_events > max_fraction * dense.size:
+            shutil.rmtree(directory)
+            continue
+        event_bytes = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+        converted[name] = (os.path.getsize(path), event_bytes)
+        del dense
+        os.remove(path)
+    return converted
+
+
+def convert_to_float32(root, names=None, exclude=('close', 'volume')):
+    """
+    Rewrite the float64 dense columns of the store at `root`, or those of
+    them in `names`, as float32. Compact pipelines then memory-map them
+    instead of converting every load. Columns in `exclude` are kept: the
+    simulator fills orders from the close and volume. Returns {name: (old
+    bytes, new bytes)} for the columns converted.
+    """
+    store = ColumnarStore(root)
+    converted = {}
+    for name in (store.column_names if names is None else names):
+        path = store._path('columns', name + '.npy')
+        if name in exclude or not os.path.exists(path):
+            continue
+        dense = np.load(path, mmap_mode='r')
+        if dense.dtype != np.float64:
+            continue
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, dense.astype(np.float32))
+        old = os.path.getsize(path)
+        del dense
+        os.replace(tmp, path)
+        converted[name] = (old, os.path.getsize(path))
+    return converted
@@ -0,0 +1,40 @@
+"""
+Exceptions raised by the offline engine
+"""
+
+
+class NoFurtherDataError(ValueError):
+    """
+    Raised when a pipeline needs more history than the store holds
+    """
+
+
+class MemoryBudgetError(ValueError):
+    """
+    Raised when a memory budget leaves no room for even one session of a
+    pipeline
+    """
+
+
+class UnsupportedPipelineOutput(ValueError):
+    """
+    Raised when a term cannot be used as a pipeline column or screen
+    """
+
+
+class TradingControlViolation(RuntimeError):
+    """
+    Raised when an order breaks a trading control such as set_long_only()
+    """
+
+
+class AlgorithmNotRunning(RuntimeError):
+    """
+    Raised when the algorithm API is used outside of a running simulation
+    """
+
+
+class ScheduleWarning(UserWarning):
+    """
+    Issued when a scheduled function could run on a sparser date rule
+    """
@@ -0,0 +1,3 @@
+from quantopian.finance import commission, slippage
+
+__all__ = ['commission', 'slippage']
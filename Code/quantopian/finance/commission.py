@@ -0,0 +1,80 @@
+"""
+Commission models: the fee charged for a fill
+
+calculate_batch charges an array of fills in one step; models without an
+array form fall back to calculate per fill.
+"""
+import numpy as np
+
+
+class CommissionModel(object):
+
+    def calculate(self, amount, price):
+        """
+        Fee in dollars for filling `amount` shares at `price`
+        """
+        raise NotImplementedError('calculate')
+
+    def calculate_batch(self, amounts, prices):
+        """
+        calculate() over arrays of fills
+        """
+        return np.array([self.calculate(a, p) for a, p in zip(amounts, prices)], dtype=np.float64)
+
+
+class NoCommission(CommissionModel):
+
+    def calculate(self, amount, price):
+        return 0.0
+
+    def calculate_batch(self, amounts, prices):
+        return np.zeros(len(amounts))
+
+
+class PerShare(CommissionModel):
+    """
+    `cost` dollars per share, with a floor of `min_trade_cost` per order
+    """
+
+    def __init__(self, cost=0.001, min_trade_cost=0.0):
+        self.cost = cost
+        self.min_trade_cost = min_trade_cost
+
+    def calculate(self, amount, price):
+        return max(abs(amount) * self.cost, self.min_trade_cost)
+
+    def calculate_batch(self, amounts, prices):
+        return np.maximum(np.abs(amounts) * self.cost, self.min_trade_cost)
+
+    def __repr__(self):
+        return 'PerShare(cost=%s, min_trade_cost=%s)' % (self.cost, self.min_trade_cost)
+
+
+class PerTrade(CommissionModel):
+    """
+    A flat fee per order
+    """
+
+    def __init__(self, cost=0.0):
+        self.cost = cost
+
+    def calculate(self, amount, price):
+        return self.cost
+
+    def calculate_batch(self, amounts, prices):
+        return np.full(len(amounts), float(self.cost))
+
+
+class PerDollar(CommissionModel):
+    """
+    A fee proportional to the traded value
+    """
+
+    def __init__(self, cost=0.0015):
+        self.cost = cost
+
+    def calculate(self, amount, price):
+        return abs(amount) * price * self.cost
+
+    def calculate_batch(self, amounts, prices):
+        return np.abs(amounts) * prices * self.cost
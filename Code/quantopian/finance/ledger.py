@@ -0,0 +1,167 @@
+"""
+Struct-of-arrays record of a portfolio's cash and positions
+
+A Ledger keeps one slot per asset column of the store: the amount held,
+its cost basis and its last sale price, each in a NumPy array. The open
+positions are an insertion-ordered set of columns, so iterating them keeps
+the order in which they were opened. The position counts and the gross and
+net exposure are updated on every fill and recomputed when positions are
+marked to market, so reading them never walks the book.
+"""
+import numpy as np
+
+
+class Ledger(object):
+
+    def __init__(self, n_assets, cash):
+        self.cash = float(cash)
+        self.amount = np.zeros(n_assets, dtype=np.int64)
+        self.cost_basis = np.zeros(n_assets, dtype=np.float64)
+        self.last_price = np.zeros(n_assets, dtype=np.float64)
+        self.net_exposure = 0.0
+        self.gross_exposure = 0.0
+        self.long_count = 0
+        self.short_count = 0
+        self._open = {}         # column -> None, in the order positions opened
+        self._columns = None
+
+    def __len__(self):
+        return len(self._open)
+
+    def __contains__(self, col):
+        return col in self._open
+
+    def columns(self):
+        """
+        Columns of the open positions as an int array, in opening order
+        """
+        if self._columns is None:
+            self._columns = np.fromiter(self._open, dtype=np.int64, count=len(self._open))
+        return self._columns
+
+    def fill(self, col, filled, fill_price, price, cost):
+        """
+        Apply a fill of `filled` shares at `fill_price` plus `cost` in fees;
+        `price` is the last sale price of a newly opened position
+        """
+        if col not in self._open:
+            self._open[col] = None
+            self._columns = None
+            self.last_price[col] = price
+        old = int(self.amount[col])
+        total = old + filled
+        if total != 0:
+            if old == 0 or np.sign(total) != np.sign(old):
+                self.cost_basis[col] = fill_price
+            elif np.sign(filled) == np.sign(old):
+                self.cost_basis[col] = (self.cost_basis[col] * old + fill_price * filled) / total
+        self.amount[col] = total
+        last = self.last_price[col]
+        self.net_exposure += filled * last
+        self.gross_exposure += (abs(total) - abs(old)) * last
+        self.long_count += (total > 0) - (old > 0)
+        self.short_count += (total < 0) - (old < 0)
+        self.cash -= filled * fill_price + cost
+        self._settle()
+
+    def fill_batch(self, cols, filled, fill_prices, prices, costs):
+        """
+        fill() for arrays of fills in distinct columns
+        """
+        new = [col for col in cols.tolist() if col not in self._open]
+        if new:
+            self._open.update(dict.fromkeys(new))
+            self._columns = None
+            self.last_price[new] = prices[np.isin(cols, new)]
+        old = self.amount[cols]
+        total = old + filled
+        basis = self.cost_basis[cols]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averaged = (basis * old + fill_prices * filled) / total
+        reset = (old == 0) | (np.sign(total) != np.sign(old))
+        added = np.sign(filled) == np.sign(old)
+        self.cost_basis[cols] = np.where(total == 0, basis,
+                                         np.where(reset, fill_prices, np.where(added, averaged, basis)))
+        self.amount[cols] = total
+        last = self.last_price[cols]
+        self.net_exposure += float(np.dot(filled, last))
+        self.gross_exposure += float(np.dot(np.abs(total) - np.abs(old), last))
+        self.long_count += int((total > 0).sum() - (old > 0).sum())
+        self.short_count += int((total < 0).sum() - (old < 0).sum())
+        self.cash -= float(np.dot(filled, fill_prices) + costs.sum())
+        self._settle()
+
+    def mark(self, prices):
+        """
+        Mark the open positions to a row of prices, keeping the previous
+        price where the new one is missing
+        """
+        cols = self.columns()
+        row = prices[cols]
+        ok = np.isfinite(row)
+        self.last_price[cols[ok]] = row[ok]
+        self._recompute()
+
+    def close(self, cols):
+        """
+        Convert the positions in `cols` to cash at their last sale price
+        """
+        if not len(cols):
+            return
+        self.cash += float(np.dot(self.amount[cols], self.last_price[cols]))
+        self.amount[cols] = 0
+        self.cost_basis[cols] = 0.0
+        self._drop(cols)
+
+    def apply_actions(self, cols, ratios, splits):
+        """
+        Apply the splits (where `splits` is True) and dividends with ex-dates
+        today to the open positions in `cols`, before they are marked to
+        today's prices. A split scales the amount by 1 / ratio, paying any
+        fractional share in cash; a dividend pays (1 - ratio) of the last
+        sale price per share.
+        """
+        held = np.isin(cols, self.columns())
+        cols, ratios, splits = cols[held], ratios[held], splits[held]
+        for col, ratio, split in zip(cols.tolist(), ratios.tolist(), splits.tolist()):
+            amount, price = int(self.amount[col]), float(self.last_price[col])
+            if split:
+                shares = amount / ratio
+                whole = int(shares)
+                self.cash += (shares - whole) * price * ratio
+                self.amount[col] = whole
+                self.cost_basis[col] *= ratio
+                self.last_price[col] = price * ratio
+            else:
+                self.cash += amount * price * (1.0 - ratio)
+        if len(cols):
+            self._recompute()
+
+    def drop_closed(self):
+        """
+        Forget the positions whose amount has gone to zero
+        """
+        cols = self.columns()
+        self._drop(cols[self.amount[cols] == 0])
+
+    def _drop(self, cols):
+        if not len(cols):
+            return
+        for col in cols.tolist():
+            del self._open[col]
+        self._columns = None
+        self._recompute()
+
+    def _recompute(self):
+        cols = self.columns()
+        amount = self.amount[cols]
+        values = amount * self.last_price[cols]
+        self.net_exposure = float(values.sum())
+        self.gross_exposure = float(np.abs(values).sum())
+        self.long_count = int((amount > 0).sum())
+        self.short_count = int((amount < 0).sum())
+
+    def _settle(self):
+        # Running sums of a book that has gone flat are exactly zero.
+        if not self.long_count and not self.short_count:
+            self.net_exposure = self.gross_exposure = 0.0
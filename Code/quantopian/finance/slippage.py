@@ -0,0 +1,79 @@
+"""
+Slippage models: how much of an order fills on a bar, and at what price
+
+simulate_batch takes arrays with one entry per asset and fills them all in
+one step; models without an array form fall back to simulate per asset.
+"""
+import math
+
+import numpy as np
+
+
+class SlippageModel(object):
+
+    def simulate(self, amount, price, volume, volume_used):
+        """
+        Return (fill_amount, fill_price) for an order of `amount` shares
+        on a bar with close `price` and `volume` shares traded, of which
+        `volume_used` were already taken by earlier fills this session.
+        """
+        raise NotImplementedError('simulate')
+
+    def simulate_batch(self, amounts, prices, volumes, volume_used):
+        """
+        simulate() over arrays of orders in distinct assets; returns
+        (fill_amounts, fill_prices) arrays
+        """
+        fills = np.zeros(len(amounts), dtype=np.int64)
+        fill_prices = np.array(prices, dtype=np.float64)
+        for k in range(len(amounts)):
+            fills[k], fill_prices[k] = self.simulate(int(amounts[k]), prices[k], volumes[k], int(volume_used[k]))
+        return fills, fill_prices
+
+
+class NoSlippage(SlippageModel):
+    """
+    Fill the whole order at the close
+    """
+
+    def simulate(self, amount, price, volume, volume_used):
+        return amount, price
+
+    def simulate_batch(self, amounts, prices, volumes, volume_used):
+        return np.asarray(amounts, dtype=np.int64), np.asarray(prices, dtype=np.float64)
+
+
+class FixedBasisPointsSlippage(SlippageModel):
+    """
+    Fill at the close moved `basis_points` against the trade, taking at most
+    `volume_limit` of the bar's volume across all orders for the asset.
+    """
+
+    def __init__(self, basis_points=5.0, volume_limit=0.1):
+        self.basis_points = basis_points
+        self.volume_limit = volume_limit
+
+    def simulate(self, amount, price, volume, volume_used):
+        if not volume > 0 or not price > 0:
+            return 0, price
+        available = int(math.floor(volume * self.volume_limit)) - volume_used
+        if available <= 0:
+            return 0, price
+        direction = 1 if amount > 0 else -1
+        fill = direction * min(abs(amount), available)
+        return fill, price * (1.0 + direction * self.basis_points / 10000.0)
+
+    def simulate_batch(self, amounts, prices, volumes, volume_used):
+        amounts = np.asarray(amounts, dtype=np.int64)
+        with np.errstate(invalid='ignore'):
+            tradable = (volumes > 0) & (prices > 0)
+        capacity = np.floor(np.where(tradable, volumes, 0.0) * self.volume_limit).astype(np.int64)
+        available = np.maximum(capacity - volume_used, 0)
+        direction = np.where(amounts > 0, 1, -1)
+        fills = np.where(tradable, direction * np.minimum(np.abs(amounts), available), 0)
+        fill_prices = np.where(fills != 0, prices * (1.0 + direction * self.basis_points / 10000.0), prices)
+        return fills, fill_prices
+
+    def __repr__(self):
+        return 'FixedBasisPointsSlippage(basis_points=%s, volume_limit=%s)' % (
+            self.basis_points, self.volume_limit)
@@ -0,0 +1,24 @@
+"""
+Objectives for order_optimal_portfolio
+
+Only the objectives that map directly onto target weights are available
+offline; there is no solver behind them.
+"""
+import pandas as pd
+
+
+class TargetWeights(object):
+    """
+    Trade to exactly the given weights; held assets not listed go to zero
+    """
+
+    def __init__(self, weights):
+        self.weights = pd.Series(weights, dtype=float)
+
+    def target_weights(self):
+        return self.weights[self.weights.notnull()]
+
+
+def order_optimal_portfolio(objective, constraints):
+    from quantopian.algorithm import order_optimal_portfolio
+    return order_optimal_portfolio(objective, constraints)
@@ -0,0 +1,6 @@
+from quantopian.pipeline.pipeline import Pipeline
+from quantopian.pipeline.factors import CustomFactor
+from quantopian.pipeline.cache import FactorCache
+from quantopian.pipeline.engine import PipelineResult, SimplePipelineEngine
+
+__all__ = ['CustomFactor', 'FactorCache', 'Pipeline', 'PipelineResult', 'SimplePipelineEngine']
@@ -0,0 +1,84 @@
+"""
+Loaded arrays carrying the split and dividend adjustments of their rows
+
+The store keeps prices as traded, plus a sparse table of adjustments: on
+its ex-date an asset's earlier prices are multiplied by `ratio` (and, for
+a split, its earlier volumes divided by it) to be comparable with the new
+ones. A window sees the adjustments in effect as of its last session, so
+the same store row can hold different values in different windows.
+
+The engine hands windowed terms an AdjustedArray: the memory-mapped rows
+themselves plus the adjustments falling inside them. Windows are cut from
+it as views, and only the cells an adjustment covers are rescaled, in the
+window's own copy.
+"""
+import numpy as np
+
+
+class AdjustedArray(np.ndarray):
+    """
+    A dates x assets array with adjustments (rows, cols, ratios): rows
+    before `rows[k]` in column `cols[k]` are multiplied by `ratios[k]` in
+    every window whose last row is at least `rows[k] - lag`.
+
+    Slices and results derived from it are plain arrays again.
+    """
+
+    def __new__(cls, data, rows, cols, ratios, lag):
+        obj = np.asarray(data).view(cls)
+        order = np.argsort(rows, kind='stable')
+        obj.rows = np.asarray(rows, dtype=np.int64)[order]
+        obj.cols = np.asarray(cols, dtype=np.int64)[order]
+        obj.ratios = np.asarray(ratios, dtype=np.float64)[order]
+        obj.lag = lag
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.rows = None
+
+    def _between(self, lo, end):
+        # Adjustments touching rows from lo and in effect by row `end`.
+        a = np.searchsorted(self.rows, lo, 'right')
+        b = np.searchsorted(self.rows, end + self.lag, 'right')
+        return self.rows[a:b], self.cols[a:b], self.ratios[a:b]
+
+    def window(self, lo, hi, columns=None):
+        """
+        Rows [lo, hi), of `columns` only if given, as seen from row hi - 1.
+        A view of the data when no adjustment applies, else a copy.
+        """
+        data = np.asarray(self)[lo:hi]
+        if columns is not None:
+            data = data[:, columns]
+        rows, cols, ratios = self._between(lo, hi - 1)
+        if not len(rows):
+            return data
+        if columns is None:
+            data = data.copy()
+            positions = cols
+        else:
+            positions = np.searchsorted(columns, cols)
+            held = positions < len(columns)
+            held[held] = columns[positions[held]] == cols[held]
+            rows, positions, ratios = rows[held], positions[held], ratios[held]
+        for row, position, ratio in zip(rows.tolist(), positions.tolist(), ratios.tolist()):
+            data[:row - lo, position] *= ratio
+        return data
+
+    def taking_effect(self, end):
+        """
+        (rows, cols, ratios) of the adjustments that first apply to the
+        window ending at row `end`
+        """
+        effective = np.maximum(self.rows - self.lag, 0)
+        hit = effective == end
+        return self.rows[hit], self.cols[hit], self.ratios[hit]
+
+
+def adjusted(data, adjustments, lag):
+    """
+    `data` as an AdjustedArray if `adjustments` holds any, else unchanged
+    """
+    if adjustments is None or not len(adjustments[0]):
+        return data
+    return AdjustedArray(data, adjustments[0], adjustments[1], adjustments[2], lag)
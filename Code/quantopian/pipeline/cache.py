@@ -0,0 +1,228 @@
+"""
+On-disk cache of computed term arrays, shared between runs
+
+Rerunning a backtest with different portfolio logic computes the same
+factor arrays again. A FactorCache keeps them in a directory, one .npy
+file per term and block of sessions, named by a hash of everything the
+array depends on:
+
+    the code of the term's class: its methods, and the module globals they
+        read (constants by value, helper functions by their code)
+    its attributes: window_length, dtype, parameters, outputs, ...
+    the keys of its inputs and mask, recursively
+    the data it was computed from (the loader's fingerprint)
+    the first and last session of the block
+
+Editing a factor, its parameters or the store therefore changes the key
+rather than serving stale values. Loading an entry marks it as used; once
+the directory grows past `max_bytes`, the least recently used entries are
+deleted.
+"""
+import hashlib
+import os
+import types
+
+import numpy as np
+
+from quantopian.pipeline.term import Term
+
+
+def _hash(value):
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+
+class FactorCache(object):
+    """
+    Term arrays stored under `directory`, at most `max_bytes` in total
+    (unbounded when None)
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._terms = {}
+        self._hashing = set()
+        self._classes = {}
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def __repr__(self):
+        return 'FactorCache(%r, max_bytes=%r)' % (self.directory, self.max_bytes)
+
+    @property
+    def nbytes(self):
+        return self._size
+
+    def key(self, term, source, first, last):
+        """
+        Key of `term`'s array over sessions `first` to `last` computed
+        from the data identified by `source`
+        """
+        return _hash((self.term_key(term), source, str(first), str(last)))
+
+    def term_key(self, term):
+        """
+        Hash of the code, attributes and inputs of `term`, leaving out its
+        derived_attributes
+        """
+        try:
+            return self._terms[term]
+        except KeyError:
+            pass
+        if term in self._hashing:
+            raise ValueError('%r is reached from its own attributes' % (term,))
+        self._hashing.add(term)
+        try:
+            skip = type(term).derived_attributes
+            attributes = sorted((name, self._token(value)) for name, value in vars(term).items()
+                                if name not in skip)
+        finally:
+            self._hashing.discard(term)
+        key = self._terms[term] = _hash((self._class_key(type(term)), attributes))
+        return key
+
+    def get(self, key):
+        """
+        The array stored under `key`, memory-mapped, or None
+        """
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return array
+
+    def put(self, key, array):
+        """
+        Store `array` under `key`, then evict down to max_bytes. Arrays of
+        Python objects are not stored.
+        """
+        array = np.asarray(array)
+        if array.dtype.hasobject:
+            return
+        path = self._path(key)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, array, allow_pickle=False)
+        try:
+            replaced = os.path.getsize(path)    # an entry already stored under the key
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)
+        self._size += os.path.getsize(path) - replaced
+        if self.max_bytes is not None and self._size > self.max_bytes:
+            self.evict(self.max_bytes)
+
+    def evict(self, max_bytes):
+        """
+        Delete the least recently used entries until at most `max_bytes`
+        remain
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass    # removed by another process sharing the directory
+            total -= size
+        self._size = total
+
+    def clear(self):
+        self.evict(0)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _entries(self):
+        # (last used, path, bytes) of every entry.
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        return entries
+
+    def _class_key(self, cls):
+        try:
+            return self._classes[cls]
+        except KeyError:
+            pass
+        parts = []
+        for klass in cls.__mro__[:-1]:
+            members = sorted((name, self._token(value)) for name, value in vars(klass).items()
+                             if not name.startswith('__') and name != '_instance')
+            parts.append((klass.__module__, klass.__qualname__, members))
+        key = self._classes[cls] = _hash(parts)
+        return key
+
+    def _token(self, value, seen=None):
+        """
+        A repr-able description of `value` that is the same in every run
+        """
+        if isinstance(value, Term):
+            return ('term', self.term_key(value))
+        if isinstance(value, (bool, int, float, complex, str, bytes, type(None))):
+            return value
+        if isinstance(value, np.generic):
+            return (value.dtype.str, value.item())
+        if isinstance(value, np.dtype):
+            return ('dtype', value.descr if value.fields else value.str)
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                return ('array', value.shape, tuple(self._token(v, seen) for v in value.ravel()))
+            data = np.ascontiguousarray(value)
+            return ('array', value.dtype.str, value.shape, hashlib.sha1(data.view(np.uint8)).hexdigest())
+        if isinstance(value, (tuple, list)):
+            return (type(value).__name__, tuple(self._token(v, seen) for v in value))
+        if isinstance(value, (set, frozenset)):
+            return ('set', sorted(repr(self._token(v, seen)) for v in value))
+        if isinstance(value, dict):
+            return ('dict', sorted((repr(k), self._token(v, seen)) for k, v in value.items()))
+        if isinstance(value, (staticmethod, classmethod)):
+            return self._token(value.__func__, seen)
+        if isinstance(value, property):
+            return ('property', tuple(self._token(f, seen) for f in (value.fget, value.fset)))
+        if isinstance(value, types.FunctionType):
+            return self._function_token(value, seen if seen is not None else set())
+        if isinstance(value, types.ModuleType):
+            return ('module', value.__name__)
+        if isinstance(value, type):
+            return ('class', value.__module__, value.__qualname__)
+        return (type(value).__qualname__, repr(value))
+
+    def _function_token(self, func, seen):
+        code = func.__code__
+        if code in seen:
+            return ('function', func.__qualname__)
+        seen.add(code)
+        names = set()
+        _global_names(code, names)
+        # Constants and helpers the function reads from its module, so that
+        # changing a script's constant changes the key of factors using it.
+        used = sorted((name, self._token(func.__globals__[name], seen))
+                      for name in names if name in func.__globals__)
+        defaults = self._token(func.__defaults__, seen)
+        return ('function', func.__qualname__, _code_token(code), used, defaults)
+
+
+def _code_token(code):
+    consts = tuple(_code_token(c) if isinstance(c, types.CodeType) else repr(c) for c in code.co_consts)
+    return (code.co_code, consts, code.co_names, code.co_varnames)
+
+
+def _global_names(code, names):
+    names.update(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _global_names(const, names)
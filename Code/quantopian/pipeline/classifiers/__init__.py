@@ -0,0 +1,3 @@
+from quantopian.pipeline.classifiers.classifier import Classifier, ClassifierPredicate, Latest
+
+__all__ = ['Classifier', 'ClassifierPredicate', 'Latest']
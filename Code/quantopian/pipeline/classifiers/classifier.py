@@ -0,0 +1,98 @@
+"""
+Categorical terms (sector codes, exchange ids, security types, ...)
+"""
+import re
+
+import numpy as np
+
+from quantopian.pipeline.filters.filter import Filter, NullFilter
+from quantopian.pipeline.term import ComputableTerm, LatestMixin
+
+
+class Classifier(ComputableTerm):
+    dtype = np.dtype(np.int64)
+    missing_value = -1
+    window_safe = True
+
+    def eq(self, other):
+        return ClassifierPredicate(self, 'eq', other)
+
+    def __eq__(self, other):
+        return self.eq(other)
+
+    def __ne__(self, other):
+        return ClassifierPredicate(self, 'ne', other)
+
+    __hash__ = ComputableTerm.__hash__
+
+    def element_of(self, choices):
+        return ClassifierPredicate(self, 'element_of', tuple(choices))
+
+    def startswith(self, prefix):
+        return ClassifierPredicate(self, 'startswith', prefix)
+
+    def endswith(self, suffix):
+        return ClassifierPredicate(self, 'endswith', suffix)
+
+    def has_substring(self, substring):
+        return ClassifierPredicate(self, 'has_substring', substring)
+
+    def matches(self, pattern):
+        return ClassifierPredicate(self, 'matches', pattern)
+
+    def isnull(self):
+        return NullFilter(self)
+
+    def notnull(self):
+        return NullFilter(self, negate=True)
+
+
+class Latest(LatestMixin, Classifier):
+    pass
+
+
+def _label_predicate(op, value):
+    """
+    A Python predicate over a single label for the string operations
+    """
+    if op == 'startswith':
+        return lambda label: label.startswith(value)
+    if op == 'endswith':
+        return lambda label: label.endswith(value)
+    if op == 'has_substring':
+        return lambda label: value in label
+    if op == 'matches':
+        regex = re.compile(value)
+        return lambda label: regex.match(label) is not None
+    raise ValueError('unknown classifier predicate %r' % (op,))
+
+
+class ClassifierPredicate(Filter):
+    """
+    A filter testing each label of a classifier
+    """
+    cellwise = True
+
+    def __init__(self, classifier, op, value):
+        self.op = op
+        self.value = value
+        super(ClassifierPredicate, self).__init__(inputs=(classifier,), window_length=0)
+
+    def _compute(self, inputs, dates, assets, mask):
+        data = inputs[0]
+        if self.op == 'eq':
+            result = data == self.value
+        elif self.op == 'ne':
+            result = (data != self.value) & (data != self.inputs[0].missing_value)
+        elif self.op == 'element_of':
+            result = np.isin(data, self.value)
+        else:
+            # String tests run once per distinct label, then scatter back.
+            labels, codes = np.unique(data, return_inverse=True)
+            test = _label_predicate(self.op, self.value)
+            hits = np.array([bool(label) and test(str(label)) for label in labels], dtype=bool)
+            result = hits[codes].reshape(data.shape)
+        return np.asarray(result, dtype=bool) & mask
+
+    def __repr__(self):
+        return '%r.%s(%r)' % (self.inputs[0], self.op, self.value)
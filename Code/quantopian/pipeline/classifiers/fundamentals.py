@@ -0,0 +1,3 @@
+from quantopian.pipeline.classifiers.morningstar import Sector
+
+__all__ = ['Sector']
@@ -0,0 +1,24 @@
+"""
+Classifiers over Morningstar classification codes
+"""
+from quantopian.pipeline.classifiers.classifier import Latest
+from quantopian.pipeline.data import Fundamentals
+
+
+class Sector(Latest):
+    """
+    Morningstar sector code, -1 where unknown
+    """
+    inputs = [Fundamentals.morningstar_sector_code]
+
+    BASIC_MATERIALS = 101
+    CONSUMER_CYCLICAL = 102
+    FINANCIAL_SERVICES = 103
+    REAL_ESTATE = 104
+    CONSUMER_DEFENSIVE = 205
+    HEALTHCARE = 206
+    UTILITIES = 207
+    COMMUNICATION_SERVICES = 308
+    ENERGY = 309
+    INDUSTRIALS = 310
+    TECHNOLOGY = 311
@@ -0,0 +1,95 @@
+"""
+Compact storage of pipeline arrays
+
+In compact mode (SimplePipelineEngine(compact=True), or --compact on the
+command line) the engine keeps float data as float32 instead of float64:
+float store columns are loaded, forward-filled and windowed as float32,
+and float factor outputs, ranks included, are stored as float32. Screens
+and boolean output columns kept in a PipelineResult are bit-packed, eight
+cells to a byte. Windows, intermediate arrays, cached results and the
+blocks of output handed to the algorithm take half the memory, or an
+eighth for masks, so twice the assets or window rows fit in cache.
+
+float64 columns of the store are converted as they are loaded. After
+convert_to_float32 has rewritten them, they are memory-mapped as they
+are, and the pages read from disk halve too.
+
+Precision in compact mode:
+
+    - each float value is rounded once, when loaded, to float32's 24
+      significant bits: a relative error of at most 2**-24 (about 6e-8),
+      or about seven significant digits
+    - factor arithmetic runs in float32 on those values. A sum or mean over
+      a window of n values is within about n * 2**-24 times the sum of their
+      magnitudes of the float64 result, usually far closer. Where terms
+      cancel, as in a trailing sum of quarters with losses, the error
+      relative to the result itself can be much larger
+    - ranks, counts and scores are whole numbers and exact up to 2**24
+      (16,777,216); 'average' ranks are exact halves up to 2**23
+    - missing values stay NaN, so masks, isnull() and notnull() and the
+      NaN-aware reductions behave as with float64
+    - two values within float32 rounding of each other may tie or swap
+      order. A rank can then move by one, and an asset at the edge of a
+      top(N) cut or on a comparison's threshold can fall on the other side
+    - dates, integers, booleans and labels are unchanged, and packing masks
+      is lossless. Dates a factor writes into a float output, such as
+      TrailingTwelveMonths' asof_date, keep about a minute's resolution
+"""
+import numpy as np
+
+
+def compact_dtype(dtype):
+    """
+    The dtype compact mode keeps values of `dtype` in
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.float64:
+        return np.dtype(np.float32)
+    if dtype.fields:
+        return np.dtype([(name, compact_dtype(dtype[name])) for name in dtype.names])
+    return dtype
+
+
+def compact(data):
+    """
+    `data` converted to compact_dtype, or unchanged if it already is
+    """
+    dtype = compact_dtype(data.dtype)
+    if dtype == data.dtype:
+        return data
+    return data.astype(dtype)
+
+
+class PackedMask(object):
+    """
+    A dates x assets boolean array stored eight cells to a byte, indexed
+    like the array it packs
+    """
+    dtype = np.dtype(bool)
+    ndim = 2
+
+    def __init__(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        self.shape = mask.shape
+        self.bits = np.packbits(mask, axis=-1)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            rows, cols = key
+            if isinstance(cols, slice):
+                return self[rows][..., cols]
+            # Read single cells straight from their bytes.
+            cols = np.asarray(cols)
+            return ((self.bits[rows, cols >> 3] >> (7 - (cols & 7))) & 1).astype(bool)
+        return np.unpackbits(self.bits[key], axis=-1, count=self.shape[1]).view(bool)
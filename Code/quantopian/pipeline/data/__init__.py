@@ -0,0 +1,13 @@
+from quantopian.pipeline.data.dataset import BoundColumn, Column, DataSet
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.data.fundamentals import Fundamentals
+from quantopian.pipeline.data import morningstar
+
+__all__ = [
+    'BoundColumn',
+    'Column',
+    'DataSet',
+    'Fundamentals',
+    'USEquityPricing',
+    'morningstar',
+]
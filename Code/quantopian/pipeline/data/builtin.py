@@ -0,0 +1,12 @@
+"""
+Daily pricing
+"""
+from quantopian.pipeline.data.dataset import Column, DataSet
+
+
+class USEquityPricing(DataSet):
+    open = Column(float)
+    high = Column(float)
+    low = Column(float)
+    close = Column(float)
+    volume = Column(float)
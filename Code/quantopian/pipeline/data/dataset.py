@@ -0,0 +1,105 @@
+"""
+Declarative datasets whose columns are loaded from the local store
+"""
+import numpy as np
+
+from quantopian.pipeline.term import LoadableTerm, NotSpecified, default_missing_value
+
+
+class Column(object):
+    """
+    A column declared on a DataSet; becomes a BoundColumn on the class
+    """
+    def __init__(self, dtype, missing_value=NotSpecified, store_name=None):
+        self.dtype = np.dtype(dtype)
+        self.missing_value = missing_value
+        self.store_name = store_name
+
+    def bind(self, dataset, name):
+        missing = self.missing_value
+        if missing is NotSpecified:
+            missing = default_missing_value(self.dtype)
+        return BoundColumn(dataset, name, self.dtype, missing, self.store_name or name)
+
+
+class BoundColumn(LoadableTerm):
+    """
+    A dataset column usable as a CustomFactor input, or via `.latest`
+    """
+    derived_attributes = ('_forward_filled', '_latest')
+
+    def __init__(self, dataset, name, dtype, missing_value, store_name, ffill=False):
+        self.dataset = dataset
+        self.name = name
+        self.dtype = dtype
+        self.missing_value = missing_value
+        self.store_name = store_name
+        self.ffill = ffill
+        self._forward_filled = None
+        self._latest = None
+
+    @property
+    def qualname(self):
+        return '%s.%s' % (self.dataset.__name__, self.name)
+
+    @property
+    def forward_filled(self):
+        """
+        This column with missing values replaced by the last value reported
+        for the asset. The loader carries that value from one session to the
+        next, so fundamentals stay populated between reports.
+        """
+        if self.ffill:
+            return self
+        if self.dtype.kind not in 'fM':
+            raise TypeError('only float and datetime columns can be forward-filled, not %r' % (self,))
+        if self._forward_filled is None:
+            self._forward_filled = BoundColumn(
+                self.dataset, self.name, self.dtype, self.missing_value, self.store_name, ffill=True)
+        return self._forward_filled
+
+    @property
+    def latest(self):
+        """
+        The most recent value of this column. Always the same term, so
+        every pipeline that reads it shares one node.
+        """
+        if self._latest is None:
+            kind = self.dtype.kind
+            if kind == 'b':
+                from quantopian.pipeline.filters.filter import Latest
+            elif kind in 'iuUSO':
+                from quantopian.pipeline.classifiers.classifier import Latest
+            else:
+                from quantopian.pipeline.factors.factor import Latest
+            self._latest = Latest(inputs=(self,), dtype=self.dtype, missing_value=self.missing_value)
+        return self._latest
+
+    def __repr__(self):
+        return self.qualname + ('.forward_filled' if self.ffill else '')
+
+
+class DataSetMeta(type):
+
+    def __new__(mcls, name, bases, dict_):
+        cls = super(DataSetMeta, mcls).__new__(mcls, name, bases, dict_)
+        cls._columns = {}
+        for base in reversed(cls.__mro__[1:]):
+            cls._columns.update(getattr(base, '_columns', {}))
+        for attr, value in dict_.items():
+            if isinstance(value, Column):
+                cls._columns[attr] = value
+        for attr, value in cls._columns.items():
+            setattr(cls, attr, value.bind(cls, attr))
+        return cls
+
+    @property
+    def columns(cls):
+        return frozenset(getattr(cls, name) for name in cls._columns)
+
+    def __repr__(cls):
+        return '<DataSet: %s>' % cls.__name__
+
+
+class DataSet(metaclass=DataSetMeta):
+    pass
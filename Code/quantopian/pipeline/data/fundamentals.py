@@ -0,0 +1,20 @@
+"""
+The flat `Fundamentals` dataset
+
+Holds every Morningstar column under its own name plus a `<name>_asof_date`
+column giving the period each value was reported for.
+"""
+from quantopian.pipeline.data.dataset import Column, DataSetMeta, DataSet
+from quantopian.pipeline.data.morningstar import GROUPS
+
+
+def _fundamentals_columns():
+    columns = {}
+    for group in GROUPS:
+        for name, column in group._columns.items():
+            columns[name] = Column(column.dtype, column.missing_value)
+            columns[name + '_asof_date'] = Column('datetime64[ns]')
+    return columns
+
+
+Fundamentals = DataSetMeta('Fundamentals', (DataSet,), _fundamentals_columns())
@@ -0,0 +1,79 @@
+"""
+Morningstar fundamentals, grouped as in the original `morningstar` namespace
+
+Each column reads the store field of the same name, so
+`morningstar.operation_ratios.roa` and `Fundamentals.roa` load the same data.
+"""
+from quantopian.pipeline.data.dataset import Column, DataSet
+
+
+class valuation_ratios(DataSet):
+    pb_ratio = Column(float)
+    pe_ratio = Column(float)
+    dividend_yield = Column(float)
+    ev_to_ebitda = Column(float)
+    earning_yield = Column(float)
+    book_value_yield = Column(float)
+
+
+class operation_ratios(DataSet):
+    roa = Column(float)
+    roe = Column(float)
+    roic = Column(float)
+    long_term_debt_equity_ratio = Column(float)
+    current_ratio = Column(float)
+    gross_margin = Column(float)
+    assets_turnover = Column(float)
+
+
+class income_statement(DataSet):
+    ebit = Column(float)
+    ebitda = Column(float)
+    net_income = Column(float)
+    total_revenue = Column(float)
+
+
+class balance_sheet(DataSet):
+    total_assets = Column(float)
+    limited_partnership = Column(float)
+
+
+class cash_flow_statement(DataSet):
+    operating_cash_flow = Column(float)
+    cash_flow_from_continuing_operating_activities = Column(float)
+    free_cash_flow = Column(float)
+
+
+class valuation(DataSet):
+    enterprise_value = Column(float)
+    market_cap = Column(float)
+    shares_outstanding = Column(float)
+
+
+class asset_classification(DataSet):
+    morningstar_sector_code = Column('int64')
+
+
+class share_class_reference(DataSet):
+    security_type = Column(str)
+    exchange_id = Column(str)
+    symbol = Column(str)
+    is_primary_share = Column(bool)
+    is_depositary_receipt = Column(bool)
+
+
+class company_reference(DataSet):
+    standard_name = Column(str)
+
+
+GROUPS = (
+    valuation_ratios,
+    operation_ratios,
+    income_statement,
+    balance_sheet,
+    cash_flow_statement,
+    valuation,
+    asset_classification,
+    share_class_reference,
+    company_reference,
+)
@@ -0,0 +1,414 @@
+"""
+Evaluates pipelines over a range of sessions in one pass per term
+"""
+import numpy as np
+import pandas as pd
+
+from quantopian.errors import MemoryBudgetError, NoFurtherDataError
+from quantopian.pipeline.adjustments import adjusted
+from quantopian.pipeline.compact import PackedMask, compact, compact_dtype
+from quantopian.pipeline.graph import SCREEN_NAME, pipeline_graph, static_terms
+from quantopian.pipeline.loaders import StoreLoader
+from quantopian.pipeline.optimizer import format_graph, optimize
+from quantopian.pipeline.term import AssetExists, ComputableTerm, LoadableTerm
+from quantopian.utils.memory import current_rss, format_size, peak_rss
+from quantopian.utils.profiling import short_label
+
+# Factor applied to the bytes of a term's output to allow for the
+# temporaries its _compute allocates.
+WORKING_SET_FACTOR = 2
+
+
+class PipelineResult(object):
+    """
+    Output arrays of one pipeline run over a block of sessions.
+
+    `columns` maps each name to a len(dates) x len(assets) array and
+    `screen` is the boolean array selecting the rows of the output. With
+    `packed`, the screen and boolean columns are kept as PackedMasks.
+    """
+
+    def __init__(self, dates, assets, columns, screen, packed=False):
+        if packed:
+            columns = {name: PackedMask(values) if values.dtype == bool else values
+                       for name, values in columns.items()}
+            screen = PackedMask(screen)
+        self.dates = dates
+        self.assets = assets
+        self.columns = columns
+        self.screen = screen
+
+    def __len__(self):
+        return len(self.dates)
+
+    def frame(self, i):
+        """
+        The output for the i-th session, indexed by asset
+        """
+        rows = np.flatnonzero(self.screen[i])
+        data = {name: values[i, rows] for name, values in self.columns.items()}
+        return pd.DataFrame(data, index=pd.Index(self.assets[rows]), columns=list(self.columns))
+
+    def to_frame(self):
+        """
+        The output for every session, indexed by (date, asset)
+        """
+        date_idx, asset_idx = np.nonzero(self.screen)
+        index = pd.MultiIndex.from_arrays([
+            pd.DatetimeIndex(self.dates[date_idx], tz='UTC'),
+            pd.Index(self.assets[asset_idx]),
+        ])
+        data = {name: values[date_idx, asset_idx] for name, values in self.columns.items()}
+        return pd.DataFrame(data, index=index, columns=list(self.columns))
+
+
+class SimplePipelineEngine(object):
+    """
+    Computes every term of a pipeline for a whole block of sessions at once.
+
+    Each term is evaluated exactly once per run, over its dates x assets
+    array, in dependency order. Intermediate arrays are released as soon as
+    their last consumer has run.
+
+    Long ranges run as consecutive chunks. A computed term that a windowed
+    term reads keeps the last rows of its output, and when the next chunk
+    starts where the previous one stopped only the new rows are computed.
+
+    With a FactorCache, the outputs and windowed terms of each chunk are
+    read from it when an earlier run stored them, and whatever only fed
+    those terms is neither loaded nor computed.
+
+    Cellwise terms reading only per-asset attributes of the store
+    (exchange, symbol, security type, ...) depend on the date only through
+    whether each asset exists. They are computed once per store, as two
+    rows: every asset existing and none existing. Each block then picks
+    from the two by AssetExists where a date-dependent term reads them.
+
+    With a Profiler, every term loaded, computed or read from the cache is
+    timed in a frame of its own.
+
+    With `compact`, float data is kept as float32 and the screens of the
+    results are bit-packed; see quantopian.pipeline.compact for the
+    precision this guarantees. A `loader` given along with it should be
+    compact too.
+
+    With `optimize`, each graph is first rewritten by
+    quantopian.pipeline.optimizer: duplicate terms merged, factors that
+    copy a column replaced by its Latest, and elementwise arithmetic fused.
+    """
+
+    def __init__(self, store, loader=None, cache=None, profiler=None, compact=False, optimize=False):
+        self.store = store
+        self.loader = loader if loader is not None else StoreLoader(store, compact=compact)
+        self.cache = cache
+        self.profiler = profiler
+        self.compact = compact
+        self.optimize = optimize
+        self._optimized = {}
+        self._carry = {}
+        self._static = {}
+        self.last_run = None
+
+    def run_pipeline(self, pipeline, start_date, end_date, chunksize=None, memory_budget=None):
+        """
+        Pipeline output for every session between start_date and end_date.
+
+        The range runs in chunks of `chunksize` sessions, or of as many as
+        fit in `memory_budget` bytes; by default in one piece. The chunk size
+        and the peak resident memory are left in `last_run`.
+        """
+        start, stop = self.store.sessions_in_range(start_date, end_date)
+        if start >= stop:
+            raise ValueError('no sessions between %s and %s' % (start_date, end_date))
+        graph = pipeline_graph(pipeline)
+        if chunksize is None:
+            chunksize = stop - start
+            if memory_budget is not None:
+                chunksize = self.chunk_size(graph, memory_budget, limit=chunksize)
+        frames = [self.run_chunk(pipeline, lo, min(lo + chunksize, stop), graph).to_frame()
+                  for lo in range(start, stop, chunksize)]
+        self.last_run = {'chunksize': chunksize, 'chunks': len(frames), 'peak_rss': peak_rss()}
+        return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+    def session_bytes(self, graph):
+        """
+        Estimated bytes of (fixed, per additional session) needed to compute
+        `graph`: the window rows every chunk carries, and each session's row
+        of every computed array
+        """
+        if self.optimize:
+            graph = self.optimized(graph)
+        n_assets = len(self.store.sids)
+        fixed = per_session = 0
+        for term in graph.ordering:
+            if isinstance(term, LoadableTerm) and not getattr(term, 'ffill', False):
+                continue  # memory-mapped from the store
+            width = n_assets * _itemsize(term, self.compact) * WORKING_SET_FACTOR
+            fixed += graph.extra_rows[term] * width
+            per_session += width
+        return fixed, per_session
+
+    def chunk_size(self, graph, memory_budget, limit):
+        """
+        The most sessions, up to `limit`, whose estimated working set fits in
+        what `memory_budget` bytes leave above this process's current size.
+        Raises MemoryBudgetError if not even one session fits.
+        """
+        fixed, per_session = self.session_bytes(graph)
+        rss = current_rss() or 0
+        available = memory_budget - rss - fixed
+        if per_session == 0:
+            return limit
+        if available < per_session:
+            raise MemoryBudgetError(
+                'a memory budget of %s leaves no room for one session: the process holds %s, '
+                'and the pipeline needs %s for its window rows plus %s per session' % (
+                    format_size(memory_budget), format_size(rss), format_size(fixed),
+                    format_size(per_session)))
+        return int(min(limit, available // per_session))
+
+    def run_chunk(self, pipeline, start, stop, graph=None):
+        """
+        Run `pipeline` for sessions [start, stop), given as calendar indices
+        """
+        if graph is None:
+            graph = pipeline_graph(pipeline)
+        results = self.compute(graph, start, stop)
+        screen = results.pop(SCREEN_NAME)
+        return PipelineResult(self.store.calendar[start:stop], self.store.assets, results, screen,
+                              packed=self.compact)
+
+    def compute(self, graph, start, stop):
+        """
+        Arrays for each output of `graph` over sessions [start, stop)
+        """
+        if self.optimize:
+            graph = self.optimized(graph)
+        first = start - graph.max_extra_rows - getattr(self.loader, 'lag', 0)
+        if first < 0:
+            raise NoFurtherDataError(
+                'pipeline needs %d sessions of history before %s' % (
+                    graph.max_extra_rows, self.store.calendar[start]))
+
+        calendar = self.store.calendar
+        assets = self.store.assets
+        extra_rows = graph.extra_rows
+        outputs = set(graph.outputs.values())
+        keys = self._cache_keys(graph, outputs, start, stop)
+        hits = self._cached(graph, outputs, keys) if keys else {}
+        ordering, remaining = graph.ordering, dict(graph.consumers)
+        if hits:
+            ordering, remaining = _needed(graph, outputs, hits)
+        workspace = {}
+        static, expand = self._static_terms(ordering, outputs, hits)
+        profiler = self.profiler
+
+        for term in ordering:
+            extra = extra_rows[term]
+            if profiler is not None:
+                frame = profiler.start(_profile_kind(term, hits), short_label(repr(term)))
+            if term in hits:
+                workspace[term] = hits[term]
+                if extra:
+                    self._carry[term] = (stop, np.array(hits[term][-extra:]))
+                if profiler is not None:
+                    profiler.stop(frame, workspace[term])
+                continue
+            if term in static and term not in expand:
+                pass    # only read by other static terms, through _static_rows
+            elif term in static and not isinstance(term, LoadableTerm):
+                rows = self._static_rows(term, start)
+                workspace[term] = np.where(self.store.exists(start - extra, stop), rows[0], rows[1])
+                if term in keys:
+                    self.cache.put(keys[term], workspace[term])
+            elif term is AssetExists():
+                workspace[term] = self.store.exists(start - extra, stop)
+            elif isinstance(term, LoadableTerm):
+                workspace[term] = self.loader.load(term, start - extra, stop)
+            else:
+                carried = self._carried(term, start, extra)
+                fresh = extra if carried is None else 0
+                deps = term.dependencies
+                inputs = [_rows(workspace[dep], extra_rows[dep], fresh + deps[dep])
+                          for dep in term.inputs]
+                if term.window_length > 1:
+                    inputs = [self._adjusted(dep, data, stop) for dep, data in zip(term.inputs, inputs)]
+                mask = _rows(workspace[term.mask], extra_rows[term.mask], fresh)
+                result = term._compute(inputs, calendar[start - fresh:stop], assets, mask)
+                if self.compact:
+                    result = compact(result)
+                if carried is not None:
+                    result = np.concatenate([carried, result])
+                if extra:
+                    self._carry[term] = (stop, np.array(result[-extra:]))
+                if term in keys:
+                    self.cache.put(keys[term], result)
+                workspace[term] = result
+            if profiler is not None:
+                profiler.stop(frame, workspace.get(term), loaded=isinstance(term, LoadableTerm))
+
+            for dep in term.dependencies:
+                remaining[dep] -= 1
+                if remaining[dep] == 0 and dep not in outputs:
+                    workspace.pop(dep, None)
+
+        return {name: _rows(workspace[term], extra_rows[term], 0)
+                for name, term in graph.outputs.items()}
+
+    def optimized(self, graph):
+        """
+        `graph` rewritten by the optimizer, once for each set of outputs so
+        that every block evaluates the same terms
+        """
+        key = frozenset(graph.outputs.items())
+        result = self._optimized.get(key)
+        if result is None:
+            result = self._optimized[key] = optimize(
+                graph, getattr(self.loader, 'is_static', None), self.compact)
+        return result
+
+    def explain(self, graph, sessions=126):
+        """
+        The optimized `graph` as text, with each term's estimated rows,
+        memory and work for a block of `sessions` sessions
+        """
+        return format_graph(self.optimized(graph), len(self.store.assets), sessions,
+                            itemsize=lambda term: _itemsize(term, self.compact))
+
+    def _static_terms(self, ordering, outputs, hits):
+        """
+        The terms whose cells depend only on the store's per-asset
+        attributes and on whether the asset exists, and of those the ones
+        read by an output or a date-dependent term
+        """
+        is_static = getattr(self.loader, 'is_static', None)
+        if is_static is None:
+            return set(), set()
+        static = static_terms(ordering, is_static, skip=hits)
+        if not any(isinstance(term, LoadableTerm) for term in static):
+            return set(), set()
+        expand = static & outputs
+        for term in ordering:
+            if term not in static and term not in hits:
+                expand.update(dep for dep in term.dependencies if dep in static)
+        return static, expand
+
+    def _static_rows(self, term, start):
+        """
+        A static term's output as two rows: for every asset existing, and
+        for none
+        """
+        try:
+            return self._static[term]
+        except KeyError:
+            pass
+        n_assets = len(self.store.assets)
+        if term is AssetExists():
+            rows = np.array([[True], [False]]).repeat(n_assets, axis=1)
+        elif isinstance(term, LoadableTerm):
+            row = self.loader.load(term, start, start + 1)[0]
+            rows = np.array([row, row])
+        else:
+            inputs = [self._static_rows(dep, start) for dep in term.inputs]
+            mask = self._static_rows(term.mask, start)
+            dates = self.store.calendar[[start, start]]
+            rows = term._compute(inputs, dates, self.store.assets, mask)
+            if self.compact:
+                rows = compact(rows)
+        self._static[term] = rows
+        return rows
+
+    def _cache_keys(self, graph, outputs, start, stop):
+        """
+        Cache keys of the terms of `graph` worth storing for sessions
+        [start, stop): its computed outputs and windowed terms
+        """
+        fingerprint = getattr(self.loader, 'fingerprint', None)
+        if self.cache is None or fingerprint is None:
+            return {}
+        source = fingerprint() + (':compact' if self.compact else '')
+        calendar = self.store.calendar
+        return {term: self.cache.key(term, source, calendar[start - graph.extra_rows[term]], calendar[stop - 1])
+                for term in graph.ordering
+                if isinstance(term, ComputableTerm) and (term in outputs or term.windowed)}
+
+    def _cached(self, graph, outputs, keys):
+        """
+        The arrays read from the cache, looking up a term only if no cached
+        term downstream of it covers its consumers
+        """
+        hits = {}
+        needed = set(outputs)
+        for term in reversed(graph.ordering):
+            if term not in needed:
+                continue
+            if term in keys:
+                data = self.cache.get(keys[term])
+                if data is not None:
+                    hits[term] = data
+                    continue
+            needed.update(term.dependencies)
+        return hits
+
+    def _adjusted(self, term, data, stop):
+        """
+        A window input as an AdjustedArray when the loader has adjustments
+        for its rows, which end at session `stop`
+        """
+        if not isinstance(term, LoadableTerm) or not hasattr(self.loader, 'adjustments'):
+            return data
+        return adjusted(data, self.loader.adjustments(term, stop - len(data), stop), self.loader.lag)
+
+    def _carried(self, term, start, extra):
+        """
+        The `extra` rows of `term` before session `start` if the previous
+        chunk ended there, else None
+        """
+        if not extra or term not in self._carry:
+            return None
+        stop, tail = self._carry[term]
+        if stop != start or len(tail) < extra:
+            return None
+        return tail[len(tail) - extra:]
+
+
+def _needed(graph, outputs, hits):
+    """
+    The terms of `graph` still to evaluate when `hits` are read from the
+    cache, in order, and how many of those read each term
+    """
+    needed = set(outputs)
+    for term in reversed(graph.ordering):
+        if term in needed and term not in hits:
+            needed.update(term.dependencies)
+    ordering = [term for term in graph.ordering if term in needed]
+    remaining = dict.fromkeys(ordering, 0)
+    for term in ordering:
+        if term not in hits:
+            for dep in term.dependencies:
+                remaining[dep] += 1
+    return ordering, remaining
+
+
+def _profile_kind(term, hits):
+    if term in hits:
+        return 'cached'
+    if isinstance(term, LoadableTerm) or term is AssetExists():
+        return 'load'
+    return 'term'
+
+
+def _itemsize(term, compact=False):
+    convert = compact_dtype if compact else np.dtype
+    outputs = getattr(term, 'outputs', None)
+    if outputs:
+        return sum(convert(term.output_dtype(name)).itemsize for name in outputs)
+    # Unsized string dtypes report 0; count them like object pointers.
+    return convert(term.dtype).itemsize or 8
+
+
+def _rows(data, have, need):
+    """
+    Drop the leading rows of `data` that its consumer does not need
+    """
+    return data[have - need:]
@@ -0,0 +1,120 @@
+"""
+Elementwise arithmetic, comparison and boolean terms built by operators
+
+`pb_rank + pe_rank`, `momentum > 1` and `universe & top_600` all create an
+Elementwise term whose operands are other terms or plain scalars. The
+graph optimizer fuses trees of them into a FusedExpression.
+"""
+import numpy as np
+
+from quantopian.pipeline.term import ComputableTerm, Term
+
+OPERATORS = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'div': np.true_divide,
+    'pow': np.power,
+    'neg': np.negative,
+    'lt': np.less,
+    'le': np.less_equal,
+    'gt': np.greater,
+    'ge': np.greater_equal,
+    'eq': np.equal,
+    'ne': np.not_equal,
+    'and': np.logical_and,
+    'or': np.logical_or,
+    'invert': np.logical_not,
+}
+
+SYMBOLS = {
+    'add': '+', 'sub': '-', 'mul': '*', 'div': '/', 'pow': '**',
+    'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>=', 'eq': '==', 'ne': '!=',
+    'and': '&', 'or': '|',
+}
+
+
+class ElementwiseMixin(object):
+    """
+    A term applying one NumPy ufunc to aligned operand arrays.
+
+    Subclasses also derive from Factor or Filter, which decides the dtype.
+    """
+    window_length = 0
+    cellwise = True
+
+    def __init__(self, op, operands):
+        if op not in OPERATORS:
+            raise ValueError('unknown operator %r' % (op,))
+        self.op = op
+        self.operands = tuple(operands)
+        super(ElementwiseMixin, self).__init__(
+            inputs=[o for o in self.operands if isinstance(o, Term)],
+            window_length=0,
+        )
+
+    def _compute(self, inputs, dates, assets, mask):
+        arrays = iter(inputs)
+        args = [next(arrays) if isinstance(o, Term) else o for o in self.operands]
+        with np.errstate(all='ignore'):
+            result = OPERATORS[self.op](*args)
+        if result.dtype != self.dtype:
+            result = result.astype(self.dtype)
+        return self._where_mask(result, mask)
+
+    def __repr__(self):
+        if len(self.operands) == 1:
+            return '%s(%r)' % ('~' if self.op == 'invert' else '-', self.operands[0])
+        left, right = self.operands
+        return '(%r %s %r)' % (left, SYMBOLS[self.op], right)
+
+
+class FusedExpression(ComputableTerm):
+    """
+    A tree of Elementwise terms sharing one mask, evaluated as one term.
+
+    `steps` are (op, dtype, operands) in evaluation order, each operand
+    being ('input', k), ('step', j) or ('const', value); the last step is
+    the result. Every step casts to the dtype of the term it replaces, and
+    the mask is applied once, to the result. `text` is the repr of the
+    tree's root.
+    """
+    window_length = 0
+    cellwise = True
+
+    def __init__(self, inputs, steps, text, mask, dtype, missing_value):
+        self.steps = tuple(steps)
+        self.text = text
+        super(FusedExpression, self).__init__(
+            inputs=inputs, window_length=0, mask=mask, dtype=dtype, missing_value=missing_value,
+        )
+
+    def _compute(self, inputs, dates, assets, mask):
+        values = []
+        with np.errstate(all='ignore'):
+            for op, dtype, operands in self.steps:
+                args = [inputs[v] if kind == 'input' else values[v] if kind == 'step' else v
+                        for kind, v in operands]
+                # Each step is read by one later step only, which can
+                # write its result over it.
+                out = None
+                if all(_fits(a, dtype) for a in args):
+                    out = next((values[v] for kind, v in operands if kind == 'step'), None)
+                if out is not None:
+                    result = OPERATORS[op](*args, out=out)
+                else:
+                    result = OPERATORS[op](*args)
+                    if result.dtype != dtype:
+                        result = result.astype(dtype)
+                values.append(result)
+        return self._where_mask(values[-1], mask)
+
+    def __repr__(self):
+        return self.text
+
+
+def _fits(value, dtype):
+    # Operands whose result the ufunc computes in `dtype` itself.
+    if isinstance(value, np.ndarray):
+        return value.dtype == dtype
+    return type(value) in (bool, int, float)
@@ -0,0 +1,30 @@
+from quantopian.pipeline.factors.factor import (
+    CustomFactor,
+    Factor,
+    Latest,
+    NumericalExpression,
+    Rank,
+    RecarrayField,
+    StackedRank,
+)
+from quantopian.pipeline.factors.rolling import RollingFactor, RollingWindow
+from quantopian.pipeline.factors.basic import (
+    AverageDollarVolume,
+    Returns,
+    SimpleMovingAverage,
+)
+
+__all__ = [
+    'AverageDollarVolume',
+    'CustomFactor',
+    'Factor',
+    'Latest',
+    'NumericalExpression',
+    'Rank',
+    'RecarrayField',
+    'Returns',
+    'RollingFactor',
+    'RollingWindow',
+    'SimpleMovingAverage',
+    'StackedRank',
+]
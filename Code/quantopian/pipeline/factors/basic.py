@@ -0,0 +1,34 @@
+"""
+Built-in factors over pricing data
+"""
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.factors.rolling import RollingFactor
+
+
+class SimpleMovingAverage(RollingFactor):
+    """
+    Average of the input over the window, ignoring missing values
+    """
+    window_safe = True
+
+    def compute(self, today, assets, out, data):
+        out[:] = data.mean(skipna=True)
+
+
+class AverageDollarVolume(SimpleMovingAverage):
+    """
+    Average of close * volume over the window
+    """
+    inputs = [USEquityPricing.close.latest * USEquityPricing.volume.latest]
+    window_safe = False
+
+
+class Returns(RollingFactor):
+    """
+    Percent change in close over the window
+    """
+    inputs = [USEquityPricing.close]
+    window_safe = True
+
+    def compute(self, today, assets, out, close):
+        out[:] = (close[-1] - close[0]) / close[0]
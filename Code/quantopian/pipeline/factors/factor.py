@@ -0,0 +1,317 @@
+"""
+Numeric terms: Factor, CustomFactor and the terms built from them
+"""
+import numpy as np
+import pandas as pd
+
+from quantopian.pipeline.adjustments import AdjustedArray
+from quantopian.pipeline.expression import ElementwiseMixin
+from quantopian.pipeline.filters.filter import Filter, NullFilter, NumExprFilter, TopK
+from quantopian.pipeline.loaders import is_missing
+from quantopian.pipeline.term import ComputableTerm, LatestMixin, NotSpecified, Term, default_missing_value
+from quantopian.utils.ranking import RANK_METHODS, rankdata_2d, rankdata_stack
+
+
+def _arith(op, reflected=False):
+    def method(self, other):
+        if not isinstance(other, (Term, int, float, np.number)):
+            return NotImplemented
+        operands = (other, self) if reflected else (self, other)
+        return NumericalExpression(op, operands)
+    return method
+
+
+def _compare(op):
+    def method(self, other):
+        if not isinstance(other, (Term, int, float, np.number)):
+            return NotImplemented
+        return NumExprFilter(op, (self, other))
+    return method
+
+
+class Factor(ComputableTerm):
+    dtype = np.dtype(np.float64)
+    missing_value = np.nan
+
+    __add__ = _arith('add')
+    __radd__ = _arith('add', reflected=True)
+    __sub__ = _arith('sub')
+    __rsub__ = _arith('sub', reflected=True)
+    __mul__ = _arith('mul')
+    __rmul__ = _arith('mul', reflected=True)
+    __truediv__ = __div__ = _arith('div')
+    __rtruediv__ = __rdiv__ = _arith('div', reflected=True)
+    __pow__ = _arith('pow')
+
+    __lt__ = _compare('lt')
+    __le__ = _compare('le')
+    __gt__ = _compare('gt')
+    __ge__ = _compare('ge')
+
+    def __neg__(self):
+        return NumericalExpression('neg', (self,))
+
+    def eq(self, other):
+        return NumExprFilter('eq', (self, other))
+
+    def rank(self, method='ordinal', ascending=True, mask=NotSpecified):
+        """
+        Per-date rank of this factor among the assets passing `mask`.
+
+        Missing values rank after every real value; assets outside the mask
+        get NaN.
+        """
+        return Rank(self, method=method, ascending=ascending, mask=mask)
+
+    def top(self, N, mask=NotSpecified):
+        return TopK(self, N, largest=True, mask=mask)
+
+    def bottom(self, N, mask=NotSpecified):
+        return TopK(self, N, largest=False, mask=mask)
+
+    def isnull(self):
+        return NullFilter(self)
+
+    def notnull(self):
+        return NullFilter(self, negate=True)
+
+
+class NumericalExpression(ElementwiseMixin, Factor):
+    """
+    Arithmetic over factors and scalars
+    """
+
+
+class Latest(LatestMixin, Factor):
+    pass
+
+
+class Rank(Factor):
+    window_safe = True
+
+    def __init__(self, factor, method='ordinal', ascending=True, mask=NotSpecified):
+        if method not in RANK_METHODS:
+            raise ValueError('unknown rank method %r' % (method,))
+        self.method = method
+        self.ascending = ascending
+        super(Rank, self).__init__(inputs=(factor,), window_length=0, mask=mask)
+
+    def _compute(self, inputs, dates, assets, mask):
+        return rankdata_2d(inputs[0], mask, self.method, self.ascending)
+
+    def __repr__(self):
+        return '%r.rank(ascending=%s)' % (self.inputs[0], self.ascending)
+
+
+class StackedRank(Factor):
+    """
+    The ranks of several factors under one shared mask, computed with a
+    single sort over their stacked values. Unpacks into one rank term per
+    factor, each equal to `factor.rank(method, ascending, mask)`:
+
+        pb_rank, roa_rank = StackedRank([pb, roa], ascending=[True, False], mask=universe)
+    """
+    window_safe = True
+
+    def __init__(self, factors, ascending=True, method='ordinal', mask=NotSpecified):
+        factors = tuple(factors)
+        if method not in RANK_METHODS:
+            raise ValueError('unknown rank method %r' % (method,))
+        if isinstance(ascending, (bool, np.bool_)):
+            ascending = (ascending,) * len(factors)
+        if len(ascending) != len(factors):
+            raise ValueError('got %d ascending flags for %d factors' % (len(ascending), len(factors)))
+        self.method = method
+        self.ascending = tuple(bool(a) for a in ascending)
+        self.outputs = tuple('rank_%d' % k for k in range(len(factors)))
+        super(StackedRank, self).__init__(inputs=factors, window_length=0, mask=mask)
+
+    def output_dtype(self, name):
+        return self.dtype
+
+    def output_missing_value(self, name):
+        return self.missing_value
+
+    def _compute(self, inputs, dates, assets, mask):
+        ranks = rankdata_stack(np.stack(inputs), mask, self.method, self.ascending)
+        out = np.recarray(mask.shape, dtype=[(name, ranks.dtype) for name in self.outputs])
+        for name, layer in zip(self.outputs, ranks):
+            out[name] = layer
+        return out
+
+    def __iter__(self):
+        return iter([RecarrayField(self, name) for name in self.outputs])
+
+    def __getitem__(self, k):
+        return RecarrayField(self, self.outputs[k])
+
+    def __repr__(self):
+        return 'StackedRank(%s)' % ', '.join(repr(t) for t in self.inputs)
+
+
+class CustomFactor(Factor):
+    """
+    A factor defined by a `compute(today, assets, out, *inputs)` method.
+
+    compute is called once per date with windows of window_length rows,
+    restricted to the assets passing the mask. Factors that declare
+    `outputs` receive `out` as a record array with one field per output
+    and can be unpacked into one term per output. Outputs use the factor's
+    dtype unless `output_dtypes` maps them to another one.
+
+    Setting `incremental = True` declares that compute treats each asset
+    on its own and does not use `today`. compute is then only given the
+    assets whose input windows changed since the previous date, or that
+    just entered the mask; the others keep their previous output. With
+    fundamentals that change a few times a year, most of them do.
+
+    Setting `cellwise = True` on a factor with a window_length of 1
+    declares that compute works element by element and does not use
+    `today`. It is then called once for the whole block of dates, with
+    every cell laid out as one row of assets, instead of once per date;
+    `today` is the block's last date. Cells outside the mask are computed
+    too, and then set to the missing value.
+    """
+    outputs = None
+    output_dtypes = None
+    incremental = False
+
+    def __init__(self, inputs=NotSpecified, outputs=NotSpecified, window_length=NotSpecified,
+                 mask=NotSpecified, dtype=NotSpecified, missing_value=NotSpecified,
+                 window_safe=NotSpecified, **params):
+        if outputs is not NotSpecified:
+            self.outputs = tuple(outputs)
+        elif self.outputs is not None:
+            self.outputs = tuple(self.outputs)
+        self.params = params
+        super(CustomFactor, self).__init__(
+            inputs=inputs, window_length=window_length, mask=mask, dtype=dtype,
+            missing_value=missing_value, window_safe=window_safe,
+        )
+
+    def _validate(self):
+        super(CustomFactor, self)._validate()
+        if not self.inputs:
+            raise ValueError('%s has no inputs' % type(self).__name__)
+        if self.window_length < 1:
+            raise ValueError('%s needs a window_length of at least 1' % type(self).__name__)
+
+    def compute(self, today, assets, out, *inputs):
+        raise NotImplementedError('compute')
+
+    def output_dtype(self, name):
+        return np.dtype((self.output_dtypes or {}).get(name, self.dtype))
+
+    def output_missing_value(self, name):
+        dtype = self.output_dtype(name)
+        return self.missing_value if dtype == self.dtype else default_missing_value(dtype)
+
+    def _allocate(self, shape):
+        if self.outputs:
+            dtype = [(name, self.output_dtype(name)) for name in self.outputs]
+            out = np.recarray(shape, dtype=dtype)
+            for name in self.outputs:
+                out[name] = self.output_missing_value(name)
+            return out
+        return np.full(shape, self.missing_value, dtype=self.dtype)
+
+    def _compute(self, inputs, dates, assets, mask):
+        if self.cellwise and self.window_length == 1:
+            return self._compute_panel(inputs, dates, assets, mask)
+        n_dates, n_assets = mask.shape
+        window = self.window_length
+        result = self._allocate((n_dates, n_assets))
+        changed = self._changed(inputs, mask) if self.incremental else None
+        for i in range(n_dates):
+            columns = np.flatnonzero(mask[i])
+            if changed is not None and i:
+                fresh = changed[i, columns]
+                kept = columns[~fresh]
+                result[i, kept] = result[i - 1, kept]
+                columns = columns[fresh]
+                if not len(columns):
+                    continue
+            windows = [data.window(i, i + window, columns) if isinstance(data, AdjustedArray)
+                       else data[i:i + window][:, columns] for data in inputs]
+            out = self._allocate(len(columns))
+            self.compute(pd.Timestamp(dates[i], tz='UTC'), assets[columns], out, *windows, **self.params)
+            result[i, columns] = out
+        return result
+
+    def _compute_panel(self, inputs, dates, assets, mask):
+        # Every cell of the block is computed, in one call, and the cells
+        # outside the mask are then reset: cheaper than gathering the others.
+        n_dates = len(mask)
+        cells = [np.asarray(data).reshape(1, -1) for data in inputs]
+        out = self._allocate(mask.size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.compute(pd.Timestamp(dates[-1], tz='UTC'), np.tile(assets, n_dates), out, *cells, **self.params)
+        result = out.reshape(mask.shape)
+        outside = ~mask
+        if self.outputs:
+            for name in self.outputs:
+                result[name][outside] = self.output_missing_value(name)
+        else:
+            result[outside] = self.missing_value
+        return result
+
+    def _changed(self, inputs, mask):
+        """
+        Boolean dates x assets array, False where an asset was in the mask
+        on the previous date and every input window holds the same values
+        as it did then
+        """
+        n_dates = len(mask)
+        window = self.window_length
+        changed = np.ones(mask.shape, dtype=bool)
+        if n_dates < 2:
+            return changed
+        changed[1:] = ~mask[:-1]
+        for data in inputs:
+            values = np.asarray(data)
+            diff = values[1:] != values[:-1]
+            if values.dtype.kind in 'fM':
+                missing = is_missing(values)
+                diff &= ~(missing[1:] & missing[:-1])
+            # counts[r]: changes between consecutive rows up to row r. The
+            # window of date i is rows [i, i + window), so it differs from
+            # date i - 1's where counts moved between rows i - 1 and i + window - 1.
+            counts = np.zeros(values.shape, dtype=np.int32)
+            np.cumsum(diff, axis=0, out=counts[1:])
+            changed[1:] |= counts[window:window + n_dates - 1] != counts[:n_dates - 1]
+            if isinstance(data, AdjustedArray):
+                changed[:, data.cols] = True
+        return changed
+
+    def __iter__(self):
+        if not self.outputs:
+            raise TypeError('%s has a single output and cannot be unpacked' % type(self).__name__)
+        return iter([RecarrayField(self, name) for name in self.outputs])
+
+    def __getattr__(self, name):
+        outputs = self.__dict__.get('outputs') or ()
+        if name in outputs:
+            return RecarrayField(self, name)
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return '%s(window_length=%d)' % (type(self).__name__, self.window_length)
+
+
+class RecarrayField(Factor):
+    """
+    One named output of a multi-output CustomFactor
+    """
+    def __init__(self, factor, attribute):
+        self.attribute = attribute
+        super(RecarrayField, self).__init__(
+            inputs=(factor,), window_length=0, mask=factor.mask,
+            dtype=factor.output_dtype(attribute),
+            missing_value=factor.output_missing_value(attribute),
+        )
+
+    def _compute(self, inputs, dates, assets, mask):
+        return self._where_mask(np.array(inputs[0][self.attribute]), mask)
+
+    def __repr__(self):
+        return '%r.%s' % (self.inputs[0], self.attribute)
@@ -0,0 +1,12 @@
+"""
+Factors over Morningstar fundamentals
+"""
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.factors.factor import Latest
+
+
+class MarketCap(Latest):
+    """
+    The most recent market capitalisation
+    """
+    inputs = [Fundamentals.market_cap]
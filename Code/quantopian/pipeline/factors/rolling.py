@@ -0,0 +1,193 @@
+"""
+Factors evaluated by streaming one row per session through ring buffers
+
+A CustomFactor's compute sees a fresh window_length x assets copy of every
+input each session. A RollingFactor instead keeps each input in a
+RollingWindow: a ring buffer that takes the new row each session, together
+with running Welford moments of each column. Means and standard deviations
+then cost O(assets) per session, and lagged lookups such as
+`close[-10] / close[0]` read two rows of the buffer directly. A split or
+dividend taking effect rescales the affected columns of the buffer once,
+when the window first reaches it.
+"""
+import numpy as np
+import pandas as pd
+
+from quantopian.pipeline.adjustments import AdjustedArray
+from quantopian.pipeline.factors.factor import CustomFactor
+
+
+class RollingWindow(object):
+    """
+    The last `length` rows of one input, indexed like a window array:
+    window[-1] is the newest row and window[0] the oldest.
+
+    For float inputs it also keeps, per column, the count, mean and sum of
+    squared deviations (M2) of the non-missing values in the window.
+    """
+
+    def __init__(self, length, width, dtype=np.float64):
+        self.length = length
+        self.dtype = np.dtype(dtype)
+        self.rows = np.empty((length, width), dtype=self.dtype)
+        self.head = 0       # buffer row holding the oldest value
+        self.filled = 0
+        self.moments = self.dtype.kind == 'f'
+        if self.moments:
+            self._count = np.zeros(width)
+            self._mean = np.zeros(width)
+            self._m2 = np.zeros(width)
+
+    def __len__(self):
+        return self.filled
+
+    def __getitem__(self, k):
+        if not -self.length <= k < self.length:
+            raise IndexError('window index %d out of range for length %d' % (k, self.length))
+        return self.rows[(self.head + k) % self.length]
+
+    @property
+    def shape(self):
+        return self.rows.shape
+
+    def window(self):
+        """
+        The buffer as an ordinary oldest-first array (a copy)
+        """
+        return np.concatenate([self.rows[self.head:], self.rows[:self.head]])
+
+    def push(self, row):
+        """
+        Append the newest row, dropping the oldest once the buffer is full
+        """
+        if self.filled < self.length:
+            slot = (self.head + self.filled) % self.length
+            self.filled += 1
+        else:
+            slot = self.head
+            self.head = (self.head + 1) % self.length
+            if self.moments:
+                self._remove(self.rows[slot])
+        self.rows[slot] = row
+        if self.moments:
+            self._add(self.rows[slot])
+
+    def _add(self, x):
+        ok = ~np.isnan(x)
+        self._count += ok
+        delta = np.where(ok, x - self._mean, 0.0)
+        self._mean += delta / np.maximum(self._count, 1)
+        self._m2 += np.where(ok, delta * (x - self._mean), 0.0)
+
+    def _remove(self, y):
+        ok = ~np.isnan(y)
+        self._count -= ok
+        delta = np.where(ok, y - self._mean, 0.0)
+        self._mean -= np.where(self._count > 0, delta / np.maximum(self._count, 1), self._mean)
+        self._m2 -= np.where(ok, delta * (y - self._mean), 0.0)
+        np.maximum(self._m2, 0.0, out=self._m2)
+
+    def resync(self):
+        """
+        Recompute the moments exactly from the buffer, dropping any rounding
+        drift accumulated by the running updates
+        """
+        if not self.moments or not self.filled:
+            return
+        data = self.window()[-self.filled:]
+        self._count = (~np.isnan(data)).sum(axis=0).astype(np.float64)
+        with np.errstate(all='ignore'):
+            mean = np.nansum(data, axis=0) / self._count
+            self._m2 = np.nansum((data - mean) ** 2, axis=0)
+        self._mean = np.where(self._count > 0, mean, 0.0)
+        self._m2 = np.where(self._count > 0, self._m2, 0.0)
+
+    def scale(self, col, ratio, keep=0):
+        """
+        Multiply column `col` by `ratio` in all but the newest `keep` rows
+        """
+        n = self.filled - keep
+        if n <= 0:
+            return
+        slots = (self.head + np.arange(self.filled)) % self.length
+        self.rows[slots[:n], col] *= ratio
+        if self.moments:
+            data = self.rows[slots, col]
+            ok = ~np.isnan(data)
+            count = ok.sum()
+            mean = data[ok].mean() if count else 0.0
+            self._count[col] = count
+            self._mean[col] = mean
+            self._m2[col] = ((data[ok] - mean) ** 2).sum() if count else 0.0
+
+    @property
+    def count(self):
+        """
+        Non-missing values per column
+        """
+        return self._count
+
+    def mean(self, skipna=False):
+        """
+        Column means; with skipna=False a column with any missing value is NaN
+        """
+        valid = self._count > 0 if skipna else self._count == self.filled
+        return np.where(valid & (self._count > 0), self._mean, np.nan)
+
+    def sum(self, skipna=False):
+        return self.mean(skipna) * self._count
+
+    def var(self, ddof=0, skipna=False):
+        dof = self._count - ddof
+        valid = (dof > 0) & (skipna | (self._count == self.filled))
+        with np.errstate(all='ignore'):
+            return np.where(valid, self._m2 / dof, np.nan)
+
+    def std(self, ddof=0, skipna=False):
+        return np.sqrt(self.var(ddof, skipna))
+
+
+class RollingFactor(CustomFactor):
+    """
+    A CustomFactor whose compute receives one RollingWindow per input
+    instead of a window array, plus `out` for every asset.
+
+    Each session pushes one new row per input, so the cost per session
+    does not grow with window_length. Windows are evaluated for all assets
+    and the mask is applied to the result afterwards.
+    """
+    # Moments are recomputed exactly this often to bound rounding drift.
+    resync_every = 1024
+
+    def _compute(self, inputs, dates, assets, mask):
+        n_dates, n_assets = mask.shape
+        length = self.window_length
+        windows = [RollingWindow(length, n_assets, data.dtype) for data in inputs]
+        for window, data in zip(windows, inputs):
+            for r in range(length - 1):
+                self._push(window, data, r)
+
+        result = self._allocate((n_dates, n_assets))
+        for i in range(n_dates):
+            for window, data in zip(windows, inputs):
+                self._push(window, data, length - 1 + i)
+                if (i + 1) % self.resync_every == 0:
+                    window.resync()
+            self.compute(pd.Timestamp(dates[i], tz='UTC'), assets, result[i], *windows, **self.params)
+
+        if self.outputs:
+            for name in self.outputs:
+                result[name] = self._where_mask(result[name], mask)
+            return result
+        return self._where_mask(result, mask)
+
+    @staticmethod
+    def _push(window, data, r):
+        """
+        Push row r of `data`, then apply the adjustments that the window
+        ending at row r is the first to see
+        """
+        window.push(data[r])
+        if isinstance(data, AdjustedArray):
+            for row, col, ratio in zip(*(a.tolist() for a in data.taking_effect(r))):
+                window.scale(col, ratio, keep=max(0, r - row + 1))
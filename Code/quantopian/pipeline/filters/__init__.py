@@ -0,0 +1,19 @@
+from quantopian.pipeline.filters.filter import (
+    Filter,
+    Latest,
+    NullFilter,
+    NumExprFilter,
+    StaticAssets,
+    TopK,
+)
+from quantopian.pipeline.filters.universe import QTradableStocksUS
+
+__all__ = [
+    'Filter',
+    'Latest',
+    'NullFilter',
+    'NumExprFilter',
+    'QTradableStocksUS',
+    'StaticAssets',
+    'TopK',
+]
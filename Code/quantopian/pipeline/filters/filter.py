@@ -0,0 +1,108 @@
+"""
+Boolean-valued terms used as screens and masks
+"""
+import numpy as np
+
+from quantopian.pipeline.expression import ElementwiseMixin
+from quantopian.pipeline.term import ComputableTerm, LatestMixin, NotSpecified
+from quantopian.utils.ranking import top_k_mask
+
+
+class Filter(ComputableTerm):
+    dtype = np.dtype(bool)
+    missing_value = False
+    window_safe = True
+
+    def __and__(self, other):
+        return _combine('and', self, other)
+
+    def __rand__(self, other):
+        return _combine('and', other, self)
+
+    def __or__(self, other):
+        return _combine('or', self, other)
+
+    def __ror__(self, other):
+        return _combine('or', other, self)
+
+    def __invert__(self):
+        return NumExprFilter('invert', (self,))
+
+
+def _combine(op, left, right):
+    for term in (left, right):
+        if not isinstance(term, Filter):
+            raise TypeError('cannot combine a Filter with %r using %r' % (term, op))
+    return NumExprFilter(op, (left, right))
+
+
+class NumExprFilter(ElementwiseMixin, Filter):
+    """
+    A comparison of factors or a boolean combination of filters
+    """
+
+
+class Latest(LatestMixin, Filter):
+    pass
+
+
+class NullFilter(Filter):
+    """
+    True where the input term holds its missing value
+    """
+    cellwise = True
+
+    def __init__(self, term, negate=False):
+        self.negate = negate
+        super(NullFilter, self).__init__(inputs=(term,), window_length=0)
+
+    def _compute(self, inputs, dates, assets, mask):
+        data = inputs[0]
+        kind = data.dtype.kind
+        if kind == 'f':
+            result = np.isnan(data)
+        elif kind == 'M':
+            result = np.isnat(data)
+        else:
+            result = data == self.inputs[0].missing_value
+        if self.negate:
+            result = ~result
+        return result & mask
+
+    def __repr__(self):
+        return '%r.%s()' % (self.inputs[0], 'notnull' if self.negate else 'isnull')
+
+
+class StaticAssets(Filter):
+    """
+    True for a fixed set of sids
+    """
+    cellwise = True
+
+    def __init__(self, assets):
+        self.sids = frozenset(int(a) for a in assets)
+        super(StaticAssets, self).__init__(inputs=(), window_length=0)
+
+    def _compute(self, inputs, dates, assets, mask):
+        wanted = np.array([int(a) in self.sids for a in assets], dtype=bool)
+        return mask & wanted
+
+
+class TopK(Filter):
+    """
+    True for the N assets passing `mask` with the largest (or smallest)
+    values of a factor on each date. Selects the same assets as
+    `factor.rank(...) <= N`, but with a partition rather than a full sort.
+    """
+    def __init__(self, factor, N, largest=True, mask=NotSpecified):
+        if not isinstance(N, (int, np.integer)) or N < 0:
+            raise ValueError('N must be a non-negative int, got %r' % (N,))
+        self.N = int(N)
+        self.largest = largest
+        super(TopK, self).__init__(inputs=(factor,), window_length=0, mask=mask)
+
+    def _compute(self, inputs, dates, assets, mask):
+        return top_k_mask(inputs[0], mask, self.N, self.largest)
+
+    def __repr__(self):
+        return '%r.%s(%d)' % (self.inputs[0], 'top' if self.largest else 'bottom', self.N)
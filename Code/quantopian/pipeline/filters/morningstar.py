@@ -0,0 +1,13 @@
+"""
+Filters over Morningstar share-class attributes
+"""
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.filters.filter import Latest
+
+
+class IsPrimaryShare(Latest):
+    inputs = [Fundamentals.is_primary_share]
+
+
+class IsDepositaryReceipt(Latest):
+    inputs = [Fundamentals.is_depositary_receipt]
@@ -0,0 +1,35 @@
+"""
+Tradable-universe filters
+"""
+from quantopian.pipeline.data import Fundamentals, USEquityPricing
+from quantopian.pipeline.factors import AverageDollarVolume
+from quantopian.pipeline.factors.fundamentals import MarketCap
+from quantopian.pipeline.filters.morningstar import IsDepositaryReceipt, IsPrimaryShare
+
+
+_universe = None
+
+
+def QTradableStocksUS():
+    """
+    Local approximation of Quantopian's QTradableStocksUS universe.
+
+    The published rules are rebuilt from store columns: primary common
+    shares that are not depositary receipts, market cap of at least $500M,
+    200-day average dollar volume of at least $2.5M and a price of at least
+    $5. Quantopian used the median rather than the mean dollar volume.
+
+    Every call returns the same filter, so pipelines that share the
+    universe share its terms.
+    """
+    global _universe
+    if _universe is None:
+        _universe = (
+            IsPrimaryShare()
+            & ~IsDepositaryReceipt()
+            & Fundamentals.security_type.latest.eq('ST00000001')
+            & (MarketCap() >= 500e6)
+            & (AverageDollarVolume(window_length=200) >= 2.5e6)
+            & (USEquityPricing.close.latest >= 5)
+        )
+    return _universe
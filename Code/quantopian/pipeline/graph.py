@@ -0,0 +1,91 @@
+"""
+Dependency graph of the terms a pipeline needs
+"""
+from quantopian.pipeline.term import AssetExists, LoadableTerm
+
+
+class TermGraph(object):
+    """
+    Terms reachable from `outputs` in execution order.
+
+    extra_rows[term] is how many rows before the first requested date the
+    term must be computed for, so that every windowed consumer downstream
+    of it sees a full window on the first date.
+    """
+
+    def __init__(self, outputs):
+        self.outputs = dict(outputs)
+        self.ordering = []
+        seen = set()
+        for term in self.outputs.values():
+            self._visit(term, seen, set())
+
+        self.extra_rows = {term: 0 for term in self.ordering}
+        for term in reversed(self.ordering):
+            for dep, extra in term.dependencies.items():
+                self.extra_rows[dep] = max(self.extra_rows[dep], self.extra_rows[term] + extra)
+
+        # How many terms read each term; the engine frees an array once
+        # every consumer has run.
+        self.consumers = {term: 0 for term in self.ordering}
+        for term in self.ordering:
+            for dep in term.dependencies:
+                self.consumers[dep] += 1
+
+    def _visit(self, term, seen, stack):
+        if term in seen:
+            return
+        if term in stack:
+            raise ValueError('cycle in pipeline graph at %r' % (term,))
+        stack.add(term)
+        for dep in term.dependencies:
+            self._visit(dep, seen, stack)
+        stack.discard(term)
+        seen.add(term)
+        self.ordering.append(term)
+
+    @property
+    def max_extra_rows(self):
+        return max(self.extra_rows.values()) if self.extra_rows else 0
+
+    @property
+    def loadable_terms(self):
+        return [t for t in self.ordering if isinstance(t, LoadableTerm)]
+
+    def __contains__(self, term):
+        return term in self.extra_rows
+
+    def __len__(self):
+        return len(self.ordering)
+
+
+def static_terms(ordering, is_static, skip=()):
+    """
+    The terms of `ordering` whose cells depend only on per-asset attributes
+    of the store and on whether the asset exists: the columns `is_static`
+    accepts, and the cellwise terms without a window computed from those
+    alone. Terms in `skip` are not static.
+    """
+    static = set()
+    for term in ordering:
+        if term in skip or term is AssetExists():
+            continue
+        if isinstance(term, LoadableTerm):
+            if is_static(term):
+                static.add(term)
+        elif (term.cellwise and term.window_length <= 1
+              and all(dep in static or dep is AssetExists() for dep in term.dependencies)):
+            static.add(term)
+    return static
+
+
+SCREEN_NAME = '__screen__'
+
+
+def pipeline_graph(pipeline):
+    """
+    The TermGraph for a Pipeline's columns and screen
+    """
+    outputs = dict(pipeline.columns)
+    outputs[SCREEN_NAME] = pipeline.screen if pipeline.screen is not None else AssetExists()
+    return TermGraph(outputs)
@@ -0,0 +1,158 @@
+"""
+Loaders turning dataset columns into dates x assets arrays
+"""
+import numpy as np
+
+from quantopian.errors import NoFurtherDataError
+from quantopian.pipeline.compact import compact_dtype
+from quantopian.pipeline.term import needs_cast
+
+
+def is_missing(data):
+    return np.isnat(data) if data.dtype.kind == 'M' else np.isnan(data)
+
+
+def forward_fill(block, carry):
+    """
+    Fill missing values in each column of `block` with the last value above
+    them, or with `carry` (the value before the block) if there is none.
+    Returns a new array; `block` is not modified.
+    """
+    rows = np.arange(len(block))[:, None]
+    last_valid = np.where(is_missing(block), -1, rows)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    filled = np.take_along_axis(block, np.maximum(last_valid, 0), axis=0)
+    return np.where(last_valid >= 0, filled, carry)
+
+
+class _FillState(object):
+    """
+    The forward-filled rows [start, stop) of one store column, and the
+    filled value in force just before `start`
+    """
+    __slots__ = ('start', 'stop', 'block', 'carry')
+
+    def __init__(self, start, block, carry):
+        self.start = start
+        self.stop = start + len(block)
+        self.block = block
+        self.carry = carry
+
+
+class StoreLoader(object):
+    """
+    Serves BoundColumns from a ColumnarStore.
+
+    Row i of a loaded array holds what was known before the open of session
+    i, which is the store's row i - 1: a pipeline run for a session never
+    sees that session's own close.
+
+    Forward-filled columns keep the rows filled by the previous load, so
+    consecutive chunks only fill the rows they add. Filled arrays are
+    read-only and shared by every term that reads the column.
+
+    With `compact`, float64 columns are served as float32.
+    """
+    lag = 1
+
+    def __init__(self, store, compact=False):
+        self.store = store
+        self.compact = compact
+        self._filled = {}
+
+    def dtype(self, column):
+        """
+        The dtype of the arrays load(column, ...) returns
+        """
+        return compact_dtype(column.dtype) if self.compact else column.dtype
+
+    def load(self, column, start, stop):
+        if start - self.lag < 0:
+            raise NoFurtherDataError(
+                'loading %r for session %d needs data before the start of the store' % (column, start))
+        dtype = self.dtype(column)
+        if column.ffill:
+            data = self._load_filled(column, dtype, start - self.lag, stop - self.lag)
+        else:
+            data = self.store.load(column.store_name, start - self.lag, stop - self.lag)
+        if needs_cast(data.dtype, dtype):
+            data = data.astype(dtype)
+        return data
+
+    def _load_filled(self, column, dtype, start, stop):
+        name = column.store_name
+        raw = self.store.column(name)
+        state = self._filled.get(name)
+        if state is None or not state.start <= start <= state.stop:
+            # Not contiguous with the last load: find the value in force
+            # before `start` once, by filling everything above it.
+            carry = forward_fill(raw[:start], column.missing_value)[-1:] if start else column.missing_value
+            state = _FillState(start, np.asarray(raw[start:start], dtype=dtype), carry)
+
+        if stop > state.stop:
+            offset = start - state.start
+            carry = state.block[-1:] if len(state.block) else state.carry
+            filled = forward_fill(raw[state.stop:stop], carry).astype(dtype, copy=False)
+            block = np.concatenate([state.block[offset:], filled])
+            block.flags.writeable = False
+            state = self._filled[name] = _FillState(
+                start, block, state.block[offset - 1:offset] if offset else state.carry)
+        return state.block[start - state.start:stop - state.start]
+
+    def is_static(self, column):
+        """
+        Whether every row load(column, ...) returns is the same
+        """
+        return not column.ffill and self.store.is_static(column.store_name)
+
+    def fingerprint(self):
+        """
+        Identifies the data this loader serves, for keying cached results
+        """
+        return '%s:%d%s' % (self.store.fingerprint(), self.lag, ':compact' if self.compact else '')
+
+    def adjustments(self, column, start, stop):
+        """
+        The store's adjustments to the rows load(column, start, stop)
+        returns, as (rows, cols, ratios) with rows counted from `start`
+        """
+        rows, cols, ratios = self.store.adjustments(column.store_name, start - self.lag + 1, stop)
+        return rows - (start - self.lag), cols, ratios
+
+
+class PanelLoader(object):
+    """
+    Serves the columns of one DataSet from dates x assets arrays covering
+    calendar sessions [start, start + len), and every other column from
+    `fallback`.
+
+    Panels hold pipeline outputs, which are already as of the open of their
+    session, so no lag is applied to them.
+    """
+
+    def __init__(self, dataset, panels, start, fallback):
+        self.dataset = dataset
+        self.panels = panels
+        self.start = start
+        self.fallback = fallback
+
+    @property
+    def lag(self):
+        return self.fallback.lag
+
+    def is_static(self, column):
+        return column.dataset is not self.dataset and self.fallback.is_static(column)
+
+    def adjustments(self, column, start, stop):
+        if column.dataset is self.dataset:
+            return None
+        return self.fallback.adjustments(column, start, stop)
+
+    def load(self, column, start, stop):
+        if column.dataset is not self.dataset:
+            return self.fallback.load(column, start, stop)
+        panel = self.panels[column.name]
+        if start < self.start or stop > self.start + len(panel):
+            raise NoFurtherDataError('%r only covers sessions %d to %d, not %d to %d' % (
+                column, self.start, self.start + len(panel), start, stop))
+        return panel[start - self.start:stop - self.start]
@@ -0,0 +1,328 @@
+"""
+Rewrites a pipeline's term graph into a cheaper one computing the same
+outputs
+
+optimize(graph) makes three passes over the terms, in execution order:
+
+    merging: terms of the same class whose attributes are equal, once
+        their inputs and masks have been merged, become one term. Filters
+        rebuilt by each call of a helper, such as Sector().notnull(), and
+        factors or expressions declared twice are computed once.
+    copy elision: a window-1 CustomFactor whose compute is the single
+        statement `out[:] = x[-1]`, x being its one column input, is
+        replaced by the column's Latest. That reads the block without calling
+        compute, and merges with other reads of the column.
+    fusion: a tree of elementwise arithmetic, comparisons and boolean
+        operators whose inner results nothing else reads, such as a sum of
+        weighted ranks, becomes one FusedExpression. Its steps write over
+        the buffers of the steps they read, and the mask is applied once.
+
+The outputs keep their values exactly: every fused step casts to the
+dtype of the term it stands for, at compact mode's precision when the
+engine is compact. SimplePipelineEngine(optimize=True) runs its pipelines
+through optimize, and format_graph shows a graph with estimated costs.
+"""
+import ast
+import inspect
+import textwrap
+
+import numpy as np
+
+from quantopian.pipeline.compact import compact_dtype
+from quantopian.pipeline.expression import ElementwiseMixin, FusedExpression
+from quantopian.pipeline.factors.factor import CustomFactor, Latest
+from quantopian.pipeline.graph import TermGraph, static_terms
+from quantopian.pipeline.term import AssetExists, LoadableTerm, Term
+from quantopian.utils.profiling import short_label
+
+
+class OptimizedGraph(TermGraph):
+    """
+    A TermGraph produced by optimize(), with counts of what each pass did
+    """
+
+    def __init__(self, outputs, source, merged=0, elided=0, fused=0):
+        super(OptimizedGraph, self).__init__(outputs)
+        self.source = source
+        self.merged = merged
+        self.elided = elided
+        self.fused = fused
+
+
+def optimize(graph, is_static=None, compact=False):
+    """
+    An OptimizedGraph computing the outputs of `graph`.
+
+    `is_static` is the loader's test for columns of per-asset attributes.
+    Terms computed from those alone are not fused with the others, so that
+    the engine still computes them once per store. With `compact`, fused
+    steps keep the float32 precision of the terms they replace.
+    """
+    if isinstance(graph, OptimizedGraph):
+        return graph
+    replaced = {}   # term of `graph` -> the term computing it
+    known = {}      # structure -> term
+    merged = elided = 0
+    for term in graph.ordering:
+        if isinstance(term, LoadableTerm) or term is AssetExists():
+            replaced[term] = term
+            continue
+        new = _with_inputs(term, replaced)
+        latest = _last_row_copy(new)
+        if latest is not None:
+            new = latest
+            elided += 1
+        key = _term_structure(new)
+        if key in known:
+            new = known[key]
+            merged += 1
+        else:
+            known[key] = new
+        replaced[term] = new
+    outputs = {name: replaced[term] for name, term in graph.outputs.items()}
+    outputs, fused = _fuse(outputs, is_static, compact)
+    return OptimizedGraph(outputs, graph, merged, elided, fused)
+
+
+def format_graph(graph, n_assets, n_sessions, itemsize=None):
+    """
+    `graph` as text, one term per line in execution order with the inputs
+    it reads and its estimated cost for a block of `n_sessions` sessions:
+    rows computed, megabytes held and millions of cells of work
+    """
+    itemsize = itemsize or (lambda term: np.dtype(term.dtype).itemsize or 8)
+    number = {term: k for k, term in enumerate(graph.ordering)}
+    names = {}
+    for name, term in graph.outputs.items():
+        names.setdefault(term, []).append(str(name[-1] if isinstance(name, tuple) else name))
+    lines = ['%4s  %-16s %6s %6s %9s %9s  %s' % ('#', 'class', 'rows', 'window', 'MB', 'Mcells', 'term')]
+    total_bytes = total_cells = 0
+    for term in graph.ordering:
+        rows = n_sessions + graph.extra_rows[term]
+        nbytes = rows * n_assets * itemsize(term)
+        cells = rows * n_assets * _work(term)
+        total_bytes += nbytes
+        total_cells += cells
+        deps = ', '.join('#%d' % number[dep] for dep in term.dependencies)
+        line = '%4d  %-16s %6d %6d %9.1f %9.2f  %s' % (
+            number[term], type(term).__name__[:16], rows, term.window_length,
+            nbytes / 1e6, cells / 1e6, short_label(repr(term), 80))
+        if deps:
+            line += '  <- ' + deps
+        if term in names:
+            line += '  => ' + ', '.join(names[term])
+        lines.append(line)
+    lines.append('%4s  %-16s %6s %6s %9.1f %9.2f  %d terms' % (
+        '', 'total', '', '', total_bytes / 1e6, total_cells / 1e6, len(graph)))
+    if isinstance(graph, OptimizedGraph):
+        lines.append('optimized from %d terms: %d merged, %d last-row copies elided, '
+                     '%d elementwise terms fused' % (
+                         len(graph.source), graph.merged, graph.elided, graph.fused))
+    return '\n'.join(lines)
+
+
+def _work(term):
+    # Cells of work per output cell: a step per fused operation, or a
+    # window per cell for factors whose compute sees whole windows.
+    if isinstance(term, FusedExpression):
+        return len(term.steps)
+    if isinstance(term, CustomFactor) and type(term)._compute is CustomFactor._compute:
+        return max(1, term.window_length)
+    return 1
+
+
+def _last_row_copy(term):
+    """
+    The Latest equal to `term` if it is a CustomFactor whose compute copies
+    the last row of its one column, else None
+    """
+    if not isinstance(term, CustomFactor) or type(term)._compute is not CustomFactor._compute:
+        return None
+    if not _copies_last_row(type(term).compute):
+        return None
+    if term.window_length != 1 or len(term.inputs) != 1 or term.outputs or term.params:
+        return None
+    column = term.inputs[0]
+    if not isinstance(column, LoadableTerm) or column.dtype != term.dtype:
+        return None
+    if _structure(column.missing_value) != _structure(term.missing_value):
+        return None
+    # Built as column.latest builds it, so that the two merge.
+    extra = {'window_safe': True} if term.window_safe else {}
+    return Latest(inputs=(column,), mask=term.mask, dtype=term.dtype,
+                  missing_value=term.missing_value, **extra)
+
+
+_copies = {}    # compute function -> whether it is only out[:] = x[-1]
+
+
+def _copies_last_row(compute):
+    """
+    Whether the source of `compute(self, today, assets, out, x)` is the one
+    statement `out[:] = x[-1]`, besides a docstring and comments
+    """
+    if compute not in _copies:
+        try:
+            tree = ast.parse(textwrap.dedent(inspect.getsource(compute)))
+        except (OSError, TypeError, SyntaxError):
+            tree = None
+        _copies[compute] = tree is not None and _is_last_row_copy(tree.body[0])
+    return _copies[compute]
+
+
+def _is_last_row_copy(function):
+    if not isinstance(function, ast.FunctionDef) or function.decorator_list:
+        return False
+    args = function.args
+    if (args.posonlyargs or args.vararg or args.kwonlyargs or args.kwarg or args.defaults
+            or len(args.args) != 5):
+        return False
+    out, column = args.args[3].arg, args.args[4].arg
+    body = function.body
+    if len(body) == 2 and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]
+    if len(body) != 1 or not isinstance(body[0], ast.Assign) or len(body[0].targets) != 1:
+        return False
+    target, value = body[0].targets[0], body[0].value
+    return (_subscript_of(target, out) and isinstance(target.slice, ast.Slice)
+            and target.slice.lower is target.slice.upper is target.slice.step is None
+            and _subscript_of(value, column) and _literal(value.slice) == -1)
+
+
+def _subscript_of(node, name):
+    return isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == name
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return None
+
+
+def _with_inputs(term, replaced):
+    """
+    `term`, or a copy of it reading the replacements of its inputs, mask
+    and any other term it holds
+    """
+    changes = {}
+    for name, value in vars(term).items():
+        new = _replace(value, replaced)
+        if new is not value:
+            changes[name] = new
+    if not changes:
+        return term
+    copy = object.__new__(type(term))
+    copy.__dict__.update(vars(term))
+    copy.__dict__.update(changes)
+    return copy
+
+
+def _replace(value, replaced):
+    if isinstance(value, Term):
+        return replaced.get(value, value)
+    if isinstance(value, (tuple, list)):
+        items = [_replace(v, replaced) for v in value]
+        if any(new is not old for new, old in zip(items, value)):
+            return type(value)(items)
+    elif isinstance(value, dict):
+        items = {k: _replace(v, replaced) for k, v in value.items()}
+        if any(items[k] is not v for k, v in value.items()):
+            return items
+    return value
+
+
+def _structure(value):
+    """
+    A hashable description of `value`, equal for equal values. Terms other
+    than the one described compare by identity, as their inputs have
+    already been merged.
+    """
+    if isinstance(value, Term):
+        return ('term', id(value))
+    if isinstance(value, (bool, int, str, bytes, type(None))):
+        return (type(value), value)
+    if isinstance(value, (float, complex, np.generic)):
+        return (type(value), repr(value))     # so that NaN equals NaN
+    if isinstance(value, np.dtype):
+        return ('dtype', str(value))
+    if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        return ('array', value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (tuple, list)):
+        return (type(value), tuple(_structure(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return ('set', frozenset(_structure(v) for v in value))
+    if isinstance(value, dict):
+        return ('dict', frozenset((_structure(k), _structure(v)) for k, v in value.items()))
+    if isinstance(value, type):
+        return ('class', value)
+    return ('object', id(value))
+
+
+def _term_structure(term):
+    return (type(term), frozenset((name, _structure(value)) for name, value in vars(term).items()))
+
+
+def _fuse(outputs, is_static, compact):
+    """
+    `outputs` with each tree of Elementwise terms that can be evaluated in
+    one pass replaced by a FusedExpression, and the number of terms fused
+    """
+    graph = TermGraph(outputs)
+    results = set(outputs.values())
+    static = static_terms(graph.ordering, is_static) if is_static is not None else set()
+
+    def inlined(child, parent):
+        return (isinstance(child, ElementwiseMixin) and child not in results
+                and graph.consumers[child] == 1 and child.mask is parent.mask
+                and (child in static) == (parent in static))
+
+    inner = set()
+    for term in graph.ordering:
+        if isinstance(term, ElementwiseMixin):
+            inner.update(o for o in term.operands if isinstance(o, Term) and inlined(o, term))
+
+    replaced = {}
+    fused = 0
+    for term in graph.ordering:
+        if term in inner:
+            continue
+        if isinstance(term, ElementwiseMixin) and any(o in inner for o in term.operands):
+            new, count = _fused_expression(term, inner, replaced, compact)
+            fused += count
+        else:
+            new = _with_inputs(term, replaced)
+        replaced[term] = new
+    return {name: replaced[term] for name, term in outputs.items()}, fused
+
+
+def _fused_expression(root, inner, replaced, compact):
+    """
+    A FusedExpression for `root` and the terms of `inner` below it, and how
+    many terms it stands for
+    """
+    inputs, index, steps, done = [], {}, [], {}
+
+    def operand(value):
+        if not isinstance(value, Term):
+            return ('const', value)
+        if value in inner:
+            return ('step', step(value))
+        value = replaced.get(value, value)
+        if value not in index:
+            index[value] = len(inputs)
+            inputs.append(value)
+        return ('input', index[value])
+
+    def step(node):
+        if node not in done:
+            operands = tuple(operand(o) for o in node.operands)
+            dtype = compact_dtype(node.dtype) if compact and node is not root else node.dtype
+            steps.append((node.op, dtype, operands))
+            done[node] = len(steps) - 1
+        return done[node]
+
+    step(root)
+    fused = FusedExpression(inputs, steps, repr(root), mask=replaced.get(root.mask, root.mask),
+                            dtype=root.dtype, missing_value=root.missing_value)
+    return fused, len(done)
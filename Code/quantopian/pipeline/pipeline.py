@@ -0,0 +1,45 @@
+"""
+The Pipeline object: named output columns plus an optional screen
+"""
+from quantopian.errors import UnsupportedPipelineOutput
+from quantopian.pipeline.filters.filter import Filter
+from quantopian.pipeline.term import ComputableTerm, Term
+
+
+class Pipeline(object):
+
+    def __init__(self, columns=None, screen=None):
+        self._columns = {}
+        self._screen = None
+        for name, term in (columns or {}).items():
+            self.add(term, name)
+        if screen is not None:
+            self.set_screen(screen)
+
+    @property
+    def columns(self):
+        return dict(self._columns)
+
+    @property
+    def screen(self):
+        return self._screen
+
+    def add(self, term, name, overwrite=False):
+        if not isinstance(term, Term):
+            raise TypeError('%r is not a pipeline term' % (term,))
+        if not isinstance(term, ComputableTerm):
+            raise UnsupportedPipelineOutput(
+                '%r cannot be a pipeline column; did you mean %r.latest?' % (term, term))
+        if name in self._columns and not overwrite:
+            raise KeyError('column %r already exists' % (name,))
+        self._columns[name] = term
+
+    def remove(self, name):
+        return self._columns.pop(name)
+
+    def set_screen(self, screen, overwrite=False):
+        if not isinstance(screen, Filter):
+            raise UnsupportedPipelineOutput('screen must be a Filter, got %r' % (screen,))
+        if self._screen is not None and not overwrite:
+            raise ValueError('pipeline already has a screen; pass overwrite=True to replace it')
+        self._screen = screen
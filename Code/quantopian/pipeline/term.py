@@ -0,0 +1,187 @@
+"""
+Base classes for the nodes of a pipeline term graph
+
+Every term evaluates to a 2-D array laid out dates x assets. Terms with a
+window_length > 0 receive their inputs with window_length - 1 extra leading
+rows, so one call can produce the output for a whole range of dates.
+"""
+import numpy as np
+
+
+class _NotSpecified(object):
+    """
+    Sentinel for arguments that fall back to the class-level default
+    """
+    def __repr__(self):
+        return 'NotSpecified'
+
+
+NotSpecified = _NotSpecified()
+
+
+def default_missing_value(dtype):
+    """
+    The value used for "no data" in arrays of the given dtype
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind == 'b':
+        return False
+    if dtype.kind == 'i':
+        return -1
+    if dtype.kind == 'u':
+        return 0
+    if dtype.kind == 'M':
+        return np.datetime64('NaT', 'ns')
+    if dtype.kind in 'US':
+        return ''
+    return None
+
+
+def needs_cast(have, want):
+    """
+    Whether an array of dtype `have` must be converted to `want`.
+    String widths are left alone: the store decides how wide labels are.
+    """
+    if have.kind in 'US' and want.kind in 'US':
+        return False
+    return have != want
+
+
+class Term(object):
+    """
+    A node in the pipeline graph producing a dates x assets array.
+
+    `cellwise` terms compute each cell of their output from the same cell
+    of their inputs and mask alone.
+    """
+    dtype = np.dtype(np.float64)
+    missing_value = NotSpecified
+    window_length = 0
+    window_safe = False
+    cellwise = False
+    inputs = ()
+    mask = None
+    # Attributes caching terms derived from this one, which do not describe it.
+    derived_attributes = ()
+
+    @property
+    def windowed(self):
+        return self.window_length > 0
+
+    @property
+    def dependencies(self):
+        """
+        Map of each input term to the extra rows this term needs from it
+        """
+        extra = self.window_length - 1 if self.windowed else 0
+        deps = {}
+        for term in self.inputs:
+            deps[term] = max(deps.get(term, 0), extra)
+        if self.mask is not None:
+            deps.setdefault(self.mask, 0)
+        return deps
+
+    def _validate_missing(self):
+        if self.missing_value is NotSpecified:
+            self.missing_value = default_missing_value(self.dtype)
+
+    def __repr__(self):
+        return type(self).__name__ + '()'
+
+
+class LoadableTerm(Term):
+    """
+    A term whose values are read from the data store rather than computed
+    """
+    window_safe = True
+
+
+class AssetExists(Term):
+    """
+    True wherever an asset is alive on a date. The default mask of every term.
+    """
+    dtype = np.dtype(bool)
+    missing_value = False
+    window_safe = True
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AssetExists, cls).__new__(cls)
+        return cls._instance
+
+
+class ComputableTerm(Term):
+    """
+    A term computed from the arrays of its inputs.
+
+    Class-level `inputs`, `window_length`, `mask` and `dtype` act as defaults
+    that keyword arguments to the constructor override.
+    """
+    def __init__(self, inputs=NotSpecified, window_length=NotSpecified,
+                 mask=NotSpecified, dtype=NotSpecified,
+                 missing_value=NotSpecified, window_safe=NotSpecified):
+        if inputs is not NotSpecified:
+            self.inputs = tuple(inputs)
+        else:
+            self.inputs = tuple(type(self).inputs)
+        if window_length is not NotSpecified:
+            self.window_length = window_length
+        if dtype is not NotSpecified:
+            self.dtype = np.dtype(dtype)
+        else:
+            self.dtype = np.dtype(self.dtype)
+        if missing_value is not NotSpecified:
+            self.missing_value = missing_value
+        if window_safe is not NotSpecified:
+            self.window_safe = window_safe
+        if mask is NotSpecified or mask is None:
+            mask = AssetExists()
+        self.mask = mask
+        self._validate_missing()
+        self._validate()
+
+    def _validate(self):
+        for term in self.inputs:
+            if not isinstance(term, Term):
+                raise TypeError('%s got a non-term input: %r' % (type(self).__name__, term))
+        if not isinstance(self.window_length, int) or self.window_length < 0:
+            raise ValueError('window_length must be a non-negative int, got %r' % (self.window_length,))
+
+    def _compute(self, inputs, dates, assets, mask):
+        """
+        Produce the output rows for `dates`.
+
+        `inputs` holds one array per entry of self.inputs, each with
+        len(dates) + window_length - 1 rows for windowed terms and len(dates)
+        rows otherwise. `mask` is a boolean len(dates) x len(assets) array.
+        """
+        raise NotImplementedError('_compute')
+
+    def _where_mask(self, result, mask):
+        """
+        Replace values outside `mask` with this term's missing value
+        """
+        if mask.all():
+            return result
+        return np.where(mask, result, np.asarray(self.missing_value, dtype=result.dtype))
+
+
+class LatestMixin(object):
+    """
+    The most recent value of a single loadable input
+    """
+    window_length = 0
+    cellwise = True
+
+    def _compute(self, inputs, dates, assets, mask):
+        data = inputs[0]
+        if needs_cast(data.dtype, self.dtype):
+            data = data.astype(self.dtype)
+        return self._where_mask(np.array(data), mask)
+
+    def __repr__(self):
+        return '%r.latest' % (self.inputs[0],)
@@ -0,0 +1,197 @@
+"""
+Columnar storage for the values an algorithm passes to record()
+
+A Recorder preallocates one array per recorded name over the sessions of a
+run and writes each value at its session's row, so nothing is built per
+session. As with Quantopian's record(), a value is carried forward until
+it is recorded again. Besides scalars, record() takes per-asset values (a
+Series indexed by asset, or a dict) such as the scores of the names held;
+these are kept as flat (row, asset, value) arrays.
+
+Recorded data can be saved to Parquet (when pyarrow is installed) or to a
+NumPy .npz archive, at the end of a run or at checkpoints along the way.
+"""
+import numbers
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+_DTYPES = {'b': np.bool_, 'i': np.int64, 'f': np.float64, 'O': object}
+
+
+def _kind(value):
+    if isinstance(value, (bool, np.bool_)):
+        return 'b'
+    if isinstance(value, numbers.Integral):
+        return 'i'
+    if isinstance(value, numbers.Real):
+        return 'f'
+    return 'O'
+
+
+def _promote(a, b):
+    if a == b:
+        return a
+    if {a, b} == {'i', 'f'}:
+        return 'f'
+    return 'O'
+
+
+class Recorder(object):
+    """
+    Recorded values for the sessions in `index`; `assets` is the store's
+    asset array and `column_of` maps a sid to its column.
+    """
+
+    def __init__(self, index, assets, column_of):
+        self.index = index
+        self.assets = assets
+        self._column_of = column_of
+        self._sids = np.array([int(a) for a in assets], dtype=np.int64)
+        self._kinds = {}
+        self._values = {}
+        self._written = {}
+        self._asset_rows = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def names(self):
+        return list(self._values)
+
+    @property
+    def asset_names(self):
+        return list(self._asset_rows)
+
+    def declare(self, name, kind='f'):
+        """
+        Allocate column `name` ahead of its first value, fixing its position
+        in the output
+        """
+        if name not in self._values:
+            self._kinds[name] = kind
+            self._values[name] = np.zeros(len(self.index), dtype=_DTYPES[kind])
+            self._written[name] = np.zeros(len(self.index), dtype=bool)
+
+    def write(self, row, name, value):
+        """
+        Record `value` under `name` for session `row`
+        """
+        if isinstance(value, (pd.Series, dict)):
+            self._write_assets(row, name, value)
+            return
+        kind = _kind(value)
+        if name not in self._values:
+            self.declare(name, kind)
+        elif _promote(self._kinds[name], kind) != self._kinds[name]:
+            self._kinds[name] = _promote(self._kinds[name], kind)
+            self._values[name] = self._values[name].astype(_DTYPES[self._kinds[name]])
+        self._values[name][row] = value
+        self._written[name][row] = True
+
+    def _write_assets(self, row, name, values):
+        if isinstance(values, dict):
+            values = pd.Series(values, dtype=np.float64)
+        cols = np.fromiter((self._column_of[int(a)] for a in values.index), dtype=np.int64, count=len(values))
+        chunks = self._asset_rows.setdefault(name, [])
+        if chunks and chunks[-1][0] == row:
+            # Recording the same name again in one session replaces the values.
+            chunks.pop()
+        chunks.append((row, cols, np.asarray(values.values, dtype=np.float64)))
+
+    def column(self, name, stop=None):
+        """
+        Values of `name` for rows [0, stop), carried forward between writes
+        and missing before the first one
+        """
+        stop = len(self.index) if stop is None else stop
+        written = self._written[name][:stop]
+        last = np.maximum.accumulate(np.where(written, np.arange(stop), -1))
+        values = self._values[name][np.maximum(last, 0)]
+        missing = last < 0
+        if missing.any():
+            values = values.astype(np.float64 if self._kinds[name] in 'if' else object)
+            values[missing] = np.nan
+        return values
+
+    def frame(self, stop=None):
+        """
+        The recorded scalars as a DataFrame over sessions [0, stop)
+        """
+        stop = len(self.index) if stop is None else stop
+        return pd.DataFrame({name: self.column(name, stop) for name in self._values},
+                            index=self.index[:stop], columns=self.names)
+
+    def asset_arrays(self, name, stop=None):
+        """
+        The per-asset values recorded under `name` as (rows, columns, values)
+        arrays, one entry per asset and session
+        """
+        stop = len(self.index) if stop is None else stop
+        chunks = [chunk for chunk in self._asset_rows.get(name, ()) if chunk[0] < stop]
+        if not chunks:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float64)
+        rows = np.concatenate([np.full(len(cols), row, dtype=np.int64) for row, cols, _ in chunks])
+        cols = np.concatenate([cols for _, cols, _ in chunks])
+        values = np.concatenate([values for _, _, values in chunks])
+        return rows, cols, values
+
+    def asset_frame(self, name, stop=None):
+        """
+        The per-asset values recorded under `name` as a sessions x assets
+        DataFrame over the assets that ever had one
+        """
+        stop = len(self.index) if stop is None else stop
+        rows, cols, values = self.asset_arrays(name, stop)
+        used, position = np.unique(cols, return_inverse=True)
+        table = np.full((stop, len(used)), np.nan)
+        table[rows, position] = values
+        return pd.DataFrame(table, index=self.index[:stop], columns=pd.Index(self.assets[used], name='asset'))
+
+    def save(self, path, stop=None):
+        """
+        Write the sessions recorded so far to `path`, replacing it.
+
+        A .npz archive holds `session`, one array per scalar name and, for
+        each per-asset name, `<name>.session`, `<name>.sid` and
+        `<name>.value`. With .parquet the scalars go to `path` and each
+        per-asset name to `<path stem>.<name>.parquet` in long format.
+        """
+        stop = len(self.index) if stop is None else stop
+        root, ext = os.path.splitext(path)
+        if ext == '.npz':
+            arrays = {'session': self.index[:stop].values}
+            arrays.update((name, self.column(name, stop)) for name in self._values)
+            for name in self._asset_rows:
+                rows, cols, values = self.asset_arrays(name, stop)
+                arrays.update({name + '.session': self.index.values[rows],
+                               name + '.sid': self._sids[cols], name + '.value': values})
+            _replace(path, lambda f: np.savez(f, **arrays))
+        elif ext == '.parquet':
+            if pyarrow is None:
+                raise ImportError('saving to Parquet requires pyarrow')
+            table = pyarrow.Table.from_pandas(self.frame(stop))
+            _replace(path, lambda f: pyarrow.parquet.write_table(table, f))
+            for name in self._asset_rows:
+                rows, cols, values = self.asset_arrays(name, stop)
+                table = pyarrow.table({'session': self.index.values[rows], 'sid': self._sids[cols],
+                                       'value': values})
+                _replace('%s.%s.parquet' % (root, name), lambda f: pyarrow.parquet.write_table(table, f))
+        else:
+            raise ValueError('cannot save recorded values to %r: use .parquet or .npz' % (path,))
+
+
+def _replace(path, write):
+    # Write next to the target and rename, so a checkpoint is never half-written.
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
@@ -0,0 +1,363 @@
+"""
+Parameter sweeps of one strategy script over a process pool
+
+The script defines `base_terms()`, returning the factors and filters its
+pipeline is built from, and keeps its tunable values as module-level names.
+A sweep computes the base terms once over the whole period and writes them
+as .npy files; every worker memory-maps them, so all processes share one
+copy through the page cache. Each parameter set then runs the script
+unchanged except for its parameters, with `base_terms()` answering from the
+precomputed arrays, so only the ranking and the simulation are repeated:
+
+    from quantopian.sweep import parameter_grid, run_sweep
+
+    grid = parameter_grid(UNIVERSE_SIZE=[1000, 2000], VOLATILITY_CUTOFF=[300, 600])
+    summary = run_sweep('My_Value_Long_only_Algo.py', './store', '2003-01-01', '2019-04-01', grid)
+
+Strategies that fix their rebalance month on the first session, or trade
+on a yearly cycle, also depend on when they start. run_start_variants
+computes the script's pipelines once over the union of the variants'
+periods, shares the outputs the same way, and re-simulates only the
+portfolio from each start date:
+
+    variants = start_variants('2003-01-01', '2019-04-01', count=12)
+    summary, values = run_start_variants('Developed on Black_Cat_Acquirer_Multiple.py', './store', variants)
+
+or from the command line:
+
+    python -m quantopian.sweep "Developed on Black_Cat_Acquirer_Multiple.py" --store ./store \
+        --start 2003-01-01 --end 2019-04-01 --count 12
+"""
+import argparse
+import concurrent.futures
+import io
+import itertools
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from quantopian.algorithm import TradingAlgorithm, api_namespace
+from quantopian.data import ColumnarStore
+from quantopian.pipeline import Pipeline, SimplePipelineEngine
+from quantopian.pipeline.engine import PipelineResult
+from quantopian.pipeline.graph import SCREEN_NAME, pipeline_graph
+from quantopian.pipeline.data.dataset import Column, DataSet, DataSetMeta
+from quantopian.pipeline.loaders import PanelLoader, StoreLoader
+
+SESSIONS_PER_YEAR = 252
+
+
+def parameter_grid(**axes):
+    """
+    Every combination of the given values, as a list of parameter dicts
+    """
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+
+def summarize(perf, capital_base):
+    """
+    Headline statistics of one run's daily performance frame
+    """
+    value = perf['portfolio_value'].values
+    returns = np.diff(np.concatenate([[capital_base], value])) / np.concatenate([[capital_base], value[:-1]])
+    total = value[-1] / capital_base - 1.0
+    volatility = returns.std() * np.sqrt(SESSIONS_PER_YEAR)
+    return {
+        'final_value': value[-1],
+        'total_return': total,
+        'annual_return': (1.0 + total) ** (float(SESSIONS_PER_YEAR) / len(value)) - 1.0,
+        'annual_volatility': volatility,
+        'sharpe': returns.mean() * SESSIONS_PER_YEAR / volatility if volatility > 0 else np.nan,
+        'max_drawdown': (value / np.maximum.accumulate(value) - 1.0).min(),
+    }
+
+
+def _read(path):
+    with io.open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def compute_panels(script, filename, store, start, stop, directory, chunk=252):
+    """
+    Evaluate the script's base_terms() for sessions [start, stop) and write
+    each as <directory>/<name>.npy. Returns {name: (dtype, missing_value)}.
+    """
+    namespace = api_namespace()
+    exec(compile(script, filename, 'exec'), namespace)
+    if 'base_terms' not in namespace:
+        raise ValueError('%s does not define base_terms()' % filename)
+    terms = namespace['base_terms']()
+    engine = SimplePipelineEngine(store)
+    pipeline = Pipeline(terms)
+    shape = (stop - start, len(store.sids))
+    panels = {name: np.lib.format.open_memmap(os.path.join(directory, name + '.npy'), mode='w+',
+                                              dtype=term.dtype, shape=shape)
+              for name, term in terms.items()}
+    for lo in range(start, stop, chunk):
+        hi = min(lo + chunk, stop)
+        result = engine.run_chunk(pipeline, lo, hi)
+        for name, panel in panels.items():
+            panel[lo - start:hi - start] = result.columns[name]
+    for panel in panels.values():
+        panel.flush()
+    return {name: (term.dtype, term.missing_value) for name, term in terms.items()}
+
+
+def panel_dataset(spec):
+    """
+    A DataSet with one column per precomputed panel
+    """
+    columns = {name: Column(dtype, missing_value=missing) for name, (dtype, missing) in spec.items()}
+    return DataSetMeta('SweepPanels', (DataSet,), columns)
+
+
+# Per-process state set up once by _init_worker.
+_worker = {}
+
+
+def _init_worker(script, filename, store_root, directory, spec, start, capital_base):
+    store = ColumnarStore(store_root)
+    dataset = panel_dataset(spec)
+    panels = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in spec}
+    _worker.update(
+        script=script, filename=filename, store=store, dataset=dataset, panels=panels,
+        start=start, capital_base=capital_base,
+    )
+
+
+def _run_one(args):
+    parameters, start_date, end_date = args
+    w = _worker
+    dataset = w['dataset']
+    base = {name: getattr(dataset, name).latest for name in w['panels']}
+    loader = PanelLoader(dataset, w['panels'], w['start'], StoreLoader(w['store']))
+    algorithm = TradingAlgorithm(
+        w['store'], script=w['script'], filename=w['filename'], capital_base=w['capital_base'],
+        parameters=dict(parameters, base_terms=lambda: dict(base)), loader=loader,
+    )
+    perf = algorithm.run(start_date, end_date)
+    return summarize(perf, w['capital_base'])
+
+
+def run_sweep(path, store_root, start_date, end_date, grid, processes=None,
+              capital_base=100000.0, scratch=None):
+    """
+    Run the strategy at `path` once per parameter dict in `grid` and return
+    one row per run: the parameters followed by summarize()'s statistics.
+
+    `processes` defaults to the number of CPUs; 1 runs everything in this
+    process. The precomputed panels go to a temporary directory under
+    `scratch` that is removed afterwards.
+    """
+    script = _read(path)
+    store = ColumnarStore(store_root)
+    start, stop = store.sessions_in_range(start_date, end_date)
+    if start >= stop:
+        raise ValueError('no sessions between %s and %s' % (start_date, end_date))
+
+    directory = tempfile.mkdtemp(prefix='sweep-', dir=scratch)
+    try:
+        spec = compute_panels(script, path, store, start, stop, directory)
+        initargs = (script, path, store_root, directory, spec, start, capital_base)
+        tasks = [(parameters, start_date, end_date) for parameters in grid]
+        if processes == 1:
+            _init_worker(*initargs)
+            rows = [_run_one(task) for task in tasks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes, initializer=_init_worker, initargs=initargs) as pool:
+                rows = list(pool.map(_run_one, tasks))
+    finally:
+        _worker.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    params = pd.DataFrame([dict(p) for p in grid], index=range(len(grid)))
+    return pd.concat([params, pd.DataFrame(rows, index=params.index)], axis=1)
+
+
+def start_variants(start_date, end_date, count=12, step=1, length=None):
+    """
+    (start, end) dates of `count` runs starting on the first day of months
+    `step` months apart, from start_date's month on. Each runs to end_date,
+    or for `length` months when given; runs starting after end_date are
+    left out.
+    """
+    first = pd.Timestamp(start_date).normalize().replace(day=1)
+    end_date = pd.Timestamp(end_date).normalize()
+    variants = []
+    for k in range(count):
+        start = first + pd.DateOffset(months=k * step)
+        if start > end_date:
+            break
+        end = end_date
+        if length is not None:
+            end = min(end, start + pd.DateOffset(months=length) - pd.Timedelta(days=1))
+        variants.append((start, end))
+    return variants
+
+
+def compute_outputs(pipelines, store, start, stop, directory, chunk=126, compact=False):
+    """
+    Evaluate each of `pipelines` ({name: Pipeline}) for sessions [start,
+    stop) and write its columns and screen as .npy files in `directory`.
+    Returns {name: {column: file name}}, the screen under SCREEN_NAME.
+    """
+    engine = SimplePipelineEngine(store, compact=compact)
+    shape = (stop - start, len(store.sids))
+    spec = {}
+    for k, (name, pipeline) in enumerate(sorted(pipelines.items())):
+        graph = pipeline_graph(pipeline)
+        files = spec[name] = {}
+        panels = {}
+        for lo in range(start, stop, chunk):
+            hi = min(lo + chunk, stop)
+            result = engine.run_chunk(pipeline, lo, hi, graph)
+            arrays = dict(result.columns, **{SCREEN_NAME: result.screen})
+            for column, values in arrays.items():
+                values = np.asarray(values)
+                if column not in panels:
+                    if values.dtype.hasobject:
+                        raise ValueError('column %r of pipeline %r holds Python objects and cannot be '
+                                         'shared between processes' % (column, name))
+                    files[column] = '%d_%d.npy' % (k, len(files))
+                    panels[column] = np.lib.format.open_memmap(
+                        os.path.join(directory, files[column]), mode='w+', dtype=values.dtype, shape=shape)
+                panels[column][lo - start:hi - start] = values
+        for panel in panels.values():
+            panel.flush()
+    return spec
+
+
+class PrecomputedPipelines(object):
+    """
+    Pipeline outputs read from the files of compute_outputs, for sessions
+    from `start` on. Handed to a TradingAlgorithm as its shared_pipelines,
+    it answers pipeline_output without computing anything.
+    """
+
+    def __init__(self, store, directory, spec, start):
+        self.start = start
+        self._calendar = store.calendar
+        self._results = {}
+        for name, files in spec.items():
+            arrays = {column: np.load(os.path.join(directory, f), mmap_mode='r')
+                      for column, f in files.items()}
+            screen = arrays.pop(SCREEN_NAME)
+            dates = store.calendar[start:start + len(screen)]
+            self._results[name] = PipelineResult(dates, store.assets, arrays, screen)
+
+    def attach(self, algorithm, name, pipeline):
+        if name not in self._results:
+            raise ValueError('no precomputed output for pipeline %r' % (name,))
+        if set(pipeline.columns) != set(self._results[name].columns):
+            raise ValueError('pipeline %r has columns %s, the precomputed output %s' % (
+                name, sorted(pipeline.columns), sorted(self._results[name].columns)))
+
+    def output(self, algorithm, name, i, stop):
+        result = self._results[name]
+        if not self.start <= i < self.start + len(result):
+            raise ValueError('session %s is outside the precomputed outputs' % (self._calendar[i],))
+        return result.frame(i - self.start)
+
+
+def _init_variant_worker(script, filename, store_root, directory, spec, start, capital_base, compact):
+    store = ColumnarStore(store_root)
+    _worker.update(
+        script=script, filename=filename, store=store, capital_base=capital_base, compact=compact,
+        shared=PrecomputedPipelines(store, directory, spec, start),
+    )
+
+
+def _run_variant(args):
+    start_date, end_date = args
+    w = _worker
+    algorithm = TradingAlgorithm(
+        w['store'], script=w['script'], filename=w['filename'], capital_base=w['capital_base'],
+        shared_pipelines=w['shared'], compact=w['compact'],
+    )
+    perf = algorithm.run(start_date, end_date)
+    return summarize(perf, w['capital_base']), perf['portfolio_value']
+
+
+def run_start_variants(path, store_root, variants, processes=None, capital_base=100000.0, scratch=None,
+                       compact=False):
+    """
+    Run the strategy at `path` once per (start, end) in `variants`, such as
+    those of start_variants, and return (summary, values): one row per
+    variant of its dates and summarize()'s statistics, and the variants'
+    daily portfolio values side by side, one column per start date.
+
+    The script's eager pipelines are computed once, by this process, over
+    the sessions of all the variants, in float32 with `compact`; `processes`
+    and `scratch` are as for run_sweep.
+    """
+    script = _read(path)
+    store = ColumnarStore(store_root)
+    ranges = [store.sessions_in_range(start, end) for start, end in variants]
+    ranges = [(start, stop) for start, stop in ranges if start < stop]
+    if len(ranges) < len(variants):
+        raise ValueError('some variants have no sessions in the store')
+    first, last = min(r[0] for r in ranges), max(r[1] for r in ranges)
+    calendar = store.calendar
+
+    directory = tempfile.mkdtemp(prefix='variants-', dir=scratch)
+    try:
+        algorithm = TradingAlgorithm(store, script=script, filename=path, capital_base=capital_base)
+        pipelines = algorithm.pipelines(calendar[first], calendar[last - 1])
+        spec = compute_outputs(pipelines, store, first, last, directory, compact=compact)
+        initargs = (script, path, store_root, directory, spec, first, capital_base, compact)
+        tasks = [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in variants]
+        if processes == 1:
+            _init_variant_worker(*initargs)
+            results = [_run_variant(task) for task in tasks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes, initializer=_init_variant_worker, initargs=initargs) as pool:
+                results = list(pool.map(_run_variant, tasks))
+    finally:
+        _worker.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    index = pd.Index([start for start, _ in tasks], name='start')
+    summary = pd.DataFrame([stats for stats, _ in results], index=index)
+    summary.insert(0, 'end', [end for _, end in tasks])
+    values = pd.concat([curve.rename(start) for start, (_, curve) in zip(index, results)], axis=1)
+    return summary, values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m quantopian.sweep',
+        description='Run a strategy from several start months side by side, computing its pipelines once.')
+    parser.add_argument('script', help='path of the algorithm file')
+    parser.add_argument('--store', required=True, help='directory of the columnar store')
+    parser.add_argument('--start', required=True, help='the first variant starts on the first of this month')
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--count', type=int, default=12, help='number of variants (default 12)')
+    parser.add_argument('--step', type=int, default=1,
+                        help='months between variant starts; 12 rolls the start year (default 1)')
+    parser.add_argument('--length', type=int, metavar='MONTHS',
+                        help='run each variant for this many months instead of to --end')
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--capital-base', type=float, default=100000.0)
+    parser.add_argument('--compact', action='store_true', help='compute and share the pipelines in float32')
+    parser.add_argument('--output', help='write the daily portfolio values of every variant to this .csv')
+    args = parser.parse_args(argv)
+
+    variants = start_variants(args.start, args.end, args.count, args.step, args.length)
+    summary, values = run_start_variants(args.script, args.store, variants, processes=args.processes,
+                                         capital_base=args.capital_base, compact=args.compact)
+    if args.output:
+        values.to_csv(args.output)
+    summary.index = summary.index.strftime('%Y-%m-%d')
+    summary['end'] = pd.DatetimeIndex(summary['end']).strftime('%Y-%m-%d')
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(summary.to_string(float_format=lambda x: '%.4f' % x))
+
+
+if __name__ == '__main__':
+    main()
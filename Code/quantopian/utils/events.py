@@ -0,0 +1,199 @@
+"""
+date_rules and time_rules for schedule_function
+
+The simulator runs on daily bars, so a time rule only decides the order in
+which functions scheduled for the same session run: each is reduced to
+minutes after the 9:30 open, with the close at minute 390.
+
+Date rules are compiled once per run: `rule.sessions(calendar, start, stop)`
+evaluates a rule for a whole range of sessions with array operations.
+"""
+import numpy as np
+
+MINUTES_IN_SESSION = 390
+
+
+def session_months(dates):
+    """
+    Calendar month (1-12) of each datetime64 date
+    """
+    return dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+
+class DateRule(object):
+
+    def should_trigger(self, i, calendar):
+        """
+        Whether the rule fires on session `i` of `calendar` (datetime64 array)
+        """
+        raise NotImplementedError('should_trigger')
+
+    def sessions(self, calendar, start, stop):
+        """
+        Boolean array over sessions [start, stop) of `calendar`: where the rule fires
+        """
+        return np.array([bool(self.should_trigger(i, calendar)) for i in range(start, stop)], dtype=bool)
+
+    def in_months(self, *months):
+        """
+        This rule restricted to sessions in the given calendar months (1-12)
+        """
+        return InMonths(self, months)
+
+
+class EveryDay(DateRule):
+
+    def should_trigger(self, i, calendar):
+        return True
+
+    def sessions(self, calendar, start, stop):
+        return np.ones(stop - start, dtype=bool)
+
+    def __repr__(self):
+        return 'every_day()'
+
+
+class InMonths(DateRule):
+    """
+    A date rule that only fires in some calendar months
+    """
+
+    def __init__(self, rule, months):
+        months = tuple(sorted(set(int(m) for m in months)))
+        if not months or not all(1 <= m <= 12 for m in months):
+            raise ValueError('months must be between 1 and 12, got %r' % (months,))
+        self.rule = rule
+        self.months = months
+
+    def should_trigger(self, i, calendar):
+        return session_months(calendar[i:i + 1])[0] in self.months and self.rule.should_trigger(i, calendar)
+
+    def sessions(self, calendar, start, stop):
+        return self.rule.sessions(calendar, start, stop) & np.isin(session_months(calendar[start:stop]), self.months)
+
+    def __repr__(self):
+        return '%r.in_months(%s)' % (self.rule, ', '.join(str(m) for m in self.months))
+
+
+def period_keys(dates, unit):
+    """
+    An integer per date that is equal for dates in the same month ('M') or
+    Monday-to-Sunday week ('W')
+    """
+    if unit == 'M':
+        return dates.astype('datetime64[M]').astype(np.int64)
+    # datetime64 weeks start on Thursdays; shift so they start on Mondays.
+    return (dates.astype('datetime64[D]').astype(np.int64) + 3) // 7
+
+
+def _period_bounds(i, calendar, unit):
+    """
+    Calendar indices [first, last] of the sessions in the period holding session i
+    """
+    lo = max(i - 31, 0)
+    keys = period_keys(calendar[lo:i + 32], unit)
+    same = np.flatnonzero(keys == keys[i - lo])
+    return lo + same[0], lo + same[-1]
+
+
+class _PeriodRule(DateRule):
+    unit = None
+    from_end = False
+
+    def __init__(self, days_offset=0):
+        if days_offset < 0:
+            raise ValueError('days_offset must be non-negative, got %r' % (days_offset,))
+        self.days_offset = days_offset
+
+    def should_trigger(self, i, calendar):
+        first, last = _period_bounds(i, calendar, self.unit)
+        if self.from_end:
+            return i == last - self.days_offset
+        return i == first + self.days_offset
+
+    def sessions(self, calendar, start, stop):
+        # Periods overlapping the range can start before it or end after it.
+        lo, hi = max(start - 31, 0), min(stop + 31, len(calendar))
+        keys = period_keys(calendar[lo:hi], self.unit)
+        firsts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        lasts = np.concatenate([firsts[1:], [len(keys)]]) - 1
+        if self.from_end:
+            targets = lasts - self.days_offset
+            targets = targets[targets >= firsts]
+        else:
+            targets = firsts + self.days_offset
+            targets = targets[targets <= lasts]
+        fired = np.zeros(hi - lo, dtype=bool)
+        fired[targets] = True
+        return fired[start - lo:stop - lo]
+
+    def __repr__(self):
+        return '%s(days_offset=%d)' % (type(self).__name__, self.days_offset)
+
+
+class MonthStart(_PeriodRule):
+    unit = 'M'
+
+
+class MonthEnd(_PeriodRule):
+    unit = 'M'
+    from_end = True
+
+
+class WeekStart(_PeriodRule):
+    unit = 'W'
+
+
+class WeekEnd(_PeriodRule):
+    unit = 'W'
+    from_end = True
+
+
+class date_rules(object):
+    every_day = EveryDay
+
+    @staticmethod
+    def month_start(days_offset=0):
+        return MonthStart(days_offset)
+
+    @staticmethod
+    def month_end(days_offset=0):
+        return MonthEnd(days_offset)
+
+    @staticmethod
+    def week_start(days_offset=0):
+        return WeekStart(days_offset)
+
+    @staticmethod
+    def week_end(days_offset=0):
+        return WeekEnd(days_offset)
+
+
+class TimeRule(object):
+
+    def __init__(self, minute):
+        self.minute = minute
+
+    def __repr__(self):
+        return 'TimeRule(minute=%d)' % self.minute
+
+
+def _offset(hours, minutes):
+    if hours is None and minutes is None:
+        return 1
+    return (hours or 0) * 60 + (minutes or 0)
+
+
+class time_rules(object):
+
+    @staticmethod
+    def market_open(offset=None, hours=None, minutes=None):
+        return TimeRule(_offset(hours, minutes))
+
+    @staticmethod
+    def market_close(offset=None, hours=None, minutes=None):
+        return TimeRule(MINUTES_IN_SESSION - _offset(hours, minutes))
+
+    @staticmethod
+    def every_minute():
+        return TimeRule(0)
@@ -0,0 +1,71 @@
+"""
+Process memory measurements and byte-size parsing for memory budgets
+
+Resident set sizes come from /proc or the resource module where they
+exist, and from psutil when it is installed; functions return None when
+no source is available.
+"""
+import os
+import re
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(text):
+    """
+    Bytes in a size such as 1500000, '512M' or '2.5G' (binary units)
+    """
+    if isinstance(text, (int, float)):
+        return int(text)
+    match = re.match(r'^\s*([0-9.]+)\s*([KMGT]?)i?B?\s*$', str(text), re.IGNORECASE)
+    if match is None:
+        raise ValueError('cannot parse memory size %r' % (text,))
+    return int(float(match.group(1)) * _UNITS[match.group(2).upper()])
+
+
+def current_rss():
+    """
+    Resident memory of this process in bytes
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+
+def peak_rss():
+    """
+    Highest resident memory of this process so far, in bytes
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    return None
+
+
+def format_size(n):
+    if n is None:
+        return 'unknown'
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if n < 1024 or unit == 'GiB':
+            return '%.1f %s' % (n, unit) if unit != 'B' else '%d B' % n
+        n /= 1024.0
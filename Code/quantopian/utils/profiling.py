@@ -0,0 +1,199 @@
+"""
+Wall time, work and memory of the parts of a run
+
+A Profiler is handed to a TradingAlgorithm (or run_algorithms) and to its
+pipeline engine, which then time every pipeline term and data load, the
+user's initialize, before_trading_start, handle_data and scheduled
+functions, and the order calls they make. Each is a frame on a stack, so
+time spent in a pipeline is charged to the function that asked for it:
+
+    algorithm:My_Value_Long_only_Algo;function:rebalance;order:order_target_percent
+
+Per stack it accumulates the calls, the wall time (in total and excluding
+nested frames), the rows x assets of the arrays produced and the bytes
+loaded from the store. With `memory=True` it also traces the peak memory
+allocated inside each frame, which slows the run down noticeably.
+
+`summary()` is the per-run table, and `write_folded()` writes the stacks
+in the collapsed format read by flamegraph.pl and speedscope. Nothing is
+measured when no profiler is given: the instrumented code only checks for
+None.
+"""
+import functools
+import hashlib
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+SUMMARY_COLUMNS = ['calls', 'seconds', 'self_seconds', 'cells', 'bytes_loaded', 'peak_bytes']
+
+
+class _Frame(object):
+
+    __slots__ = ('path', 'started', 'children', 'base', 'peak')
+
+    def __init__(self, path, started, base):
+        self.path = path
+        self.started = started
+        self.children = 0.0
+        self.base = base
+        self.peak = base
+
+
+class Profiler(object):
+    """
+    Timings of the frames of a run, accumulated by stack
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self._stack = []
+        self._stats = {}    # path -> [calls, seconds, self seconds, cells, bytes loaded, peak bytes]
+        self._tracing = False
+
+    def __repr__(self):
+        return 'Profiler(memory=%r)' % (self.memory,)
+
+    def start(self, kind, name):
+        """
+        Open a frame for `name` (a term, function, ...) inside the current one
+        """
+        label = '%s:%s' % (kind, name)
+        path = (self._stack[-1].path + (label,)) if self._stack else (label,)
+        base = 0
+        if self.memory:
+            if not self._stack and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            base, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent.peak = max(parent.peak, peak)
+            tracemalloc.reset_peak()
+        frame = _Frame(path, time.perf_counter(), base)
+        self._stack.append(frame)
+        return frame
+
+    def stop(self, frame, result=None, loaded=False):
+        """
+        Close `frame`, counting the cells of `result`, and its bytes as
+        loaded if `loaded`
+        """
+        elapsed = time.perf_counter() - frame.started
+        popped = self._stack.pop()
+        assert popped is frame, 'profiler frames closed out of order'
+        stats = self._stats.get(frame.path)
+        if stats is None:
+            stats = self._stats[frame.path] = [0, 0.0, 0.0, 0, 0, 0]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - frame.children
+        if isinstance(result, np.ndarray):
+            stats[3] += result.size
+            if loaded:
+                stats[4] += result.nbytes
+        if self.memory:
+            frame.peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+            stats[5] = max(stats[5], frame.peak - frame.base)
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += elapsed
+            parent.peak = max(parent.peak, frame.peak)
+        elif self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def call(self, kind, name, func, *args, **kwargs):
+        """
+        func(*args, **kwargs) in a frame of its own
+        """
+        frame = self.start(kind, name)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            self.stop(frame)
+        return result
+
+    def wrap(self, kind, func, name=None):
+        """
+        `func` calling itself in a frame named after it
+        """
+        if getattr(func, '_profiler', None) is self:
+            return func
+        name = name or getattr(func, '__name__', repr(func))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(kind, name, func, *args, **kwargs)
+        wrapper._profiler = self
+        return wrapper
+
+    def stacks(self):
+        """
+        {stack of frame labels: [calls, seconds, self seconds, cells,
+        bytes loaded, peak bytes]}
+        """
+        return {path: list(stats) for path, stats in self._stats.items()}
+
+    def summary(self):
+        """
+        One row per (kind, name) over every stack it appeared in, by
+        descending self time. Peak bytes is the largest of any single call.
+        """
+        rows = {}
+        for path, stats in self._stats.items():
+            kind, name = path[-1].split(':', 1)
+            row = rows.setdefault((kind, name), [0, 0.0, 0.0, 0, 0, 0])
+            for k in range(5):
+                # A frame nested in one of the same name is already in its total.
+                if k == 1 and path[-1] in path[:-1]:
+                    continue
+                row[k] += stats[k]
+            row[5] = max(row[5], stats[5])
+        index = pd.MultiIndex.from_tuples(list(rows), names=['kind', 'name'])
+        frame = pd.DataFrame(list(rows.values()), index=index, columns=SUMMARY_COLUMNS)
+        return frame.sort_values('self_seconds', ascending=False)
+
+    def format_summary(self, limit=25):
+        """
+        The summary as text, its first `limit` rows
+        """
+        frame = self.summary()
+        if not len(frame):
+            return 'nothing profiled'
+        total = sum(stats[2] for stats in self._stats.values())
+        shown = frame.head(limit).copy()
+        shown.insert(3, 'self_%', 100.0 * shown['self_seconds'] / total if total else 0.0)
+        text = shown.to_string(float_format=lambda x: '%.3f' % x)
+        if len(frame) > limit:
+            text += '\n... %d more' % (len(frame) - limit)
+        return text
+
+    def write_folded(self, path, metric='self_seconds'):
+        """
+        Write one 'frame;frame;frame value' line per stack: self time in
+        microseconds, or with metric='cells' or 'bytes_loaded' that count
+        """
+        column = SUMMARY_COLUMNS.index(metric)
+        with open(path, 'w') as f:
+            for stack, stats in sorted(self._stats.items()):
+                value = stats[column] * 1e6 if metric == 'self_seconds' else stats[column]
+                if int(round(value)) > 0:
+                    f.write('%s %d\n' % (';'.join(_clean(label) for label in stack), round(value)))
+
+
+def short_label(text, width=100):
+    """
+    `text` cut to about `width` characters, with a hash of the whole so
+    that different long names stay different
+    """
+    if len(text) <= width:
+        return text
+    return '%s... #%s' % (text[:width - 12], hashlib.sha1(text.encode('utf-8')).hexdigest()[:6])
+
+
+def _clean(label):
+    # ';' separates frames and the last space the value.
+    return label.replace(';', ',').replace('\n', ' ')
@@ -0,0 +1,97 @@
+"""
+Row-wise rank and top-k kernels shared by Rank, StackedRank and TopK
+
+Every kernel ranks along the last axis over the entries where `mask` is
+True. Missing values inside the mask rank after every real value, and the
+ordinal method breaks ties by column, so the kernels agree exactly.
+"""
+import numpy as np
+
+RANK_METHODS = ('ordinal', 'average', 'min', 'max', 'dense')
+
+
+def _masked_order(values, mask):
+    """
+    Per-row argsort of `values` with the cells inside `mask` first: real
+    values ascending, then missing ones, then everything outside the mask,
+    each group keeping column order among equal values.
+    """
+    order = np.argsort(values, axis=-1, kind='stable')
+    outside = np.take_along_axis(~np.broadcast_to(mask, values.shape), order, axis=-1)
+    # A stable sort of booleans is a linear-time radix pass.
+    return np.take_along_axis(order, np.argsort(outside, axis=-1, kind='stable'), axis=-1)
+
+
+def _float_dtype(data):
+    # float32 data is ranked as float32; anything else as float64.
+    return np.dtype(np.float32 if data.dtype == np.float32 else np.float64)
+
+
+def rankdata_stack(stack, mask, method, ascending):
+    """
+    Rank each row of every layer of a factors x dates x assets `stack`.
+
+    `mask` is shared by all layers; `ascending` holds one flag per layer.
+    The cells inside the mask get ranks 1..n with missing values last and
+    tied with each other; cells outside it get NaN. Ranks are float32 for a
+    float32 stack and float64 otherwise.
+    """
+    dtype = _float_dtype(stack)
+    signs = np.where(np.asarray(ascending, dtype=bool), 1.0, -1.0).astype(dtype)
+    values = np.where(mask, stack, np.nan) * signs.reshape((-1,) + (1,) * (stack.ndim - 1))
+    order = _masked_order(values, mask)
+    n = values.shape[-1]
+    positions = np.broadcast_to(np.arange(1, n + 1, dtype=dtype), values.shape)
+    if method == 'ordinal':
+        sorted_ranks = positions
+    else:
+        ordered = np.take_along_axis(values, order, axis=-1)
+        inside = np.take_along_axis(np.broadcast_to(mask, values.shape), order, axis=-1)
+        missing = np.isnan(ordered)
+        starts = np.ones(values.shape, dtype=bool)
+        starts[..., 1:] = (((ordered[..., 1:] != ordered[..., :-1]) & ~(missing[..., 1:] & missing[..., :-1]))
+                           | (inside[..., 1:] != inside[..., :-1]))
+        if method == 'dense':
+            sorted_ranks = np.cumsum(starts, axis=-1, dtype=dtype)
+        else:
+            lowest = np.maximum.accumulate(np.where(starts, positions, 0.0), axis=-1)
+            ends = np.ones(values.shape, dtype=bool)
+            ends[..., :-1] = starts[..., 1:]
+            highest = np.minimum.accumulate(np.where(ends, positions, n + 1.0)[..., ::-1], axis=-1)[..., ::-1]
+            sorted_ranks = {'min': lowest, 'max': highest}.get(method, (lowest + highest) / 2.0)
+    ranks = np.empty(values.shape, dtype=dtype)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=-1)
+    ranks[..., ~mask] = np.nan
+    return ranks
+
+
+def rankdata_2d(data, mask, method, ascending):
+    """
+    Rank each row of `data` over the columns where `mask` is True
+    """
+    return rankdata_stack(data[np.newaxis], mask, method, [ascending])[0]
+
+
+def top_k_mask(data, mask, k, largest=True):
+    """
+    Per row, the k columns passing `mask` with the largest (or smallest)
+    values: the same cells as `rankdata_2d(..., 'ordinal', not largest) <= k`,
+    found with a partition instead of a full sort of each row.
+    """
+    n_cols = data.shape[-1]
+    if k <= 0:
+        return np.zeros(data.shape, dtype=bool)
+    if k >= n_cols:
+        return np.array(mask, dtype=bool)
+    key = np.where(mask, data, np.nan).astype(_float_dtype(data))
+    if largest:
+        key = -key
+    kth = np.partition(key, k - 1, axis=-1)[..., k - 1:k]
+    missing = np.isnan(key)
+    with np.errstate(invalid='ignore'):
+        # When the k-th key is missing, every real value is in and the
+        # remaining places go to missing values inside the mask.
+        better = np.where(np.isnan(kth), ~missing, key < kth)
+        tied = np.where(np.isnan(kth), mask & missing, key == kth)
+    need = k - better.sum(axis=-1, keepdims=True)
+    return (better | (tied & (np.cumsum(tied, axis=-1) <= need))) & mask
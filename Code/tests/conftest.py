@@ -0,0 +1,73 @@
+"""
+Shared fixtures: a small synthetic store written once per test session
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from quantopian.data import ColumnarStore, convert_to_events, write_store
+
+N_SESSIONS = 300
+N_ASSETS = 40
+EVENT_COLUMNS = ('roa', 'roe', 'pb_ratio', 'pe_ratio')
+
+# (column of the asset, session index of the ex-date, ratio, kind)
+ADJUSTMENTS = [
+    (5, 200, 0.5, 'split'),
+    (9, 230, 0.25, 'split'),
+    (5, 260, 0.5, 'split'),
+    (17, 201, 0.98, 'dividend'),
+]
+
+
+def synthetic_columns(calendar, n_assets, seed=0):
+    """
+    Random-walk pricing and quarterly step fundamentals with missing values
+    """
+    rng = np.random.default_rng(seed)
+    n_sessions = len(calendar)
+    close = 20 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (n_sessions, n_assets)), axis=0))
+    close[rng.random(close.shape) < 0.01] = np.nan
+    columns = {
+        'close': close,
+        'volume': rng.uniform(2e5, 5e6, (n_sessions, n_assets)),
+        'market_cap': rng.uniform(1e8, 5e10, (n_sessions, n_assets)),
+        'is_primary_share': rng.random(n_assets) < 0.8,
+    }
+    quarter = np.arange(n_sessions) // 63
+    for name in ('roa', 'roe', 'pb_ratio', 'pe_ratio'):
+        values = rng.normal(0.1, 0.5, (quarter.max() + 1, n_assets))[quarter]
+        values[rng.random(values.shape) < 0.05] = np.nan
+        columns[name] = values
+    return columns
+
+
+def write_synthetic_store(root):
+    calendar = pd.bdate_range('2003-01-01', periods=N_SESSIONS).values.astype('datetime64[D]')
+    sids = np.arange(N_ASSETS) + 1
+    adjustments = pd.DataFrame({
+        'sid': [sids[col] for col, _, _, _ in ADJUSTMENTS],
+        'date': [calendar[row] for _, row, _, _ in ADJUSTMENTS],
+        'ratio': [ratio for _, _, ratio, _ in ADJUSTMENTS],
+        'kind': [kind for _, _, _, kind in ADJUSTMENTS],
+    })
+    write_store(root, calendar, sids, synthetic_columns(calendar, N_ASSETS),
+                symbols=['S%d' % sid for sid in sids], adjustments=adjustments)
+
+
+@pytest.fixture(scope='session')
+def store(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('store'))
+    write_synthetic_store(root)
+    return ColumnarStore(root)
+
+
+@pytest.fixture(scope='session')
+def event_store(tmp_path_factory):
+    """
+    The same store with its fundamentals rewritten as event columns
+    """
+    root = str(tmp_path_factory.mktemp('event_store'))
+    write_synthetic_store(root)
+    convert_to_events(root, names=EVENT_COLUMNS)
+    return ColumnarStore(root)
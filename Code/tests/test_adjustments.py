@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from conftest import ADJUSTMENTS, N_SESSIONS
+from quantopian.pipeline import CustomFactor, Pipeline, SimplePipelineEngine
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.factors import Returns, RollingFactor, SimpleMovingAverage
+
+
+class MeanClose(CustomFactor):
+    inputs = [USEquityPricing.close]
+    window_length = 20
+
+    def compute(self, today, assets, out, close):
+        out[:] = np.nanmean(close, axis=0)
+
+
+class MeanVolume(CustomFactor):
+    inputs = [USEquityPricing.volume]
+    window_length = 20
+
+    def compute(self, today, assets, out, volume):
+        out[:] = np.nanmean(volume, axis=0)
+
+
+class RollingStd(RollingFactor):
+    inputs = [USEquityPricing.close]
+    window_length = 15
+
+    def compute(self, today, assets, out, close):
+        out[:] = close.std()
+
+
+def adjusted_window(raw, session, length, volume=False):
+    """
+    The `length` rows before `session`, with every adjustment whose
+    ex-date is on or before `session` applied to the rows before it
+    """
+    window = raw[session - length:session].copy()
+    for col, row, ratio, kind in ADJUSTMENTS:
+        if session - length < row <= session:
+            if not volume:
+                window[:row - (session - length), col] *= ratio
+            elif kind == 'split':
+                window[:row - (session - length), col] /= ratio
+    return window
+
+
+@pytest.mark.parametrize('chunk', [50, 7])
+def test_windows_match_brute_force_adjustment(store, chunk):
+    pipeline = Pipeline({
+        'mean': MeanClose(),
+        'sma': SimpleMovingAverage(inputs=[USEquityPricing.close], window_length=20),
+        'returns': Returns(window_length=30),
+        'volume': MeanVolume(),
+        'std': RollingStd(),
+    })
+    engine = SimplePipelineEngine(store)
+    close = store.column('close')
+    volume = store.column('volume')
+    for start in range(180, N_SESSIONS, chunk):
+        result = engine.run_chunk(pipeline, start, min(start + chunk, N_SESSIONS))
+        for j in range(len(result)):
+            session = start + j
+            returns = adjusted_window(close, session, 30)
+            expected = {
+                'mean': np.nanmean(adjusted_window(close, session, 20), axis=0),
+                'sma': np.nanmean(adjusted_window(close, session, 20), axis=0),
+                'returns': (returns[-1] - returns[0]) / returns[0],
+                'volume': np.nanmean(adjusted_window(volume, session, 20, volume=True), axis=0),
+                'std': np.std(adjusted_window(close, session, 15), axis=0),
+            }
+            screen = result.screen[j]
+            for name, values in expected.items():
+                np.testing.assert_allclose(result.columns[name][j][screen], values[screen],
+                                           rtol=1e-9, err_msg='%s on session %d' % (name, session))
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+from quantopian.benchmarks import compare, load_baseline, main, run_benchmarks, save_baseline
+
+SCRIPTS = [os.path.join(os.path.dirname(__file__), os.pardir, name)
+           for name in ('Developed on Black_Cat_Acquirer_Multiple.py',
+                        'Developed on Guy_Fleury_Piotroski-F-Score.py')]
+
+
+@pytest.fixture(scope='module')
+def results():
+    return run_benchmarks(SCRIPTS, asset_counts=(50,), repeat=1)
+
+
+def test_run_benchmarks_times_every_kernel(results):
+    names = {key.split(' w=')[0].split(':')[1] for key in results.index}
+    assert names == {'TrailingTwelveMonths', 'trailing_twelve_months', 'Piotroski'}
+    assert (results['assets'] == 50).all()
+    assert (results['seconds'] > 0).all() and (results['peak_bytes'] >= 0).all()
+
+
+def test_compare_flags_new_slower_and_heavier_cases(results):
+    assert (compare(results, {})['status'] == 'new').all()
+    baseline = {key: {'seconds': row['seconds'], 'peak_bytes': row['peak_bytes']}
+                for key, row in results.iterrows()}
+    assert (compare(results, baseline)['status'] == 'ok').all()
+    first, second = results.index[:2]
+    baseline[first]['seconds'] = results.loc[first, 'seconds'] / 10
+    baseline[second]['peak_bytes'] = 0
+    status = compare(results, baseline, min_seconds=0, min_bytes=0)['status']
+    assert status[first] == 'slower' and status[second] == 'memory'
+
+
+def test_baseline_round_trip(results, tmp_path):
+    path = str(tmp_path / 'benchmarks.json')
+    assert load_baseline(path) == {}
+    save_baseline(path, results.iloc[:1])
+    save_baseline(path, results.iloc[1:])
+    cases = load_baseline(path)
+    assert sorted(cases) == sorted(results.index)
+    for key, row in results.iterrows():
+        assert cases[key] == {'seconds': row['seconds'], 'peak_bytes': row['peak_bytes']}
+    save_baseline(path, results.iloc[:1], merge=False)
+    with open(path) as f:
+        assert list(json.load(f)['cases']) == [results.index[0]]
+
+
+def test_main_saves_then_compares(tmp_path):
+    path = str(tmp_path / 'benchmarks.json')
+    argv = [SCRIPTS[0], '--assets', '50', '--repeat', '1', '--match', 'trailing_twelve_months',
+            '--baseline', path]
+    assert main(argv + ['--save']) == 0
+    assert list(load_baseline(path)) == [
+        'Developed on Black_Cat_Acquirer_Multiple:trailing_twelve_months w=400 n=50']
+    assert main(argv + ['--tolerance', '1000']) == 0
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from quantopian.benchmarks import script_kernels
+
+SCRIPT = os.path.join(os.path.dirname(__file__), os.pardir, 'Developed on Black_Cat_Acquirer_Multiple.py')
+WINDOW = 400
+
+
+def unique_quarter_sums(values, dates):
+    # The per-column np.unique sum trailing_twelve_months replaced.
+    return np.array([
+        (v[d + np.timedelta64(52, 'W') > d[-1]])[
+            np.unique(d[d + np.timedelta64(52, 'W') > d[-1]], return_index=True)[1]
+        ].sum()
+        for v, d in zip(values.T, dates.T)
+    ])
+
+
+@pytest.fixture(scope='module')
+def trailing_twelve_months():
+    _, functions = script_kernels(SCRIPT)
+    return next(f for f in functions if f.__name__ == 'trailing_twelve_months')
+
+
+def quarterly_windows(rng, n_assets, n_quarters=4):
+    """
+    Forward-filled quarterly (values, as-of dates) windows, the newest
+    quarters ending at the last row, with NaN values in some quarters. The
+    oldest quarter is outside the 52 weeks in some columns.
+    """
+    last = np.datetime64('2010-06-30', 'ns')
+    ends = np.sort(rng.choice(WINDOW - 1, (n_quarters - 1, n_assets)), axis=0)
+    starts = np.vstack([np.zeros((1, n_assets), int), ends + 1])
+    quarter = (np.arange(WINDOW)[:, None, None] >= starts[None]).sum(axis=1) - 1
+    offsets = np.cumsum(rng.integers(80, 130, (n_quarters, n_assets)), axis=0)
+    asof = last - (offsets[-1] - offsets).astype('m8[D]')
+    amounts = rng.normal(100.0, 30.0, (n_quarters, n_assets))
+    amounts[rng.random(amounts.shape) < 0.1] = np.nan
+    columns = np.arange(n_assets)
+    return amounts[quarter, columns], asof[quarter, columns]
+
+
+def test_matches_unique_sums_on_forward_filled_quarters(trailing_twelve_months):
+    values, dates = quarterly_windows(np.random.default_rng(0), 200)
+    np.testing.assert_allclose(trailing_twelve_months(values, dates),
+                               unique_quarter_sums(values, dates), rtol=1e-12)
+
+
+def test_matches_unique_sums_on_duplicated_and_irregular_dates(trailing_twelve_months):
+    rng = np.random.default_rng(1)
+    values, dates = quarterly_windows(rng, 200)
+    # Restated values under an as-of date already seen, out of order.
+    restated = rng.random(values.shape) < 0.05
+    values[restated] = rng.normal(100.0, 30.0, restated.sum())
+    shuffled = np.argsort(rng.random(values.shape), axis=0)
+    shuffled[:, :100] = np.arange(WINDOW)[:, None]
+    values = np.take_along_axis(values, shuffled, axis=0)
+    dates = np.take_along_axis(dates, shuffled, axis=0)
+    # Shuffled columns whose last two rows share an as-of date.
+    dates[-2, 100:] = dates[-1, 100:]
+    np.testing.assert_allclose(trailing_twelve_months(values, dates),
+                               unique_quarter_sums(values, dates), rtol=1e-12)
+
+
+def test_matches_unique_sums_on_short_and_missing_histories(trailing_twelve_months):
+    values, dates = quarterly_windows(np.random.default_rng(2), 60)
+    lengths = np.arange(60) * 7     # 0 to 413 known rows
+    unknown = np.arange(WINDOW)[:, None] < WINDOW - lengths
+    values[unknown] = np.nan
+    dates[unknown] = np.datetime64('NaT')
+    values[:, -5:] = np.nan             # reported as-of dates, missing values
+    expected = unique_quarter_sums(values, dates)
+    result = trailing_twelve_months(values, dates)
+    assert (result[0] == 0.0) and (expected[0] == 0.0)
+    assert np.isnan(result[-5:]).all()
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+
+def test_sums_only_the_most_recent_quarters(trailing_twelve_months):
+    values, dates = quarterly_windows(np.random.default_rng(3), 100, n_quarters=6)
+    # Six quarters within 52 weeks: late filings.
+    dates = dates[-1] - (dates[-1] - dates) // 2
+    np.testing.assert_allclose(trailing_twelve_months(values, dates, max_quarters=None),
+                               unique_quarter_sums(values, dates), rtol=1e-12)
+
+    # With the default max_quarters only the latest 4 count.
+    fourth = np.array([np.unique(d)[-4] for d in dates.T])
+    older = dates < fourth
+    np.testing.assert_allclose(trailing_twelve_months(values, dates),
+                               unique_quarter_sums(np.where(older, 0.0, values), dates), rtol=1e-12)
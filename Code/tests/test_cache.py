@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from quantopian.pipeline import CustomFactor, FactorCache, Pipeline, SimplePipelineEngine
+from quantopian.pipeline.data import morningstar
+from quantopian.pipeline.factors import Latest
+
+
+class Mean(CustomFactor):
+    window_length = 5
+
+    def compute(self, today, assets, out, values):
+        out[:] = np.nanmean(values, axis=0)
+
+
+def test_latest_of_different_columns_have_different_keys(tmp_path):
+    roa, roe = morningstar.operation_ratios.roa, morningstar.operation_ratios.roe
+    roa.latest, roe.latest  # the columns now hold their Latest
+    cache = FactorCache(str(tmp_path))
+    # Hash the columns before their Latest, as a windowed factor over them does.
+    cache.term_key(Mean(inputs=[roa]))
+    cache.term_key(Mean(inputs=[roe]))
+    assert cache.term_key(roa.latest) != cache.term_key(roe.latest)
+    assert cache.term_key(roa) != cache.term_key(roe)
+
+
+def test_term_reached_from_itself_raises(tmp_path):
+    term = Latest(inputs=(morningstar.operation_ratios.roa,))
+    term.again = term
+    with pytest.raises(ValueError):
+        FactorCache(str(tmp_path)).term_key(term)
+
+
+def test_cached_rerun_returns_each_columns_values(store, tmp_path):
+    roa, roe = morningstar.operation_ratios.roa, morningstar.operation_ratios.roe
+    # The windowed factors come first, so the columns are hashed before their Latest.
+    pipeline = Pipeline({'roa_mean': Mean(inputs=[roa]), 'roe_mean': Mean(inputs=[roe]),
+                         'roa': roa.latest, 'roe': roe.latest})
+    runs = []
+    for _ in range(2):
+        engine = SimplePipelineEngine(store, cache=FactorCache(str(tmp_path)))
+        runs.append(engine.run_chunk(pipeline, 100, 150))
+    assert engine.cache.hits > 0
+    for name in pipeline.columns:
+        np.testing.assert_array_equal(runs[1].columns[name], runs[0].columns[name])
+    assert not np.array_equal(runs[1].columns['roa'], runs[1].columns['roe'], equal_nan=True)
+
+
+def test_put_over_an_existing_entry_counts_it_once(tmp_path):
+    cache = FactorCache(str(tmp_path))
+    array = np.arange(1000.0)
+    cache.put('k', array)
+    size = cache.nbytes
+    cache.put('k', array)
+    assert cache.nbytes == size
@@ -0,0 +1,77 @@
+import numpy as np
+
+from quantopian.pipeline import CustomFactor, Pipeline, SimplePipelineEngine
+from quantopian.pipeline.compact import PackedMask
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.factors import Returns, RollingFactor
+
+# float32 keeps 24 significant bits.
+EPS = 2.0 ** -24
+
+
+class MeanClose(CustomFactor):
+    inputs = [USEquityPricing.close]
+    window_length = 20
+
+    def compute(self, today, assets, out, close):
+        out[:] = np.nanmean(close, axis=0)
+
+
+class RollingStd(RollingFactor):
+    inputs = [USEquityPricing.close]
+    window_length = 15
+
+    def compute(self, today, assets, out, close):
+        out[:] = close.std()
+
+
+def _run(store, pipeline, compact):
+    return SimplePipelineEngine(store, compact=compact).run_chunk(pipeline, 100, 220)
+
+
+def test_compact_outputs_are_within_float32_rounding(store):
+    close = USEquityPricing.close.latest
+    pipeline = Pipeline({
+        'close': close,
+        'mean': MeanClose(),
+        'returns': Returns(window_length=30),
+        'std': RollingStd(),
+        'value': Fundamentals.pb_ratio.latest * Fundamentals.roe.latest,
+    })
+    default, compact = _run(store, pipeline, False), _run(store, pipeline, True)
+    for name in pipeline.columns:
+        assert compact.columns[name].dtype == np.float32
+        expected = default.columns[name]
+        np.testing.assert_array_equal(np.isnan(compact.columns[name]), np.isnan(expected))
+    # Values rounded once, and means of positive values, keep their relative error.
+    for name in ('close', 'mean'):
+        np.testing.assert_allclose(compact.columns[name], default.columns[name], rtol=20 * EPS)
+    np.testing.assert_allclose(compact.columns['value'], default.columns['value'], rtol=3 * EPS)
+    # Differences and deviations are within rounding of the prices they come from.
+    scale = np.nanmax(default.columns['close'])
+    np.testing.assert_allclose(compact.columns['returns'], default.columns['returns'],
+                               rtol=0, atol=8 * EPS * scale / np.nanmin(default.columns['close']))
+    np.testing.assert_allclose(compact.columns['std'], default.columns['std'], rtol=0, atol=30 * EPS * scale)
+
+
+def test_compact_ranks_and_masks_move_only_at_ties(store):
+    close = USEquityPricing.close.latest
+    universe = Fundamentals.market_cap.latest > 1e9
+    pipeline = Pipeline({
+        'rank': close.rank(mask=universe),
+        'average': Fundamentals.roa.latest.rank(method='average', mask=universe),
+        'cheap': close < 20,
+        'close': close,
+    }, screen=universe)
+    default, compact = _run(store, pipeline, False), _run(store, pipeline, True)
+    assert isinstance(compact.screen, PackedMask)
+    np.testing.assert_array_equal(np.asarray(compact.screen), np.asarray(default.screen))
+    for name in ('rank', 'average'):
+        ranks = compact.columns[name]
+        assert ranks.dtype == np.float32
+        np.testing.assert_array_equal(np.isnan(ranks), np.isnan(default.columns[name]))
+        assert np.nanmax(np.abs(ranks - default.columns[name])) <= 1
+    # A comparison only flips for prices within rounding of its threshold.
+    flipped = np.asarray(compact.columns['cheap']) != np.asarray(default.columns['cheap'])
+    assert (np.abs(default.columns['close'][flipped] - 20) <= 20 * EPS).all()
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import synthetic_columns
+from quantopian.data import ColumnarStore, write_store
+from quantopian.pipeline import CustomFactor, Pipeline, SimplePipelineEngine
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.data.builtin import USEquityPricing
+
+
+class TimesHeld(CustomFactor):
+    inputs = [Fundamentals.is_primary_share]
+    window_length = 3
+    cellwise = True
+
+    def compute(self, today, assets, out, flags):
+        out[:] = flags.sum(axis=0)
+
+
+def test_windowed_factor_over_static_column_sees_full_windows(store):
+    result = SimplePipelineEngine(store).run_chunk(Pipeline({'held': TimesHeld()}), 50, 60)
+    flags = store.column('is_primary_share')
+    np.testing.assert_array_equal(result.columns['held'], np.tile(3.0 * flags, (10, 1)))
+
+
+class Yield(CustomFactor):
+    inputs = [Fundamentals.roa, Fundamentals.pe_ratio]
+    window_length = 1
+    outputs = ['ratio', 'sid']
+
+    def compute(self, today, assets, out, roa, pe):
+        out.ratio[:] = roa[-1] / pe[-1]
+        out.sid[:] = assets
+
+
+class CellwiseYield(Yield):
+    cellwise = True
+
+
+class Spread(CustomFactor):
+    inputs = [Fundamentals.roa, Fundamentals.roe]
+    window_length = 1
+
+    def compute(self, today, assets, out, roa, roe):
+        out[:] = roe[-1] - roa[-1]
+
+
+class CellwiseSpread(Spread):
+    cellwise = True
+
+
+def test_cellwise_factor_matches_per_date_compute(store):
+    universe = Fundamentals.market_cap.latest > 1e9
+    columns = {}
+    for prefix, factor, spread in (('', Yield, Spread), ('cellwise_', CellwiseYield, CellwiseSpread)):
+        ratio, sid = factor(mask=universe)
+        columns.update({prefix + 'ratio': ratio, prefix + 'sid': sid, prefix + 'spread': spread(mask=universe)})
+    columns['universe'] = universe
+    result = SimplePipelineEngine(store).run_chunk(Pipeline(columns), 40, 100).columns
+    outside = ~result['universe']
+    assert outside.any() and np.isnan(result['ratio']).any()
+    for name in ('ratio', 'sid', 'spread'):
+        np.testing.assert_array_equal(result['cellwise_' + name], result[name])
+        assert np.isnan(result['cellwise_' + name][outside]).all()
+    np.testing.assert_array_equal(result['sid'][~outside], np.broadcast_to(store.sids, outside.shape)[~outside])
+
+
+def test_cellwise_compute_resets_cells_outside_the_mask(store):
+    rng = np.random.default_rng(0)
+    mask = rng.random((60, len(store.sids))) < 0.7
+    dates = store.calendar[40:100]
+    for factor, cellwise in ((Yield(), CellwiseYield()), (Spread(), CellwiseSpread())):
+        inputs = [store.column(column.name)[40:100] for column in factor.inputs]
+        expected = factor._compute(inputs, dates, store.sids, mask)
+        result = cellwise._compute(inputs, dates, store.sids, mask)
+        for name in factor.outputs or [None]:
+            column = result if name is None else result[name]
+            np.testing.assert_array_equal(column, expected if name is None else expected[name])
+            assert np.isnan(column[~mask]).all()
+
+
+class PriceAndRoa(CustomFactor):
+    inputs = [USEquityPricing.close, Fundamentals.roa]
+    window_length = 20
+
+    def compute(self, today, assets, out, close, roa):
+        out[:] = close[-1] / close[0] + np.nansum(roa, axis=0)
+
+
+class IncrementalPriceAndRoa(PriceAndRoa):
+    incremental = True
+
+
+@pytest.fixture(scope='module')
+def step_store(tmp_path_factory):
+    """
+    A store whose prices, like its fundamentals, only change once a
+    quarter, so that only splits and new quarters change a window
+    """
+    root = str(tmp_path_factory.mktemp('step_store'))
+    calendar = pd.bdate_range('2003-01-01', periods=200).values.astype('datetime64[D]')
+    sids = np.arange(30) + 1
+    columns = synthetic_columns(calendar, len(sids), seed=1)
+    quarter_start = (np.arange(200) // 63) * 63
+    for name in ('close', 'roa', 'roe'):
+        columns[name] = columns[name][quarter_start]
+    columns['close'][63:126, [1, 11]] = np.nan
+    adjustments = pd.DataFrame({'sid': [3, 7, 3], 'date': calendar[[100, 110, 160]],
+                                'ratio': [0.5, 0.25, 0.5], 'kind': ['split'] * 3})
+    start_dates = np.where(sids % 5 == 0, calendar[60], calendar[0])
+    end_dates = np.where(sids % 7 == 0, calendar[140], calendar[-1])
+    write_store(root, calendar, sids, columns, start_dates=start_dates, end_dates=end_dates,
+                adjustments=adjustments)
+    return ColumnarStore(root)
+
+
+@pytest.mark.parametrize('chunk', [200, 45, 7])
+def test_incremental_factor_matches_full_recompute(step_store, chunk):
+    universe = Fundamentals.roe.latest > -0.3       # changes once a quarter
+    pipeline = Pipeline({'full': PriceAndRoa(mask=universe), 'incremental': IncrementalPriceAndRoa(mask=universe),
+                         'universe': universe})
+    engine = SimplePipelineEngine(step_store)
+    results = [engine.run_chunk(pipeline, start, min(start + chunk, 200)).columns
+               for start in range(20, 200, chunk)]
+    full = np.concatenate([r['full'] for r in results])
+    universe = np.concatenate([r['universe'] for r in results])
+    assert np.isnan(full[universe]).any() and (universe[1:] & ~universe[:-1]).any()
+    np.testing.assert_array_equal(np.concatenate([r['incremental'] for r in results]), full)
+
+
+def test_changed_compares_windows_with_missing_values_equal():
+    rng = np.random.default_rng(2)
+    n_dates, window = 40, 5
+    values = np.round(rng.random((n_dates + window - 1, 12)), 1)
+    values[rng.random(values.shape) < 0.3] = np.nan
+    values = values[np.sort(rng.integers(0, len(values), len(values)))]   # runs of repeated rows
+    dates = np.datetime64('2004-01-01', 'ns') + (np.nan_to_num(values * 10) % 3).astype('m8[D]')
+    dates[np.isnan(values)] = np.datetime64('NaT')
+    mask = rng.random((n_dates, 12)) < 0.8
+    factor = PriceAndRoa(window_length=window)
+    changed = factor._changed([values, dates], mask)
+    for i in range(1, n_dates):
+        for col in range(12):
+            same = all(np.array_equal(data[i:i + window, col], data[i - 1:i - 1 + window, col], equal_nan=True)
+                       for data in (values, dates))
+            assert changed[i, col] == (not (mask[i - 1, col] and same)), (i, col)
+    assert changed[0].all()
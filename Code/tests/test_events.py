@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from conftest import EVENT_COLUMNS, N_SESSIONS
+from quantopian.data import EventColumn
+from quantopian.pipeline import CustomFactor, Pipeline, SimplePipelineEngine
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.loaders import StoreLoader
+
+ROA = Fundamentals.roa.forward_filled
+
+
+class TrailingMean(CustomFactor):
+    inputs = [ROA]
+    window_length = 30
+
+    def compute(self, today, assets, out, roa):
+        out[:] = np.nansum(roa, axis=0) / len(roa)
+
+
+@pytest.mark.parametrize('name', EVENT_COLUMNS)
+def test_event_column_loads_match_dense(store, event_store, name):
+    dense = np.asarray(store.column(name))
+    events = event_store.column(name)
+    assert isinstance(events, EventColumn)
+    for length in (1, 2, 7, 63, 64, N_SESSIONS):
+        for start in range(N_SESSIONS - length + 1):
+            np.testing.assert_array_equal(events.load(start, start + length), dense[start:start + length])
+    for row in (0, 1, 62, 63, N_SESSIONS - 1, -1):
+        np.testing.assert_array_equal(events[row], dense[row])
+    np.testing.assert_array_equal(events[5:40, 3:9], dense[5:40, 3:9])
+
+
+def test_forward_filled_loads_match_dense(store, event_store):
+    dense, events = StoreLoader(store), StoreLoader(event_store)
+    for start in range(1, N_SESSIONS, 13):
+        stop = min(start + 13, N_SESSIONS)
+        np.testing.assert_array_equal(events.load(ROA, start, stop), dense.load(ROA, start, stop))
+
+
+@pytest.mark.parametrize('chunk', [50, 7])
+def test_pipelines_match_dense(store, event_store, chunk):
+    pipeline = Pipeline({
+        'latest': Fundamentals.roa.latest,
+        'filled': ROA.latest,
+        'mean': TrailingMean(),
+        'pe': Fundamentals.pe_ratio.latest,
+    }, screen=Fundamentals.pb_ratio.latest.notnull())
+    dense, events = SimplePipelineEngine(store), SimplePipelineEngine(event_store)
+    for start in range(40, N_SESSIONS, chunk):
+        stop = min(start + chunk, N_SESSIONS)
+        expected = dense.run_chunk(pipeline, start, stop)
+        result = events.run_chunk(pipeline, start, stop)
+        np.testing.assert_array_equal(np.asarray(result.screen), np.asarray(expected.screen))
+        for name in pipeline.columns:
+            np.testing.assert_array_equal(result.columns[name], expected.columns[name])
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from conftest import N_SESSIONS
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.loaders import StoreLoader, forward_fill
+
+# (start, stop) sessions: contiguous, overlapping, backward, repeated,
+# skipping ahead and restarting from the first session with history.
+REQUESTS = [(1, 40), (40, 90), (60, 120), (70, 80), (10, 30), (30, 31), (150, 200), (150, 200),
+            (199, 260), (5, 290), (1, 2), (2, N_SESSIONS), (120, 120), (250, N_SESSIONS)]
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('store_name', ['store', 'event_store'])
+def test_forward_filled_loads_match_one_shot_fill(request, store_name, compact):
+    store = request.getfixturevalue(store_name)
+    loader = StoreLoader(store, compact=compact)
+    for column in (Fundamentals.roa.forward_filled, Fundamentals.pe_ratio.forward_filled):
+        raw = np.asarray(store.column(column.store_name)[:])
+        filled = forward_fill(raw, column.missing_value).astype(loader.dtype(column))
+        for start, stop in REQUESTS:
+            np.testing.assert_array_equal(loader.load(column, start, stop),
+                                          filled[start - loader.lag:stop - loader.lag],
+                                          err_msg='%r [%d, %d)' % (column, start, stop))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quantopian.errors import MemoryBudgetError
+from quantopian.pipeline import CustomFactor, Pipeline, SimplePipelineEngine
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.factors import Returns
+from quantopian.pipeline.graph import pipeline_graph
+from quantopian.utils.memory import current_rss
+
+
+class TrailingSum(CustomFactor):
+    window_length = 120
+
+    def compute(self, today, assets, out, values):
+        out[:] = np.nansum(values, axis=0)
+
+
+def long_window_pipeline():
+    # Windows reaching back further than a chunk, over loaded, forward-filled
+    # and computed terms, whose rows are carried from one chunk to the next.
+    return Pipeline({
+        'close': TrailingSum(inputs=[USEquityPricing.close]),
+        'roa': TrailingSum(inputs=[Fundamentals.roa.forward_filled]),
+        'returns': TrailingSum(inputs=[Returns(window_length=2)], window_length=60),
+    })
+
+
+def _sessions(store):
+    return store.calendar[150], store.calendar[-1]
+
+
+def test_chunked_run_matches_single_pass(store):
+    pipeline = long_window_pipeline()
+    single = SimplePipelineEngine(store).run_pipeline(pipeline, *_sessions(store))
+    engine = SimplePipelineEngine(store)
+    fixed, per_session = engine.session_bytes(pipeline_graph(pipeline))
+    budget = (current_rss() or 0) + fixed + 40 * per_session
+    chunked = engine.run_pipeline(pipeline, *_sessions(store), memory_budget=budget)
+    assert 1 < engine.last_run['chunks'] and engine.last_run['chunksize'] < 120
+    pd.testing.assert_frame_equal(chunked, single)
+
+
+def test_budget_below_one_session_raises(store):
+    with pytest.raises(MemoryBudgetError):
+        SimplePipelineEngine(store).run_pipeline(long_window_pipeline(), *_sessions(store), memory_budget=1)
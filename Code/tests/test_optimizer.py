@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from quantopian.pipeline import CustomFactor, Pipeline, SimplePipelineEngine
+from quantopian.pipeline.data import Fundamentals, morningstar
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.expression import FusedExpression
+from quantopian.pipeline.factors import Latest
+from quantopian.pipeline.graph import pipeline_graph
+from quantopian.pipeline.optimizer import format_graph, optimize
+
+ROA = morningstar.operation_ratios.roa.forward_filled
+
+
+class CopyRoa(CustomFactor):
+    inputs = [ROA]
+    window_length = 1
+
+    def compute(self, today, assets, out, roa):
+        out[:] = roa[-1]
+
+
+class DocumentedCopyRoa(CustomFactor):
+    """
+    Last reported ROA
+    """
+    inputs = [ROA]
+    window_length = 1
+
+    # copies the last row
+    def compute(self, today, assets, out, roa):
+        out[:] = roa[-1]
+
+
+class DoubledRoa(CustomFactor):
+    inputs = [ROA]
+    window_length = 1
+
+    def compute(self, today, assets, out, roa):
+        out[:] = 2 * roa[-1]
+
+
+class ClippedRoa(CustomFactor):
+    inputs = [ROA]
+    window_length = 1
+
+    def compute(self, today, assets, out, roa):
+        roa = np.clip(roa, -1, 1)
+        out[:] = roa[-1]
+
+
+class FirstRowRoa(CustomFactor):
+    inputs = [ROA]
+    window_length = 1
+
+    def compute(self, today, assets, out, roa):
+        out[:] = roa[0]
+
+
+def _optimized(columns, screen=None):
+    return optimize(pipeline_graph(Pipeline(columns, screen=screen)))
+
+
+@pytest.mark.parametrize('factor, elided', [
+    (CopyRoa(), True),
+    (DocumentedCopyRoa(), True),
+    (DoubledRoa(), False),
+    (ClippedRoa(), False),
+    (FirstRowRoa(), False),
+    # The copy statement, but not a one-row copy of one column:
+    (CopyRoa(window_length=2), False),
+    (CopyRoa(inputs=[ROA, morningstar.operation_ratios.roe]), False),
+])
+def test_last_row_copy_elision(factor, elided):
+    graph = _optimized({'x': factor})
+    assert graph.elided == int(elided)
+    assert isinstance(graph.outputs['x'], Latest) == elided
+
+
+def test_elided_factor_merges_with_the_columns_latest():
+    graph = _optimized({'copy': CopyRoa(), 'latest': ROA.latest})
+    assert graph.outputs['copy'] is graph.outputs['latest']
+
+
+def test_duplicates_merge():
+    graph = _optimized({'a': Fundamentals.market_cap.latest.rank() + 1,
+                        'b': Fundamentals.market_cap.latest.rank() + 1})
+    assert graph.merged == 2
+    assert graph.outputs['a'] is graph.outputs['b']
+
+
+def test_elementwise_tree_fuses():
+    close = USEquityPricing.close.latest
+    score = (close.rank() + 2 * ROA.latest.rank() + DoubledRoa()) / 4.0
+    graph = _optimized({'score': score}, screen=(score > 10) & (close > 5))
+    assert isinstance(graph.outputs['score'], FusedExpression)
+    assert isinstance(graph.outputs['__screen__'], FusedExpression)
+    assert graph.fused == 7
+    assert 'optimized from' in format_graph(graph, n_assets=40, n_sessions=126)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_optimized_outputs_are_identical(store, compact):
+    close = USEquityPricing.close.latest
+    universe = (Fundamentals.market_cap.latest > 1e9) & Fundamentals.is_primary_share.latest
+    score = (close.rank(mask=universe) + 2 * CopyRoa().rank(mask=universe) + DoubledRoa()) / 4.0
+    pipeline = Pipeline({'score': score, 'roa': CopyRoa(), 'roa_latest': ROA.latest,
+                         'cheap': close < 20}, screen=universe & (score > 10))
+    results = [SimplePipelineEngine(store, compact=compact, optimize=optimized).run_chunk(pipeline, 100, 160)
+               for optimized in (False, True)]
+    for name in list(pipeline.columns):
+        np.testing.assert_array_equal(np.asarray(results[1].columns[name]),
+                                      np.asarray(results[0].columns[name]))
+    np.testing.assert_array_equal(np.asarray(results[1].screen), np.asarray(results[0].screen))
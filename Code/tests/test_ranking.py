@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import rankdata
+
+from quantopian.pipeline import Pipeline, SimplePipelineEngine
+from quantopian.pipeline.data import Fundamentals
+from quantopian.pipeline.factors import StackedRank
+from quantopian.utils.ranking import RANK_METHODS, rankdata_stack
+
+PANDAS_METHODS = {'ordinal': 'first', 'average': 'average', 'min': 'min', 'max': 'max', 'dense': 'dense'}
+
+
+def scipy_ranks(data, mask, method, ascending):
+    # Missing values rank last, tied with each other: +inf after the sign flip.
+    ranks = np.full(data.shape, np.nan)
+    for row in range(data.shape[0]):
+        key = data[row, mask[row]] * (1.0 if ascending else -1.0)
+        ranks[row, mask[row]] = rankdata(np.where(np.isnan(key), np.inf, key), method=method)
+    return ranks
+
+
+def pandas_ranks(data, mask, method, ascending):
+    ranks = np.full(data.shape, np.nan)
+    for row in range(data.shape[0]):
+        ranks[row, mask[row]] = pd.Series(data[row, mask[row]]).rank(
+            method=PANDAS_METHODS[method], ascending=ascending, na_option='bottom')
+    return ranks
+
+
+@pytest.mark.parametrize('method', RANK_METHODS)
+def test_rankdata_stack_matches_scipy_with_ties_and_nans(method):
+    rng = np.random.default_rng(0)
+    stack = np.round(rng.normal(0.0, 1.0, (2, 30, 50)), 1)     # ties
+    stack[rng.random(stack.shape) < 0.1] = np.nan
+    stack[:, 0] = np.nan                                        # nothing but missing values
+    mask = rng.random((30, 50)) < 0.7
+    mask[1] = False
+    ranks = rankdata_stack(stack, mask, method, [True, False])
+    for layer, ascending in zip(range(2), (True, False)):
+        np.testing.assert_array_equal(ranks[layer], scipy_ranks(stack[layer], mask, method, ascending))
+
+
+@pytest.mark.parametrize('method', RANK_METHODS)
+def test_stacked_rank_matches_pandas_and_single_ranks(store, method):
+    roa = Fundamentals.roa.latest
+    pe = Fundamentals.pe_ratio.latest
+    universe = Fundamentals.market_cap.latest > 1e9
+    roa_rank, pe_rank = StackedRank([roa, pe], ascending=[False, True], method=method, mask=universe)
+    pipeline = Pipeline({
+        'roa_rank': roa_rank, 'pe_rank': pe_rank,
+        'roa_single': roa.rank(method=method, ascending=False, mask=universe),
+        'pe_single': pe.rank(method=method, mask=universe),
+        'roa': roa, 'pe': pe, 'universe': universe,
+    })
+    columns = SimplePipelineEngine(store).run_chunk(pipeline, 100, 140).columns
+    mask = columns['universe']
+    assert np.isnan(columns['roa']).any() and np.isnan(columns['pe']).any()
+    np.testing.assert_array_equal(columns['roa_rank'], pandas_ranks(columns['roa'], mask, method, False))
+    np.testing.assert_array_equal(columns['pe_rank'], pandas_ranks(columns['pe'], mask, method, True))
+    np.testing.assert_array_equal(columns['roa_rank'], columns['roa_single'])
+    np.testing.assert_array_equal(columns['pe_rank'], columns['pe_single'])